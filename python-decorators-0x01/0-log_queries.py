@@ -4,7 +4,10 @@ Module to demonstrate a decorator for logging SQL queries.
 """
 import sqlite3
 import functools
-from datetime import datetime 
+import inspect
+import time
+
+from query_log import query_report, record_query, slow_queries, stop_logging
 
 DB_NAME = 'users.db'
 TABLE_NAME = 'users'
@@ -39,29 +42,56 @@ def setup_database():
 
 def log_queries(func):
     """
-    A decorator that logs the SQL query string passed to the decorated function
-    before the function executes it.
-    It assumes the first argument to the decorated function is the SQL query.
+    A decorator that logs the SQL query run by the decorated function together with
+    how long the call took, how many rows it returned and the exception it raised, if any.
+    The query is the 'query' argument, a 'query*' parameter's value (defaults included),
+    or else the first positional argument if it is a string.
+    Records go through a queue to a background logging thread, calls slower than
+    query_log.SLOW_QUERY_THRESHOLD also go to the slow-query log, and query_log.query_report()
+    gives count and p50/p95/p99 timings per normalized query (see query_log).
+    Coroutine functions are wrapped in a coroutine and timed while awaited.
     """
+    signature = inspect.signature(func)
+    query_params = [name for name in signature.parameters if name.startswith('query')]
+
+    def find_query(args, kwargs):
+        try:
+            bound = signature.bind_partial(*args, **kwargs)
+        except TypeError:
+            bound = None
+        if bound is not None:
+            bound.apply_defaults()
+            for name in query_params:
+                if isinstance(bound.arguments.get(name), str):
+                    return bound.arguments[name]
+        if args and isinstance(args[0], str):
+            return args[0]
+        return None
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query = find_query(args, kwargs)
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                record_query(query, func.__name__, time.perf_counter() - started, error=e)
+                raise
+            record_query(query, func.__name__, time.perf_counter() - started, result)
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-    
-        query_to_log = None
-        if args: 
-            if 'query' in kwargs:
-                query_to_log = kwargs['query']
-                query_to_log = args[0] 
-        elif 'query' in kwargs:
-            query_to_log = kwargs['query']
-        
-        if query_to_log:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{timestamp}] LOG: Executing Query: \"{query_to_log}\" in function '{func.__name__}'")
-        else:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{timestamp}] LOG: Executing function '{func.__name__}' (No query argument found to log specifically)")
-
-        result = func(*args, **kwargs)
+        query = find_query(args, kwargs)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            record_query(query, func.__name__, time.perf_counter() - started, error=e)
+            raise
+        record_query(query, func.__name__, time.perf_counter() - started, result)
         return result
     return wrapper
 
@@ -125,5 +155,19 @@ if __name__ == "__main__":
     else:
         print("Specific user not found or error occurred.")
 
+    print("\n--- Same query with different literals (aggregated under one fingerprint) ---")
+    for email in ('bob@example.com', 'charlie@example.com', 'nobody@example.com'):
+        fetch_all_users(f"SELECT * FROM users WHERE email = '{email}'")
+
+    print("\n--- A slow query (goes to the slow-query log) ---")
+    fetch_all_users("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000) "
+                    "SELECT COUNT(*) FROM c")
+
+    stop_logging()  # Flush the queued log records before printing the report
+    print("\n--- Per-query statistics ---")
+    for query, stats in query_report().items():
+        print(f"{query[:60]:<60} {stats}")
+    print(f"Slow queries recorded: {len(slow_queries)}")
+
     print(f"\nName of decorated function: {fetch_all_users.__name__}")
     print(f"Docstring of decorated function: {fetch_all_users.__doc__}")
\ No newline at end of file
@@ -4,6 +4,10 @@ Module to demonstrate a decorator for automatically handling database connection
 """
 import sqlite3
 import functools
+import inspect
+
+from async_db import with_async_db_connection
+from db_pool import connection_scope, current_connection
 
 DB_NAME = 'users.db' # Assuming the database from the previous task
 
@@ -30,33 +34,41 @@ def setup_database_for_connection_test():
 # --- Decorator to handle database connections ---
 def with_db_connection(func):
     """
-    A decorator that automatically opens an SQLite database connection,
-    passes the connection object as the first argument to the decorated function,
-    and ensures the connection is closed afterwards, even if errors occur.
+    A decorator that automatically borrows an SQLite database connection from the
+    shared pool (see db_pool), passes the connection object as the first argument
+    to the decorated function, and ensures the connection is returned to the pool
+    afterwards, even if errors occur. Uncommitted changes are rolled back on return.
+    Inside a connection_scope (including calls made by another decorated function)
+    the scope's connection is reused instead, and stays open until the scope ends.
+    Coroutine functions get an aiosqlite connection from async_db's pool instead.
     """
+    if inspect.iscoroutinefunction(func):
+        return with_async_db_connection(func, DB_NAME, error_prefix="ERROR:")
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None  # Initialize conn to None
         result = None
+        shared = current_connection(DB_NAME) is not None
         try:
-            # Connect to the database
-            conn = sqlite3.connect(DB_NAME)
-            print(f"LOG: Connection to '{DB_NAME}' opened by decorator for '{func.__name__}'.")
+            # Borrow a connection, or reuse the one of the enclosing scope
+            with connection_scope(DB_NAME) as conn:
+                if shared:
+                    print(f"LOG: Reusing the scope's connection to '{DB_NAME}' for '{func.__name__}'.")
+                else:
+                    print(f"LOG: Connection to '{DB_NAME}' borrowed from the pool by decorator for '{func.__name__}'.")
             
-            # Call the original function, passing the connection as the first argument
-            # The decorated function expects 'conn' as its first argument.
-            # We prepend it to the existing *args.
-            result = func(conn, *args, **kwargs)
+                # Call the original function, passing the connection as the first argument
+                # The decorated function expects 'conn' as its first argument.
+                # We prepend it to the existing *args.
+                result = func(conn, *args, **kwargs)
+            if not shared:
+                print(f"LOG: Connection to '{DB_NAME}' returned to the pool by decorator for '{func.__name__}'.")
             
         except sqlite3.Error as e:
             print(f"ERROR: Database error in '{func.__name__}': {e}")
             # Depending on requirements, you might re-raise the exception or handle it
         except Exception as e:
             print(f"ERROR: An unexpected error occurred in '{func.__name__}': {e}")
-        finally:
-            if conn:
-                conn.close()
-                print(f"LOG: Connection to '{DB_NAME}' closed by decorator for '{func.__name__}'.")
         return result # Return the result from the original function call
     return wrapper
 
@@ -4,6 +4,13 @@ Module to demonstrate decorators for handling database connections and transacti
 """
 import sqlite3
 import functools
+import inspect
+import threading
+import time
+
+from async_db import async_transaction, with_async_db_connection
+from db_pool import connection_scope, current_connection, transaction
+from group_commit import MAX_BATCH, WINDOW, get_group_committer
 
 DB_NAME = 'users.db' 
 def setup_database_for_transaction_test():
@@ -30,34 +37,63 @@ def setup_database_for_transaction_test():
 
 def with_db_connection(func):
     """
-    A decorator that automatically opens an SQLite database connection,
-    passes the connection object as the first argument to the decorated function,
-    and ensures the connection is closed afterwards, even if errors occur.
+    A decorator that automatically borrows an SQLite database connection from the
+    shared pool (see db_pool), passes the connection object as the first argument
+    to the decorated function, and ensures the connection is returned to the pool
+    afterwards, even if errors occur. Uncommitted changes are rolled back on return.
+    Inside a connection_scope (including calls made by another decorated function)
+    the scope's connection is reused instead, and stays open until the scope ends.
+    Coroutine functions get an aiosqlite connection from async_db's pool instead.
     """
+    if inspect.iscoroutinefunction(func):
+        return with_async_db_connection(func, DB_NAME)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None
         result = None
         try:
-            conn = sqlite3.connect(DB_NAME)
-            result = func(conn, *args, **kwargs)
+            if getattr(func, 'group_commit', False) and current_connection(DB_NAME) is None:
+                # The group committer runs the call on its own connection.
+                result = func(None, *args, **kwargs)
+            else:
+                with connection_scope(DB_NAME) as conn:
+                    result = func(conn, *args, **kwargs)
         except sqlite3.Error as e:
             print(f"ERROR (with_db_connection): Database error in '{func.__name__}': {e}")
         except Exception as e:
             print(f"ERROR (with_db_connection): An unexpected error in '{func.__name__}': {e}")
-        finally:
-            if conn:
-                conn.close()
         return result
     return wrapper
 
-def transactional(func):
+def transactional(func=None, *, group_commit=False, max_batch=MAX_BATCH, window=WINDOW):
     """
     A decorator that wraps the decorated function's database operations
     within a transaction. It commits if the function completes successfully,
     and rolls back if any exception occurs within the function.
     Assumes the decorated function receives a database connection object as its first argument.
+    A transactional function called from inside another one on the same connection
+    runs in a savepoint instead: its failure only undoes its own work, and the
+    outermost function commits everything once.
+
+    With group_commit=True (for small, frequent writes), calls from many threads are
+    queued and run by a single writer that commits up to `max_batch` of them at a
+    time, waiting at most `window` seconds to fill a batch (see group_commit).
+    Each call still returns its own result or raises its own exception, once
+    its batch has committed.
+
+    Coroutine functions (given an aiosqlite connection by with_db_connection) get
+    the same behaviour with every statement awaited; group_commit is sync-only.
     """
+    if func is None:
+        return functools.partial(transactional, group_commit=group_commit,
+                                 max_batch=max_batch, window=window)
+    if inspect.iscoroutinefunction(func):
+        if group_commit:
+            raise TypeError("group_commit is only supported for regular (non-async) functions")
+        return _async_transactional(func)
+    if group_commit:
+        return _group_committed(func, max_batch, window)
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs): 
         if conn is None:
@@ -65,21 +101,63 @@ def transactional(func):
         
             return func(conn, *args, **kwargs)
 
+        savepoint = None
         try:
-            print(f"LOG (transactional): Beginning transaction for '{func.__name__}'.")
+            with transaction(conn) as savepoint:
+                if savepoint:
+                    print(f"LOG (transactional): Nested call, savepoint '{savepoint}' for '{func.__name__}'.")
+                else:
+                    print(f"LOG (transactional): Beginning transaction for '{func.__name__}'.")
           
-            result = func(conn, *args, **kwargs)
+                result = func(conn, *args, **kwargs)
             
-            conn.commit() 
-            print(f"LOG (transactional): Transaction committed for '{func.__name__}'.")
+            if savepoint:
+                print(f"LOG (transactional): Savepoint '{savepoint}' released for '{func.__name__}'.")
+            else:
+                print(f"LOG (transactional): Transaction committed for '{func.__name__}'.")
             return result
         except Exception as e:
-            print(f"ERROR (transactional): Exception in '{func.__name__}': {e}. Rolling back transaction.")
-            if conn:
-                conn.rollback() 
+            if savepoint:
+                print(f"ERROR (transactional): Exception in '{func.__name__}': {e}. Rolled back to savepoint '{savepoint}'.")
+            else:
+                print(f"ERROR (transactional): Exception in '{func.__name__}': {e}. Rolling back transaction.")
             raise 
     return wrapper
 
+def _async_transactional(func):
+    """transactional for coroutine functions."""
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        if conn is None:
+            print("ERROR (transactional): Database connection is None. Cannot start transaction.")
+            return await func(conn, *args, **kwargs)
+
+        savepoint = None
+        try:
+            async with async_transaction(conn) as savepoint:
+                print(f"LOG (transactional): {'Savepoint ' + repr(savepoint) if savepoint else 'Beginning transaction'} for '{func.__name__}'.")
+                result = await func(conn, *args, **kwargs)
+            print(f"LOG (transactional): {'Savepoint released' if savepoint else 'Transaction committed'} for '{func.__name__}'.")
+            return result
+        except Exception as e:
+            print(f"ERROR (transactional): Exception in '{func.__name__}': {e}. Rolled back {'to savepoint' if savepoint else 'transaction'}.")
+            raise
+    return wrapper
+
+def _group_committed(func, max_batch, window):
+    """transactional(group_commit=True): hands the call to the group committer."""
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        if conn is not None:
+            # Part of the caller's own unit of work (a connection_scope): run it there.
+            with transaction(conn):
+                return func(conn, *args, **kwargs)
+        committer = get_group_committer(DB_NAME, max_batch, window)
+        return committer.run(func, *args, **kwargs)
+    # Lets with_db_connection skip borrowing a connection the call will not use.
+    wrapper.group_commit = True
+    return wrapper
+
 @with_db_connection
 @transactional
 def update_user_email(conn, user_id, new_email):
@@ -100,6 +178,24 @@ def get_user_details(conn, user_id):
         return dict(zip(cols, data))
     return None
 
+@with_db_connection
+@transactional
+def swap_user_emails(conn, first_id, second_id):
+    """Swaps two users' emails in one transaction; the nested updates run in savepoints."""
+    first = get_user_details(user_id=first_id)
+    second = get_user_details(user_id=second_id)
+    update_user_email(user_id=first_id, new_email=f"swap.{first_id}@example.com")
+    update_user_email(user_id=second_id, new_email=first['email'])
+    update_user_email(user_id=first_id, new_email=second['email'])
+
+@with_db_connection
+@transactional(group_commit=True)
+def add_user_grouped(conn, name, email):
+    """Adds a user; concurrent calls are committed together in batches."""
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (name, email) VALUES (?, ?)", (name, email))
+    return cursor.lastrowid
+
 if __name__ == "__main__":
     setup_database_for_transaction_test()
 
@@ -152,4 +248,24 @@ if __name__ == "__main__":
     if user_after_rollback_attempt and user_after_rollback_attempt.get('email') == original_email_for_rollback_test:
         print("Rollback appears successful: Email reverted or remained unchanged.")
     else:
-        print("Rollback test inconclusive or email changed unexpectedly.")
\ No newline at end of file
+        print("Rollback test inconclusive or email changed unexpectedly.")
+
+    print("\n--- Unit of work: one connection and one commit for several decorated calls ---")
+    with connection_scope(DB_NAME):
+        print(f"Before swap: {get_user_details(user_id=1)['email']} / {get_user_details(user_id=2)['email']}")
+        swap_user_emails(1, 2)
+        print(f"After swap:  {get_user_details(user_id=1)['email']} / {get_user_details(user_id=2)['email']}")
+
+    print("\n--- Group commit: 20 concurrent single-row inserts, committed in batches ---")
+    results = {}
+    def add(i):
+        # User 0's email is duplicated on purpose: only that call fails.
+        email = 'bob@example.com' if i == 0 else f"group.{i}.{time.time_ns()}@example.com"
+        results[i] = add_user_grouped(f"Group User {i}", email)
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"New ids: {[results[i] for i in sorted(results)]}")
+    print(f"Group commit stats: {get_group_committer(DB_NAME).stats()}")
@@ -3,8 +3,14 @@
 Module to demonstrate a decorator for retrying database operations on failure.
 """
 import time
+import asyncio
 import sqlite3
 import functools
+import inspect
+
+from async_db import with_async_db_connection
+from db_pool import connection_scope
+from retry_policy import backoff_delay, is_lock_error, retry_budget, retry_metrics
 
 DB_NAME = 'users.db' 
 
@@ -34,71 +40,138 @@ def setup_database_for_retry_test():
 
 def with_db_connection(func):
     """
-    A decorator that automatically opens an SQLite database connection,
-    passes the connection object as the first argument to the decorated function,
-    and ensures the connection is closed afterwards, even if errors occur.
+    A decorator that automatically borrows an SQLite database connection from the
+    shared pool (see db_pool), passes the connection object as the first argument
+    to the decorated function, and ensures the connection is returned to the pool
+    afterwards, even if errors occur. Uncommitted changes are rolled back on return.
+    Inside a connection_scope (including calls made by another decorated function)
+    the scope's connection is reused instead, and stays open until the scope ends.
+    Coroutine functions get an aiosqlite connection from async_db's pool instead.
     """
+    if inspect.iscoroutinefunction(func):
+        return with_async_db_connection(func, DB_NAME, reraise=True)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        global _db_should_fail_count
-        conn = None
         result = None
-        
-        if _db_should_fail_count > 0:
-            _db_should_fail_count -= 1
-            print(f"LOG (with_db_connection): Simulating connection failure. Attempts remaining: {_db_should_fail_count +1 }")
-            raise sqlite3.OperationalError("Simulated temporary connection unavailable")
-
         try:
-            conn = sqlite3.connect(DB_NAME)
-            result = func(conn, *args, **kwargs)
+            with connection_scope(DB_NAME) as conn:
+                result = func(conn, *args, **kwargs)
         except sqlite3.Error as e:
             print(f"ERROR (with_db_connection): Database error in '{func.__name__}': {e}")
             raise 
         except Exception as e:
             print(f"ERROR (with_db_connection): An unexpected error in '{func.__name__}': {e}")
             raise
-        finally:
-            if conn:
-                conn.close()
         return result
     return wrapper
 
-def retry_on_failure(retries=3, delay=1, allowed_exceptions=(sqlite3.Error,)):
+def retry_on_failure(retries=3, delay=1, allowed_exceptions=(sqlite3.Error,), max_delay=30,
+                     multiplier=2, deadline=None, retry_if=is_lock_error, budget=None, metrics=None):
     """
     A decorator that retries the execution of the decorated function
-    if it raises one of the `allowed_exceptions`.
+    if it raises one of the `allowed_exceptions` that `retry_if` classifies as transient.
 
     Args:
         retries (int): The maximum number of times to retry the function.
-        delay (int): The number of seconds to wait between retries.
-        allowed_exceptions (tuple): A tuple of exception types that should trigger a retry.
+        delay (float): The base delay in seconds. Retry n waits a random time between 0 and
+                       delay * multiplier**n, capped at max_delay (exponential backoff with
+                       full jitter).
+        allowed_exceptions (tuple): A tuple of exception types that may trigger a retry.
                                     Defaults to (sqlite3.Error,).
+        max_delay (float): The longest wait before any single retry.
+        multiplier (float): The growth factor of the backoff.
+        deadline (float): Overall time limit in seconds; no retry is started that would
+                          sleep past it. None means no limit.
+        retry_if (callable): Decides whether an allowed exception is worth retrying.
+                             Defaults to is_lock_error ("database is locked").
+        budget (RetryBudget): Token bucket every retry must take a token from.
+                              Defaults to the per-process `retry_budget`.
+        metrics (RetryMetrics): Where attempts, retries and give-ups are counted.
+                                Defaults to the per-process `retry_metrics`.
+
+    Coroutine functions are retried with asyncio.sleep, so waiting never blocks the event loop.
     """
     def decorator(func):
+        def start():
+            stats = retry_metrics if metrics is None else metrics
+            stats.record_call()
+            return stats, None if deadline is None else time.monotonic() + deadline
+
+        def next_wait(e, attempts, stats, give_up_at):
+            """
+            Seconds to wait before the next attempt. Called while e is being
+            handled, and re-raises it (traceback unchanged) when giving up.
+            """
+            wait = None
+            if not retry_if(e):
+                reason = 'not_retryable'
+            elif attempts >= retries:
+                reason = 'attempts'
+            else:
+                wait = backoff_delay(attempts, delay, max_delay, multiplier)
+                if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                    reason = 'deadline'
+                elif not (retry_budget if budget is None else budget).try_spend():
+                    reason = 'budget'
+                else:
+                    reason = None
+            if reason:
+                stats.record_give_up(reason)
+                print(f"ERROR (retry_on_failure): '{func.__name__}' failed after {attempts} retries "
+                      f"(giving up: {reason.replace('_', ' ')}). Last error: {e}")
+                raise
+            stats.record_retry(wait)
+            print(f"LOG (retry_on_failure): '{func.__name__}' failed with {type(e).__name__}: {e}. Waiting {wait:.2f}s before retrying ({attempts + 1}/{retries}).")
+            return wait
+
+        def unexpected(e, stats):
+            stats.record_give_up('not_retryable')
+            print(f"ERROR (retry_on_failure): '{func.__name__}' failed with an unexpected error: {e}")
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                stats, give_up_at = start()
+                attempts = 0
+                while True:
+                    stats.record_attempt()
+                    try:
+                        if attempts > 0:
+                            print(f"LOG (retry_on_failure): Retrying '{func.__name__}' (Attempt {attempts}/{retries})...")
+                        result = await func(*args, **kwargs)
+                    except allowed_exceptions as e:
+                        wait = next_wait(e, attempts, stats, give_up_at)
+                        attempts += 1
+                        await asyncio.sleep(wait)  # Other tasks keep running meanwhile
+                    except Exception as e:
+                        unexpected(e, stats)
+                        raise
+                    else:
+                        stats.record_success()
+                        return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            stats, give_up_at = start()
             attempts = 0
-            last_exception = None
-            while attempts <= retries:
+            while True:
+                stats.record_attempt()
                 try:
                     if attempts > 0: 
                         print(f"LOG (retry_on_failure): Retrying '{func.__name__}' (Attempt {attempts}/{retries})...")
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except allowed_exceptions as e:
-                    last_exception = e
+                    wait = next_wait(e, attempts, stats, give_up_at)
                     attempts += 1
-                    if attempts > retries:
-                        print(f"ERROR (retry_on_failure): '{func.__name__}' failed after {retries} retries. Last error: {e}")
-                        raise 
-                    
-                    print(f"LOG (retry_on_failure): '{func.__name__}' failed with {type(e).__name__}: {e}. Waiting {delay}s before retrying ({attempts}/{retries}).")
-                    time.sleep(delay)
+                    time.sleep(wait)
                 except Exception as e: 
-                    print(f"ERROR (retry_on_failure): '{func.__name__}' failed with an unexpected error: {e}")
+                    unexpected(e, stats)
                     raise 
-            if last_exception:
-                raise last_exception 
+                else:
+                    stats.record_success()
+                    return result
         return wrapper
     return decorator
 
@@ -106,7 +179,12 @@ def retry_on_failure(retries=3, delay=1, allowed_exceptions=(sqlite3.Error,)):
 @retry_on_failure(retries=3, delay=1) 
 def fetch_users_with_retry(conn):
     """Fetches all users. Designed to be retried on failure."""
+    global _db_should_fail_count
     print(f"Executing fetch_users_with_retry (connection: {conn is not None})...")
+    if _db_should_fail_count > 0:
+        _db_should_fail_count -= 1
+        print(f"LOG (fetch_users_with_retry): Simulating a locked database. Failures remaining: {_db_should_fail_count}")
+        raise sqlite3.OperationalError("database is locked (simulated)")
    
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users")
@@ -114,12 +192,18 @@ def fetch_users_with_retry(conn):
     print("Successfully fetched users.")
     return results
 
+@with_db_connection
+@retry_on_failure(retries=3, delay=1)
+def count_rows_in_missing_table(conn):
+    """Queries a table that does not exist, which no retry can fix."""
+    return conn.execute("SELECT COUNT(*) FROM no_such_table").fetchone()[0]
+
 if __name__ == "__main__":
     setup_database_for_retry_test()
 
     print("\n--- Attempting to fetch users with potential retries ---")
     
-    print("\nTest 1: Simulating 2 initial connection failures...")
+    print("\nTest 1: Simulating 2 initial 'database is locked' failures...")
     _db_should_fail_count = 2 
     try:
         users = fetch_users_with_retry()
@@ -147,5 +231,14 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Main: Test 2 failed unexpectedly: {e}")
 
-    
+    print("-" * 40)
+
+    print("\nTest 3: A non-transient error (missing table) is not retried...")
+    try:
+        count_rows_in_missing_table()
+    except sqlite3.OperationalError as e:
+        print(f"Main: Test 3 failed immediately as expected: {e}")
+
+    print(f"\nRetry metrics: {retry_metrics.stats()}")
+    print(f"Retry budget tokens left: {retry_budget.tokens:.1f}")
     print(f"\nName of ultimate decorated function: {fetch_users_with_retry.__name__}")
@@ -3,12 +3,19 @@
 Module to demonstrate a decorator for caching database query results.
 """
 import time
+import asyncio
 import sqlite3
 import functools
+import inspect
 import hashlib
+import threading
+
+from db_cache import QueryCache, make_key, tables_read
+from async_db import run_async, with_async_db_connection
+from db_pool import connection_scope
 
 DB_NAME = 'users.db' 
-query_cache = {} 
+query_cache = QueryCache()
 
 def setup_database_for_cache_test():
     """Sets up a simple SQLite database with a users table if it doesn't exist."""
@@ -35,72 +42,137 @@ def setup_database_for_cache_test():
 
 def with_db_connection(func):
     """
-    A decorator that automatically opens an SQLite database connection,
-    passes the connection object as the first argument to the decorated function,
-    and ensures the connection is closed afterwards, even if errors occur.
+    A decorator that automatically borrows an SQLite database connection from the
+    shared pool (see db_pool), passes the connection object as the first argument
+    to the decorated function, and ensures the connection is returned to the pool
+    afterwards, even if errors occur. Uncommitted changes are rolled back on return.
+    Inside a connection_scope (including calls made by another decorated function)
+    the scope's connection is reused instead, and stays open until the scope ends.
+    Coroutine functions get an aiosqlite connection from async_db's pool instead.
     """
+    if inspect.iscoroutinefunction(func):
+        return with_async_db_connection(func, DB_NAME)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None
         result = None
         try:
-            conn = sqlite3.connect(DB_NAME)
-       
-            result = func(conn, *args, **kwargs)
+            with connection_scope(DB_NAME) as conn:
+                result = func(conn, *args, **kwargs)
         except sqlite3.Error as e:
             print(f"ERROR (with_db_connection): Database error in '{func.__name__}': {e}")
         except Exception as e:
             print(f"ERROR (with_db_connection): An unexpected error in '{func.__name__}': {e}")
-        finally:
-            if conn:
-                conn.close()
         return result
     return wrapper
 
-def cache_query(func):
+def cache_query(func=None, *, cache=None, ttl=None):
     """
     A decorator that caches the results of a database query function.
-    The cache key is based on the SQL query string (and potentially other arguments).
-    It assumes the decorated function receives a database connection as its first argument
-    and the SQL query string as its second positional argument or as a keyword argument 'query'.
+    It assumes the decorated function receives a database connection as its first argument,
+    the SQL query string as its second positional argument or as a keyword argument 'query',
+    and optionally the query parameters next or as a keyword argument 'params'.
+
+    The cache key is the normalized query text plus its parameters (and any other
+    arguments), and the entry is tagged with the tables the query reads, so that
+    committed writes to those tables made through with_db_connection evict it.
+    Concurrent misses on the same key run the query once; the other callers wait
+    for that execution and share its result.
+    Results go to `cache` (default: the module-wide `query_cache`), a bounded LRU
+    cache whose entries expire after `ttl` seconds (default: the cache's own ttl).
+    Use it bare (@cache_query) or configured (@cache_query(ttl=30)).
+    Coroutine functions are cached the same way; callers waiting on another
+    caller's execution await it without blocking the event loop.
     """
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        query_string = None
-        
-        if args: 
-            query_string = args[0] 
-        elif 'query' in kwargs: 
-            query_string = kwargs['query']
-        
-        if query_string is None:
-            print("LOG (cache_query): Could not determine query string for caching. Executing function directly.")
-            return func(conn, *args, **kwargs)
+    if func is None:
+        return functools.partial(cache_query, cache=cache, ttl=ttl)
 
-        cache_key = query_string 
+    def lookup(args, kwargs):
+        """(query string, cache key) of a call; (None, None) if it has no query."""
+        rest = dict(kwargs)
+        query_string = rest.pop('query', None)
+        params = rest.pop('params', ())
+        extra = list(args)
+        if query_string is None and extra:
+            query_string = extra.pop(0)
+        if 'params' not in kwargs and extra:
+            params = extra.pop(0)
+        if not isinstance(query_string, str):
+            print("LOG (cache_query): Could not determine query string for caching. Executing function directly.")
+            return None, None
+        return query_string, make_key(query_string, params, tuple(extra), rest)
 
-        if cache_key in query_cache:
+    def report(query_string, status):
+        if status == 'hit':
             print(f"LOG (cache_query): Cache HIT for query: \"{query_string[:50]}...\"")
-            return query_cache[cache_key]
+        elif status == 'coalesced':
+            print(f"LOG (cache_query): Cache MISS for query: \"{query_string[:50]}...\" Joined the in-flight execution.")
         else:
-            print(f"LOG (cache_query): Cache MISS for query: \"{query_string[:50]}...\" Executing and caching.")
-        
-            result = func(conn, *args, **kwargs) 
-            query_cache[cache_key] = result 
+            print(f"LOG (cache_query): Cache MISS for query: \"{query_string[:50]}...\" Executed and cached.")
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            store = query_cache if cache is None else cache
+            query_string, cache_key = lookup(args, kwargs)
+            if cache_key is None:
+                return await func(conn, *args, **kwargs)
+            result, status = await store.get_or_compute_async(
+                cache_key, lambda: func(conn, *args, **kwargs),
+                ttl=ttl, tables=tables_read(query_string)
+            )
+            report(query_string, status)
             return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        store = query_cache if cache is None else cache
+        query_string, cache_key = lookup(args, kwargs)
+        if cache_key is None:
+            return func(conn, *args, **kwargs)
+
+        result, status = store.get_or_compute(
+            cache_key, lambda: func(conn, *args, **kwargs),
+            ttl=ttl, tables=tables_read(query_string)
+        )
+        report(query_string, status)
+        return result
     return wrapper
 
 @with_db_connection 
 @cache_query        
-def fetch_users_with_cache(conn, query):
+def fetch_users_with_cache(conn, query, params=()):
     """Fetches users based on the query, results may be cached."""
     print(f"Executing fetch_users_with_cache with query: \"{query[:50]}...\" (DB operation)")
     cursor = conn.cursor()
-    cursor.execute(query) 
+    cursor.execute(query, params) 
     results = cursor.fetchall()
     print("DB query executed.")
     return results
 
+@with_db_connection
+def rename_user(conn, new_name, email):
+    """Renames a user; committing the change invalidates cached reads of users."""
+    conn.execute("UPDATE users SET name = ? WHERE email = ?", (new_name, email))
+    conn.commit()
+
+@with_db_connection
+@cache_query
+async def async_fetch_users(conn, query, params=()):
+    """Coroutine version of fetch_users_with_cache, on an aiosqlite connection."""
+    print(f"Executing async_fetch_users with query: \"{query[:50]}...\" (DB operation)")
+    async with conn.execute(query, params) as cursor:
+        return await cursor.fetchall()
+
+async def fetch_concurrently():
+    """Several tasks miss on the same query at once; it runs once and they share the result."""
+    query = "SELECT * FROM users ORDER BY name LIMIT ?"
+    results = await asyncio.gather(*(async_fetch_users(query, (2,)) for _ in range(5)))
+    print(f"{len(results)} tasks got {[len(result) for result in results]} rows each.")
+    cached = await async_fetch_users(query, (2,))
+    print(f"A later call is served from the cache: {cached == results[0]}")
+
 if __name__ == "__main__":
     setup_database_for_cache_test()
 
@@ -135,4 +207,30 @@ if __name__ == "__main__":
 
     print(f"\nCurrent cache state: {len(query_cache)} items. Keys: {list(query_cache.keys())}")
 
+    print("\n--- Same parameterized query with different parameters (separate cache entries) ---")
+    by_email = "SELECT * FROM users WHERE email = ?"
+    foo = fetch_users_with_cache(by_email, ('cache.foo@example.com',))
+    bar = fetch_users_with_cache(by_email, ('cache.bar@example.com',))
+    print(f"foo: {foo}\nbar: {bar}")
+
+    print("\n--- A committed write to users evicts the entries that read users ---")
+    rename_user(new_name='Cache User Foo (renamed)', email='cache.foo@example.com')
+    print(f"Cache state after the write: {len(query_cache)} items.")
+    foo = fetch_users_with_cache(by_email, ('cache.foo@example.com',))
+    print(f"foo: {foo}")
+    rename_user(new_name='Cache User Foo', email='cache.foo@example.com')
+
+    print("\n--- Concurrent misses on the same query (executed once, shared by all threads) ---")
+    threads = [threading.Thread(target=fetch_users_with_cache, args=("SELECT COUNT(*) FROM users",))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Cache stats: {query_cache.stats()}")
+
     print(f"\nName of decorated function: {fetch_users_with_cache.__name__}")
+
+    print("\n--- Async: the same decorators on a coroutine function ---")
+    run_async(fetch_concurrently())
+    print(f"Cache stats: {query_cache.stats()}")
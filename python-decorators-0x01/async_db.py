@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+"""
+asyncio counterparts of db_pool for the decorators' coroutine branches.
+
+When a decorated function is a coroutine function, with_db_connection
+borrows an aiosqlite connection from an AsyncConnectionPool instead of a
+sqlite3 one from db_pool, and transactional uses async_transaction. The
+pools behave like db_pool's: bounded, configured once per connection (same
+PRAGMAs, same query-cache write tracking), pinged before use and replaced
+after MAX_LIFETIME or IDLE_TIMEOUT. Waiting for a connection, and every
+statement, is awaited, so nothing blocks the event loop.
+
+Every aiosqlite connection runs on its own (non-daemon) thread, so idle
+pooled connections must be closed before the program ends or it cannot exit:
+run the program with run_async() instead of asyncio.run(), or
+`await close_async_pools()` before the event loop stops.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import sqlite3
+import time
+import weakref
+
+try:
+    import aiosqlite
+except ImportError:  # Only needed for coroutine functions
+    aiosqlite = None
+
+from db_cache import TrackedConnection
+from db_pool import IDLE_TIMEOUT, MAX_LIFETIME, POOL_SIZE, POOL_TIMEOUT, PRAGMAS, PoolTimeoutError
+
+
+async def async_connect(db_name):
+    """Opens an aiosqlite connection configured like db_pool.connect()."""
+    if aiosqlite is None:
+        raise ImportError("Decorating coroutine functions needs aiosqlite (pip install aiosqlite)")
+    conn = await aiosqlite.connect(db_name, factory=TrackedConnection)
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+
+class AsyncConnectionPool:
+    """A bounded pool of aiosqlite connections to one database file, for one event loop."""
+
+    def __init__(self, db_name, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=IDLE_TIMEOUT, max_lifetime=MAX_LIFETIME, pre_ping=True):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []  # (connection, created_at, released_at), most recent last
+        self._created = {}  # id(connection) -> created_at, for borrowed connections
+        self._closed = False
+
+    async def _usable(self, conn, created_at, released_at):
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime or now - released_at > self.idle_timeout:
+            return False
+        if self.pre_ping:
+            try:
+                await conn.execute("SELECT 1")
+            except Exception:
+                return False
+        return True
+
+    @staticmethod
+    async def _discard(conn):
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def acquire(self, timeout=None):
+        """Borrows a connection, waiting (without blocking the loop) while all are in use."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(
+                f"No connection to '{self.db_name}' available after {timeout}s "
+                f"(pool size {self.size})"
+            ) from None
+        try:
+            while self._idle:
+                conn, created_at, released_at = self._idle.pop()
+                if await self._usable(conn, created_at, released_at):
+                    break
+                await self._discard(conn)
+            else:
+                conn, created_at = await async_connect(self.db_name), time.monotonic()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._created[id(conn)] = created_at
+        return conn
+
+    async def release(self, conn):
+        """Returns a borrowed connection, rolling back uncommitted work."""
+        created_at = self._created.pop(id(conn), time.monotonic())
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            conn.row_factory = None
+        except Exception:
+            await self._discard(conn)
+        else:
+            if self._closed:
+                await self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    async def close_all(self):
+        """Closes the idle connections now and borrowed ones when they are released."""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            await self._discard(conn)
+
+
+# Pools are tied to the event loop they were created on.
+_pools = weakref.WeakKeyDictionary()  # loop -> {db_name: AsyncConnectionPool}
+
+
+def get_async_pool(db_name):
+    """Returns the pool for db_name on the running event loop."""
+    pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(db_name)
+    if pool is None:
+        pool = pools[db_name] = AsyncConnectionPool(db_name)
+    return pool
+
+
+async def close_async_pools():
+    """Closes the idle connections of every pool on the running event loop."""
+    for pool in _pools.pop(asyncio.get_running_loop(), {}).values():
+        await pool.close_all()
+
+
+def run_async(main):
+    """asyncio.run(main) that closes the loop's pools before the loop stops."""
+    async def run_and_close():
+        try:
+            return await main
+        finally:
+            await close_async_pools()
+    return asyncio.run(run_and_close())
+
+
+_scoped = contextvars.ContextVar('async_db_scoped_connections', default={})
+_transaction = contextvars.ContextVar('async_db_transaction', default=None)
+_savepoint_ids = itertools.count(1)
+
+
+def current_async_connection(db_name):
+    """The connection of the enclosing async_connection_scope for db_name, or None."""
+    return _scoped.get().get(db_name)
+
+
+@contextlib.asynccontextmanager
+async def async_connection_scope(db_name):
+    """
+    db_pool.connection_scope for coroutines: the borrowed connection is
+    shared by the coroutine decorated calls awaited inside the block (tasks
+    created inside it inherit it too, so only await them one at a time).
+    """
+    conn = current_async_connection(db_name)
+    if conn is not None:
+        yield conn
+        return
+    pool = get_async_pool(db_name)
+    conn = await pool.acquire()
+    token = _scoped.set({**_scoped.get(), db_name: conn})
+    try:
+        yield conn
+    finally:
+        _scoped.reset(token)
+        await pool.release(conn)
+
+
+def with_async_db_connection(func, db_name, error_prefix="ERROR (with_db_connection):",
+                             reraise=False):
+    """
+    with_db_connection for coroutine functions: passes func a connection of the
+    enclosing async_connection_scope, or one borrowed from the pool with await.
+    Errors are printed after error_prefix, then re-raised if reraise is true and
+    otherwise turned into a None result.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            async with async_connection_scope(db_name) as conn:
+                return await func(conn, *args, **kwargs)
+        except sqlite3.Error as e:
+            print(f"{error_prefix} Database error in '{func.__name__}': {e}")
+            if reraise:
+                raise
+        except Exception as e:
+            print(f"{error_prefix} An unexpected error in '{func.__name__}': {e}")
+            if reraise:
+                raise
+        return None
+    return wrapper
+
+
+@contextlib.asynccontextmanager
+async def async_transaction(conn):
+    """db_pool.transaction for aiosqlite connections: outermost commits, nested use savepoints."""
+    if _transaction.get() is conn:
+        savepoint = f"asp_{next(_savepoint_ids)}"
+        await conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield savepoint
+        except BaseException:
+            await conn.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            await conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+            raise
+        await conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+        return
+
+    token = _transaction.set(conn)
+    try:
+        if not conn.in_transaction:
+            await conn.execute("BEGIN")
+        try:
+            yield None
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+    finally:
+        _transaction.reset(token)
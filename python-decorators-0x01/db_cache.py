@@ -0,0 +1,521 @@
+#!/usr/bin/python3
+"""
+Bounded query-result cache used by the cache_query decorator.
+
+Entries are kept in least-recently-used order and evicted when the cache
+holds more than max_entries results or more than max_bytes of (estimated)
+result size. Every entry also expires ttl seconds after it was stored.
+Hits, misses, evictions and expirations are counted in QueryCache.stats().
+
+Storage is split into lock stripes chosen by key hash, so threads working on
+different keys rarely contend, and concurrent misses on the same key are
+coalesced: one caller runs the query while the others wait for its result
+(get_or_compute, or get_or_compute_async for coroutines).
+
+Keys combine the normalized SQL text with its bound parameters, and every
+entry is tagged with the tables its query reads. Connections opened by the
+with_db_connection decorators are TrackedConnections, so when a transaction
+that wrote to a table commits, the entries reading that table are evicted
+from every cache in the process.
+"""
+import asyncio
+import contextvars
+import re
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+MAX_ENTRIES = 256
+MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_TTL = 300
+STRIPES = 8
+ALL_TABLES = '*'  # Tag for queries whose tables could not be determined
+
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_NAME = r'[\w.]+'
+_READ_FROM = re.compile(
+    rf"\b(?:from|join)\s+({_NAME}(?:\s+(?:as\s+)?\w+)?(?:\s*,\s*{_NAME}(?:\s+(?:as\s+)?\w+)?)*)"
+)
+_WRITE = re.compile(
+    rf"\b(?:(?:insert|replace)(?:\s+or\s+\w+)?\s+into|update(?:\s+or\s+\w+)?(?!\s+set\b)"
+    rf"|delete\s+from|drop\s+table(?:\s+if\s+exists)?|alter\s+table)\s+({_NAME})"
+)
+_WRITE_VERB = re.compile(r"^\s*(?:with\b.*?\b)?(insert|replace|update|delete|drop|alter)\b", re.S)
+
+_caches = weakref.WeakSet()
+# (id(cache), key) pairs being computed by get_or_compute in this context.
+_computing = contextvars.ContextVar('db_cache_computing', default=frozenset())
+
+
+class _Abandoned(Exception):
+    """Set on an in-flight future whose computing caller was interrupted."""
+
+
+def estimate_size(value):
+    """Rough size in bytes of a query result (rows of tuples/dicts of scalars)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+def normalize_query(query):
+    """
+    Canonical form of an SQL statement: comments removed, whitespace collapsed
+    and everything outside string literals lower-cased, so that formatting
+    differences do not produce separate cache entries.
+    """
+    parts = _LITERAL.split(_COMMENT.sub(' ', query))
+    for i in range(0, len(parts), 2):  # Even indexes are outside literals
+        parts[i] = re.sub(r'\s+', ' ', parts[i].lower())
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def _strip_literals(normalized):
+    return _LITERAL.sub("''", normalized)
+
+
+def _table_name(name):
+    return name.split('.')[-1]  # main.users -> users
+
+
+def tables_read(query):
+    """Tables a query reads, or {ALL_TABLES} if none could be found."""
+    sql = _strip_literals(normalize_query(query))
+    tables = set()
+    for match in _READ_FROM.finditer(sql):
+        for item in match.group(1).split(','):
+            tables.add(_table_name(item.split()[0]))
+    return tables or {ALL_TABLES}
+
+
+def tables_written(query):
+    """Tables a statement modifies: empty for reads, {ALL_TABLES} if unparseable."""
+    sql = _strip_literals(normalize_query(query))
+    if not _WRITE_VERB.match(sql):
+        return set()
+    tables = {_table_name(name) for name in _WRITE.findall(sql)}
+    return tables or {ALL_TABLES}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def make_key(query, params=(), *extra):
+    """Cache key for a query: normalized SQL, its parameters and any other (non-empty) arguments."""
+    return (normalize_query(query), _freeze(params or ())) + tuple(_freeze(e) for e in extra if e)
+
+
+def invalidate_tables(tables):
+    """Evicts the entries reading any of `tables` from every QueryCache."""
+    for cache in list(_caches):
+        cache.invalidate_tables(tables)
+
+
+def write_tracer(conn):
+    """
+    Returns an sqlite3 trace callback for conn that, whenever a transaction
+    that wrote to some tables ends, invalidates the cached results reading
+    them. Rollbacks invalidate too, since a read inside the transaction may
+    have cached rows that were never committed.
+
+    The callback runs before SQLite executes the statement. On a
+    TrackedConnection the same tables are invalidated again once the
+    statement has run (see there).
+    """
+    pending = set()
+    landed = getattr(conn, '_landed', None)
+
+    def invalidate(tables):
+        invalidate_tables(tables)
+        if landed is not None:
+            landed.update(tables)
+
+    def on_statement(statement):
+        verb = statement.lstrip()[:8].upper()
+        if verb.startswith(('COMMIT', 'END')) or (
+                verb.startswith('ROLLBACK') and ' TO ' not in statement.upper()):
+            if pending:
+                invalidate(pending)
+                pending.clear()
+        else:
+            written = tables_written(statement)
+            if written:
+                if conn.in_transaction:
+                    pending.update(written)
+                else:  # Autocommit: the statement commits on its own
+                    invalidate(written)
+
+    return on_statement
+
+
+def track_writes(conn):
+    """
+    Installs write_tracer on an sqlite3 connection and returns the connection.
+    Prefer opening it with factory=TrackedConnection, which also invalidates
+    after the write has landed.
+    """
+    conn.set_trace_callback(write_tracer(conn))
+    return conn
+
+
+class TrackedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose writes evict the cached results they make stale:
+    sqlite3.connect(db_name, factory=TrackedConnection).
+
+    write_tracer invalidates when a COMMIT (or an autocommit write) is about
+    to run, while other connections still read the old rows, so a concurrent
+    reader can cache them again before the write lands. The tables are
+    therefore invalidated a second time when the call that ran the statement
+    returns: a reader that started earlier has its result dropped by set()'s
+    generation check, and one that starts later reads the new rows.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._landed = set()  # Tables invalidated by the statements of the current call
+        self.set_trace_callback(write_tracer(self))
+
+    def _after_call(self, method, *args):
+        try:
+            return method(*args)
+        finally:
+            if self._landed:
+                tables = set(self._landed)
+                self._landed.clear()
+                invalidate_tables(tables)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TrackedCursor)
+
+    def execute(self, *args):
+        return self._after_call(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._after_call(super().executemany, *args)
+
+    def executescript(self, *args):
+        return self._after_call(super().executescript, *args)
+
+    def commit(self):
+        return self._after_call(super().commit)
+
+    def rollback(self):
+        return self._after_call(super().rollback)
+
+    def __exit__(self, *exc_info):
+        return self._after_call(super().__exit__, *exc_info)
+
+
+class TrackedCursor(sqlite3.Cursor):
+    """Cursor of a TrackedConnection, invalidating after its statements too."""
+
+    def execute(self, *args):
+        return self.connection._after_call(super().execute, *args)
+
+    def executemany(self, *args):
+        return self.connection._after_call(super().executemany, *args)
+
+    def executescript(self, *args):
+        return self.connection._after_call(super().executescript, *args)
+
+
+class _Stripe:
+    """One lock-protected slice of a QueryCache."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, size, expires_at, tables), oldest first
+        self.by_table = {}  # table -> keys of the entries reading it
+        self.in_flight = {}  # key -> Future of the running computation
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def remove(self, key):
+        _, size, _, tables = self.entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            keys = self.by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_table[table]
+
+    def lookup(self, key):
+        """Returns the live entry for key or None. Caller holds the lock."""
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self.remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, value, size, expires_at, tables):
+        """Adds an entry and evicts LRU entries over budget. Caller holds the lock."""
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (value, size, expires_at, tables)
+        self.bytes += size
+        for table in tables:
+            self.by_table.setdefault(table, set()).add(key)
+        while (len(self.entries) > self.max_entries
+               or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+
+class QueryCache:
+    """
+    An LRU cache of query results with a size budget and per-entry TTL.
+
+    max_entries and max_bytes are divided evenly between the stripes, and
+    LRU order is kept per stripe, so both limits and eviction order are
+    approximate across the whole cache.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=DEFAULT_TTL,
+                 stripes=STRIPES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if stripes < 1:
+            raise ValueError("stripes must be at least 1")
+        stripes = min(stripes, max_entries)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._stripes = [
+            _Stripe(-(-max_entries // stripes),
+                    None if max_bytes is None else max_bytes // stripes)
+            for _ in range(stripes)
+        ]
+        # Bumped by every invalidation; a result computed before the bump may
+        # be stale, so set() drops it (see generation=).
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        _caches.add(self)
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def get(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        stripe = self._stripe(key)
+        with stripe.lock:
+            entry = stripe.lookup(key)
+            if entry is None:
+                stripe.misses += 1
+                return False, None
+            stripe.hits += 1
+            return True, entry[0]
+
+    def set(self, key, value, ttl=None, tables=(ALL_TABLES,), generation=None):
+        """
+        Stores a result read from `tables`, evicting least recently used
+        entries to make room. Pass the cache's generation from before the
+        query ran, and the result is not stored if a write has invalidated
+        the cache in the meantime.
+        """
+        stripe = self._stripe(key)
+        ttl = self.ttl if ttl is None else ttl
+        size = estimate_size(value)
+        if stripe.max_bytes is not None and size > stripe.max_bytes:
+            return False  # Would evict everything else and still not fit
+        expires_at = time.monotonic() + ttl if ttl else None
+        with stripe.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            stripe.store(key, value, size, expires_at, frozenset(tables))
+        return True
+
+    def _claim(self, key):
+        """
+        Looks key up for get_or_compute: returns ('hit', value), ('coalesced',
+        future) when another caller is already computing it, or ('miss',
+        future) when the caller must compute it and settle the future.
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            entry = stripe.lookup(key)
+            if entry is not None:
+                stripe.hits += 1
+                return 'hit', entry[0]
+            stripe.misses += 1
+            future = stripe.in_flight.get(key)
+            if future is not None:
+                stripe.coalesced += 1
+                return 'coalesced', future
+            future = stripe.in_flight[key] = Future()
+            return 'miss', future
+
+    def _settle(self, key, future, generation, ttl, tables, value=None, error=None):
+        try:
+            if error is None:
+                self.set(key, value, ttl=ttl, tables=tables, generation=generation)
+        finally:
+            # Out of in_flight before the waiters wake, so an abandoned
+            # computation is not found again when they retry.
+            stripe = self._stripe(key)
+            with stripe.lock:
+                stripe.in_flight.pop(key, None)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def _computing(self, key):
+        """True when called from inside this cache's own computation of key."""
+        return (id(self), key) in _computing.get()
+
+    def _enter(self, key):
+        return _computing.set(_computing.get() | {(id(self), key)})
+
+    def get_or_compute(self, key, compute, ttl=None, tables=(ALL_TABLES,)):
+        """
+        Returns (value, status) for key, status being 'hit', 'miss' (compute()
+        ran in this thread and its result was cached) or 'coalesced' (another
+        caller was already computing it and this one waited for the result).
+        An exception raised by compute() is raised in every waiting caller;
+        if the computing caller is interrupted instead (KeyboardInterrupt,
+        task cancellation, ...), the waiters retry. A compute() that asks
+        for its own key again gets it computed directly, without caching.
+        """
+        if self._computing(key):
+            return compute(), 'miss'
+        while True:
+            status, found = self._claim(key)
+            if status == 'hit':
+                return found, status
+            if status == 'miss':
+                break
+            try:
+                return found.result(), status
+            except _Abandoned:
+                continue
+        generation = self.generation
+        token = self._enter(key)
+        try:
+            value = compute()
+        except Exception as exc:
+            self._settle(key, found, generation, ttl, tables, error=exc)
+            raise
+        except BaseException:
+            self._settle(key, found, generation, ttl, tables, error=_Abandoned())
+            raise
+        finally:
+            _computing.reset(token)
+        self._settle(key, found, generation, ttl, tables, value=value)
+        return value, status
+
+    async def get_or_compute_async(self, key, compute, ttl=None, tables=(ALL_TABLES,)):
+        """
+        get_or_compute for coroutines: compute is an async callable, and
+        waiting for another caller's computation (a task or a thread) awaits
+        it instead of blocking the event loop. If the computing task is
+        cancelled, the waiting ones retry rather than being cancelled too.
+        """
+        if self._computing(key):
+            return await compute(), 'miss'
+        while True:
+            status, found = self._claim(key)
+            if status == 'hit':
+                return found, status
+            if status == 'miss':
+                break
+            try:
+                # shield: a cancelled waiter must not cancel the shared computation.
+                return await asyncio.shield(asyncio.wrap_future(found)), status
+            except _Abandoned:
+                continue
+        generation = self.generation
+        token = self._enter(key)
+        try:
+            value = await compute()
+        except Exception as exc:
+            self._settle(key, found, generation, ttl, tables, error=exc)
+            raise
+        except BaseException:
+            self._settle(key, found, generation, ttl, tables, error=_Abandoned())
+            raise
+        finally:
+            _computing.reset(token)
+        self._settle(key, found, generation, ttl, tables, value=value)
+        return value, status
+
+    def invalidate(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            if key in stripe.entries:
+                stripe.remove(key)
+
+    def invalidate_tables(self, tables):
+        """Evicts the entries reading any of `tables` (ALL_TABLES: everything)."""
+        with self._generation_lock:
+            self.generation += 1
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                if ALL_TABLES in tables:
+                    keys = set(stripe.entries)
+                else:
+                    keys = set(stripe.by_table.get(ALL_TABLES, ()))
+                    for table in tables:
+                        keys.update(stripe.by_table.get(table, ()))
+                for key in keys:
+                    stripe.remove(key)
+                stripe.invalidations += len(keys)
+                removed += len(keys)
+        return removed
+
+    def clear(self):
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.by_table.clear()
+                stripe.bytes = 0
+
+    def keys(self):
+        keys = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                keys.extend(stripe.entries)
+        return keys
+
+    def __len__(self):
+        return sum(len(stripe.entries) for stripe in self._stripes)
+
+    def __contains__(self, key):
+        return key in self._stripe(key).entries
+
+    def stats(self):
+        totals = dict.fromkeys(('entries', 'bytes', 'hits', 'misses', 'coalesced',
+                                'evictions', 'expirations', 'invalidations'), 0)
+        for stripe in self._stripes:
+            with stripe.lock:
+                totals['entries'] += len(stripe.entries)
+                for name in tuple(totals)[1:]:
+                    totals[name] += getattr(stripe, name)
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = totals['hits'] / lookups if lookups else None
+        return totals
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+Shared SQLite connection pool behind the with_db_connection decorators.
+
+Instead of connecting (and re-reading the schema with cold page caches) on
+every decorated call, connections are borrowed from one bounded pool per
+database file and returned afterwards. Each connection is configured once
+when it is opened (WAL journal, PRAGMAs, write tracking for the query cache),
+pinged before it is handed out, and replaced once it is older than
+MAX_LIFETIME or has sat idle for longer than IDLE_TIMEOUT.
+
+connection_scope() makes one borrowed connection ambient for a block (and
+everything it calls, tracked with a contextvar), so stacked decorated calls
+share it, and transaction() nests: the outermost block commits, inner
+blocks become savepoints.
+"""
+import contextlib
+import contextvars
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from db_cache import TrackedConnection
+
+POOL_SIZE = 5
+POOL_TIMEOUT = 30
+IDLE_TIMEOUT = 300
+MAX_LIFETIME = 3600
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def connect(db_name):
+    """Opens a connection configured the way every pooled connection is."""
+    # Borrowed by whichever thread needs one, used by one thread at a time.
+    conn = sqlite3.connect(db_name, check_same_thread=False, factory=TrackedConnection)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """A bounded pool of sqlite3 connections to one database file."""
+
+    def __init__(self, db_name, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=IDLE_TIMEOUT, max_lifetime=MAX_LIFETIME, pre_ping=True):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self._idle = deque()  # (connection, created_at, released_at), oldest on the left
+        self._created = {}  # id(connection) -> created_at, for borrowed connections
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        return connect(self.db_name)
+
+    def _usable(self, conn, created_at):
+        if time.monotonic() - created_at > self.max_lifetime:
+            return False
+        if self.pre_ping:
+            try:
+                conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def _pop_expired(self):
+        """Removes idle connections past idle_timeout. Caller holds the lock."""
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][2] < cutoff:
+            expired.append(self._idle.popleft()[0])
+            self._open -= 1
+        return expired
+
+    @staticmethod
+    def _discard(connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def acquire(self, timeout=None):
+        """
+        Borrows a connection, opening a new one while the pool is below its
+        size and otherwise waiting for one to be released.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        expired = []
+        conn = created_at = None
+        with self._condition:
+            while True:
+                expired.extend(self._pop_expired())
+                if self._idle:
+                    conn, created_at, _ = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._discard(expired)
+                    raise PoolTimeoutError(
+                        f"No connection to '{self.db_name}' available after {timeout}s "
+                        f"(pool size {self.size})"
+                    )
+                self._condition.wait(remaining)
+        self._discard(expired)
+
+        if conn is not None and not self._usable(conn, created_at):
+            self._discard([conn])
+            conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+            created_at = time.monotonic()
+        self._created[id(conn)] = created_at
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a borrowed connection. Uncommitted work is rolled back, as
+        closing the connection would have done, and broken connections are
+        dropped.
+        """
+        created_at = self._created.pop(id(conn), time.monotonic())
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            healthy = False
+        if not healthy:
+            self._discard([conn])
+        with self._condition:
+            if healthy:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+            expired = self._pop_expired()
+            self._condition.notify()
+        self._discard(expired)
+
+    def close_all(self):
+        """Closes every idle connection. Borrowed ones are closed on release."""
+        with self._condition:
+            idle = [conn for conn, _, _ in self._idle]
+            self._open -= len(idle)
+            self._idle.clear()
+        self._discard(idle)
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name):
+    """
+    Returns the process-wide pool for a database file. A forked child starts
+    with pools of its own instead of sharing its parent's connections.
+    """
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name)
+        return pool
+
+
+_scoped = contextvars.ContextVar('db_pool_scoped_connections', default={})
+_transaction = contextvars.ContextVar('db_pool_transaction', default=None)
+_savepoint_ids = itertools.count(1)
+
+
+def current_connection(db_name):
+    """The connection of the enclosing connection_scope for db_name, or None."""
+    return _scoped.get().get(db_name)
+
+
+@contextlib.contextmanager
+def connection_scope(db_name):
+    """
+    Borrows a connection for the duration of the block and makes it the
+    ambient connection for db_name: with_db_connection calls made inside the
+    block (or nested scopes) reuse it instead of borrowing their own. The
+    connection goes back to the pool, with uncommitted work rolled back,
+    when the outermost scope exits.
+    """
+    conn = current_connection(db_name)
+    if conn is not None:
+        yield conn
+        return
+    pool = get_pool(db_name)
+    conn = pool.acquire()
+    try:
+        with use_connection(db_name, conn):
+            yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextlib.contextmanager
+def use_connection(db_name, conn):
+    """
+    Makes conn, which the caller owns, the ambient connection for db_name
+    within the block, as connection_scope does for a borrowed one.
+    """
+    token = _scoped.set({**_scoped.get(), db_name: conn})
+    try:
+        yield conn
+    finally:
+        _scoped.reset(token)
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    """
+    Runs the block as a transaction on conn. The outermost block on a
+    connection begins and commits it (rolling back on an exception); blocks
+    nested inside it run in a savepoint instead, so an exception only undoes
+    the nested block's work and the outer transaction commits once. Yields
+    the savepoint name, or None for the outermost block.
+    """
+    active = _transaction.get()
+    if active is not None and active is conn:
+        savepoint = f"sp_{next(_savepoint_ids)}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield savepoint
+        except BaseException:
+            conn.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+            raise
+        conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+        return
+
+    token = _transaction.set(conn)
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        try:
+            yield None
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        _transaction.reset(token)
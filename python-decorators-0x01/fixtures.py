@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+Test fixtures: a throwaway users.db in a temporary working directory.
+"""
+import contextlib
+import importlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import db_pool
+from group_commit import close_group_committers
+
+DB_NAME = 'users.db'
+
+
+def load_script(name):
+    """Imports one of the numbered scripts, e.g. load_script('2-transactional')."""
+    return importlib.import_module(name)
+
+
+class UsersDatabaseTestCase(unittest.TestCase):
+    """
+    Runs each test in a fresh working directory whose users.db holds
+    `user_count` users, so the scripts' relative DB_NAME points at it.
+    """
+
+    user_count = 3
+
+    def setUp(self):
+        self.previous_cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        conn = sqlite3.connect(DB_NAME)
+        conn.execute("""
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE
+            )
+        """)
+        conn.executemany("INSERT INTO users (name, email) VALUES (?, ?)",
+                         [(f"User {number}", f"user{number}@example.com")
+                          for number in range(1, self.user_count + 1)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        close_group_committers()
+        with db_pool._pools_lock:
+            pools = list(db_pool._pools.values())
+            db_pool._pools.clear()
+        for pool in pools:
+            pool.close_all()
+        os.chdir(self.previous_cwd)
+        self.directory.cleanup()
+
+    def count_users(self):
+        conn = sqlite3.connect(DB_NAME)
+        count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        conn.close()
+        return count
+
+    def quietly(self, func, *args, **kwargs):
+        """Calls func with stdout captured; returns (result, output)."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = func(*args, **kwargs)
+        return result, output.getvalue()
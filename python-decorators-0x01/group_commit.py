@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+Group commit for transactional(group_commit=True).
+
+Writes submitted by many callers are run by one writer thread per database
+file, on its own connection, and committed together: the writer takes the
+first waiting write, keeps collecting until it has max_batch of them or
+`window` seconds have passed, then runs them all in one transaction, each in
+its own savepoint. A write that raises is rolled back to its savepoint and
+its exception goes to that caller only; the others commit with the batch.
+Callers block until the batch holding their write has committed, so a
+returned result is durable, but every batch pays for a single commit.
+
+While a batch runs, the writer's connection is the ambient connection for
+the database (see db_pool.connection_scope), so decorated calls made by a
+write share its transaction, and a grouped write submitted by another write
+runs inline in a savepoint instead of waiting on its own writer.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from db_pool import connect, transaction, use_connection
+
+MAX_BATCH = 64
+WINDOW = 0.005  # Seconds to wait for more writes after the first one
+_STOP = object()
+
+
+class _Write:
+    __slots__ = ('func', 'args', 'kwargs', 'future')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class GroupCommitter:
+    """Batches writes to one database file into shared transactions."""
+
+    def __init__(self, db_name, max_batch=MAX_BATCH, window=WINDOW):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.db_name = db_name
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+
+    def submit(self, func, args=(), kwargs=None):
+        """Queues func(conn, *args, **kwargs); returns a Future of its result."""
+        write = _Write(func, args, kwargs or {})
+        if threading.current_thread() is self._thread:
+            # Submitted by a write of the running batch: queueing it would
+            # wait on this thread forever, so it joins the batch's transaction.
+            self._run_inline(write)
+            return write.future
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f"group-commit-{self.db_name}")
+                self._thread.start()
+        self._queue.put(write)
+        return write.future
+
+    def _run_inline(self, write):
+        write.future.set_running_or_notify_cancel()
+        try:
+            with transaction(self._conn):
+                result = write.func(self._conn, *write.args, **write.kwargs)
+        except Exception as exc:
+            write.future.set_exception(exc)
+        else:
+            write.future.set_result(result)
+
+    def run(self, func, *args, **kwargs):
+        """Submits a write and waits for the batch holding it to commit."""
+        return self.submit(func, args, kwargs).result()
+
+    def close(self):
+        """Stops the writer once the writes queued so far have committed."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _close_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._collect()
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            if not batch:
+                continue
+            try:
+                if self._conn is None:
+                    self._conn = connect(self.db_name)
+                self._commit(self._conn, batch)
+            except Exception as exc:
+                # The connection itself failed; every write of the batch fails.
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(exc)
+                self._close_connection()
+        self._close_connection()
+
+    def _commit(self, conn, batch):
+        succeeded = []
+        failed = 0
+        try:
+            with use_connection(self.db_name, conn), transaction(conn):
+                for write in batch:
+                    if not write.future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction(conn):  # Nested: a savepoint per write
+                            result = write.func(conn, *write.args, **write.kwargs)
+                    except Exception as exc:
+                        write.future.set_exception(exc)
+                        failed += 1
+                    else:
+                        succeeded.append((write.future, result))
+        except Exception as exc:
+            for future, _ in succeeded:
+                future.set_exception(exc)
+            raise
+        self.batches += 1
+        self.writes += len(succeeded) + failed  # Cancelled writes never ran
+        self.failed += failed
+        print(f"LOG (group_commit): Committed {len(succeeded)} writes to '{self.db_name}' "
+              f"in one transaction ({failed} failed).")
+        for future, result in succeeded:
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'failed': self.failed,
+            'average_batch': self.writes / self.batches if self.batches else None,
+        }
+
+
+_committers = {}
+_committers_pid = None
+_committers_lock = threading.Lock()
+
+
+def get_group_committer(db_name, max_batch=MAX_BATCH, window=WINDOW):
+    """
+    Returns the process-wide committer for a database file and batching
+    settings; callers asking for different max_batch or window values get
+    committers of their own. A forked child gets its own.
+    """
+    global _committers, _committers_pid
+    key = (db_name, max_batch, window)
+    with _committers_lock:
+        if _committers_pid != os.getpid():
+            _committers, _committers_pid = {}, os.getpid()
+        committer = _committers.get(key)
+        if committer is None:
+            committer = _committers[key] = GroupCommitter(db_name, max_batch, window)
+        return committer
+
+
+def close_group_committers():
+    """Stops every writer thread of this process and closes its connection."""
+    with _committers_lock:
+        committers = list(_committers.values())
+        _committers.clear()
+    for committer in committers:
+        committer.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+"""
+Query timing, slow-query log and per-query statistics for log_queries.
+
+Every logged call produces a record with the query, the wall time, the
+number of rows returned and the exception, if any. Records are handed to a
+QueueHandler, so the decorated call only enqueues them; a QueueListener
+thread formats and writes them to stdout. Calls slower than
+SLOW_QUERY_THRESHOLD seconds are also logged at WARNING on the
+'query_log.slow' logger and kept in `slow_queries`.
+
+Statistics are aggregated per query fingerprint (the normalized query with
+its literals replaced by ?), so one statement run with different values is
+counted once. Percentiles come from a fixed-size random sample of each
+query's timings (reservoir sampling), so memory stays bounded.
+"""
+import atexit
+import logging
+import logging.handlers
+import math
+import queue
+import random
+import re
+import sys
+import threading
+from collections import deque
+
+from db_cache import normalize_query
+
+SLOW_QUERY_THRESHOLD = 0.1  # Seconds
+SLOW_QUERY_HISTORY = 100
+SAMPLE_SIZE = 1024
+
+logger = logging.getLogger('query_log')
+slow_logger = logging.getLogger('query_log.slow')
+slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)  # Most recent slow query records
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def fingerprint(query):
+    """Normalized query text with string and number literals replaced by ?."""
+    return _NUMBER_LITERAL.sub('?', _STRING_LITERAL.sub('?', normalize_query(query)))
+
+
+def start_logging(stream=None):
+    """
+    Routes the query_log loggers through a queue to a background listener
+    writing to `stream` (default stdout). Called on first use; safe to call
+    again.
+    """
+    global _listener
+    if _listener is not None:  # Every logged query comes through here: skip the lock
+        return
+    with _listener_lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s",
+                                              datefmt='%Y-%m-%d %H:%M:%S'))
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(records))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out the records still queued and stops the listener thread."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                logger.removeHandler(handler)
+
+
+class QueryStats:
+    """Count, errors, rows and sampled timings of one query fingerprint."""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sample_size = sample_size
+        self._sample = []
+
+    def add(self, duration, rows, failed):
+        self.count += 1
+        self.errors += failed
+        self.rows += rows or 0
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        if len(self._sample) < self.sample_size:
+            self._sample.append(duration)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.sample_size:
+                self._sample[slot] = duration
+
+    def percentile(self, p):
+        """Nearest-rank p-th percentile (0-100) of the sampled timings, in seconds."""
+        if not self._sample:
+            return None
+        ordered = sorted(self._sample)
+        rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def as_dict(self):
+        to_ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'mean_ms': to_ms(self.total_time / self.count) if self.count else None,
+            'p50_ms': to_ms(self.percentile(50)),
+            'p95_ms': to_ms(self.percentile(95)),
+            'p99_ms': to_ms(self.percentile(99)),
+            'max_ms': to_ms(self.max_time),
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def count_rows(result):
+    """Rows in a query function's result, or None if it is not a row list."""
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return None
+
+
+def record_query(query, func_name, duration, result=None, error=None):
+    """Adds one execution to the statistics and logs it (through the queue)."""
+    start_logging()
+    rows = None if error is not None else count_rows(result)
+    key = fingerprint(query) if query else f"<{func_name}>"
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = QueryStats()
+        stats.add(duration, rows, error is not None)
+
+    details = {'query': query, 'function': func_name, 'duration_ms': round(duration * 1000, 3),
+               'rows': rows, 'error': None if error is None else repr(error)}
+    outcome = (f"failed with {type(error).__name__}: {error}" if error is not None
+               else f"returned {rows if rows is not None else 'no'} rows")
+    message = (f"Query \"{query}\" in '{func_name}' took {details['duration_ms']:.3f} ms and {outcome}"
+               if query else f"'{func_name}' took {details['duration_ms']:.3f} ms and {outcome}")
+    if error is not None:
+        logger.error(message, extra={'query_details': details})
+    else:
+        logger.info(message, extra={'query_details': details})
+    if duration >= SLOW_QUERY_THRESHOLD:
+        slow_queries.append(details)
+        slow_logger.warning(f"SLOW ({SLOW_QUERY_THRESHOLD * 1000:g} ms threshold) {message}",
+                            extra={'query_details': details})
+
+
+def query_report():
+    """Statistics per query fingerprint, slowest p95 first."""
+    with _stats_lock:
+        report = {key: stats.as_dict() for key, stats in _stats.items()}
+    return dict(sorted(report.items(), key=lambda item: -(item[1]['p95_ms'] or 0)))
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+    slow_queries.clear()
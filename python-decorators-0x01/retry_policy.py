@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+"""
+Retry policy used by the retry_on_failure decorator.
+
+- is_lock_error:  only SQLITE_BUSY / SQLITE_LOCKED ("database is locked")
+                  failures are worth retrying; anything else fails the same
+                  way the next time
+- backoff_delay:  exponential backoff with full jitter, so callers that
+                  failed together do not retry in lockstep
+- RetryBudget:    a token bucket shared by the whole process that caps how
+                  many retries can be made per second, so retries cannot
+                  multiply the load on a database that is already struggling
+- RetryMetrics:   counters for calls, attempts, retries, sleeps and the
+                  reasons for giving up, including the retry amplification
+                  (attempts per call)
+"""
+import random
+import sqlite3
+import threading
+import time
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+_LOCK_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(exc):
+    """True for errors caused by another connection holding a lock."""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)  # Python 3.11+
+    if code is not None and code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED):
+        return True
+    message = str(exc).lower()
+    return any(text in message for text in _LOCK_MESSAGES)
+
+
+def backoff_delay(retry, base, cap, multiplier=2):
+    """
+    Seconds to wait before retry number `retry` (0 for the first): uniformly
+    random between 0 and base * multiplier**retry, capped at `cap`.
+    """
+    return random.uniform(0, min(cap, base * multiplier ** retry))
+
+
+class RetryBudget:
+    """
+    Token bucket of retries: every retry spends a token, and tokens refill
+    at `rate` per second up to `capacity`. When the bucket is empty, calls
+    fail instead of retrying.
+    """
+
+    def __init__(self, capacity=10, rate=2.0):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_spend(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class RetryMetrics:
+    """Thread-safe counters describing how retries behave under load."""
+
+    GIVE_UP_REASONS = ('not_retryable', 'attempts', 'deadline', 'budget')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.attempts = 0
+            self.retries = 0
+            self.successes = 0
+            self.slept = 0.0
+            self.gave_up = dict.fromkeys(self.GIVE_UP_REASONS, 0)
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def record_attempt(self):
+        with self._lock:
+            self.attempts += 1
+
+    def record_retry(self, delay):
+        with self._lock:
+            self.retries += 1
+            self.slept += delay
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+
+    def record_give_up(self, reason):
+        with self._lock:
+            self.gave_up[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'successes': self.successes,
+                'gave_up': dict(self.gave_up),
+                'seconds_slept': round(self.slept, 3),
+                'amplification': self.attempts / self.calls if self.calls else None,
+            }
+
+
+# Shared by every retry_on_failure in the process unless one is passed in.
+retry_budget = RetryBudget()
+retry_metrics = RetryMetrics()
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+"""
+Tests for the aiosqlite pools and transactions in async_db.py.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import async_db
+from async_db import (AsyncConnectionPool, async_connection_scope, async_transaction,
+                      current_async_connection, get_async_pool, run_async,
+                      with_async_db_connection)
+from db_pool import PoolTimeoutError
+from fixtures import DB_NAME, UsersDatabaseTestCase, load_script
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@unittest.skipIf(async_db.aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncConnectionPool(UsersDatabaseTestCase):
+    """Borrowing, limits and shutdown, each test on its own event loop."""
+
+    def test_released_connection_is_reused(self):
+        async def run():
+            pool = AsyncConnectionPool(DB_NAME)
+            conn = await pool.acquire()
+            await pool.release(conn)
+            again = await pool.acquire()
+            await pool.release(again)
+            await pool.close_all()
+            return conn is again
+        self.assertTrue(asyncio.run(run()))
+
+    def test_exhausted_pool_times_out(self):
+        async def run():
+            pool = AsyncConnectionPool(DB_NAME, size=1)
+            conn = await pool.acquire()
+            try:
+                with self.assertRaises(PoolTimeoutError):
+                    await pool.acquire(timeout=0.05)
+            finally:
+                await pool.release(conn)
+                await pool.close_all()
+        asyncio.run(run())
+
+    def test_release_rolls_back_uncommitted_work(self):
+        async def run():
+            pool = AsyncConnectionPool(DB_NAME)
+            conn = await pool.acquire()
+            await conn.execute("DELETE FROM users")
+            await pool.release(conn)
+            await pool.close_all()
+        asyncio.run(run())
+        self.assertEqual(self.count_users(), self.user_count)
+
+    def test_run_async_closes_pooled_connections(self):
+        async def run():
+            pool = get_async_pool(DB_NAME)
+            borrowed = [await pool.acquire(), await pool.acquire()]
+            for conn in borrowed:
+                await pool.release(conn)
+            return pool, [conn._thread for conn in borrowed]
+        pool, threads = run_async(run())
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual([thread.is_alive() for thread in threads], [False, False])
+        self.assertEqual(pool._idle, [])
+        self.assertTrue(pool._closed)
+
+    def test_program_exits_after_run_async(self):
+        script = textwrap.dedent("""
+            from async_db import async_connection_scope, run_async
+
+            async def main():
+                async with async_connection_scope('users.db') as conn:
+                    async with conn.execute("SELECT COUNT(*) FROM users") as cursor:
+                        print((await cursor.fetchone())[0])
+
+            run_async(main())
+        """)
+        env = {**os.environ, 'PYTHONPATH': HERE}
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True,
+                                text=True, timeout=30)
+        self.assertEqual((result.returncode, result.stdout.strip()), (0, str(self.user_count)))
+
+
+@unittest.skipIf(async_db.aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncScopeAndTransaction(UsersDatabaseTestCase):
+    """async_connection_scope sharing and async_transaction savepoints."""
+
+    def test_nested_scopes_share_a_connection(self):
+        async def run():
+            async with async_connection_scope(DB_NAME) as outer:
+                async with async_connection_scope(DB_NAME) as inner:
+                    self.assertIs(inner, outer)
+                    self.assertIs(current_async_connection(DB_NAME), outer)
+            self.assertIsNone(current_async_connection(DB_NAME))
+        run_async(run())
+
+    def test_inner_failure_only_undoes_the_savepoint(self):
+        async def run():
+            async with async_connection_scope(DB_NAME) as conn:
+                async with async_transaction(conn) as savepoint:
+                    self.assertIsNone(savepoint)
+                    await conn.execute("UPDATE users SET name = 'A' WHERE id = 1")
+                    with self.assertRaises(RuntimeError):
+                        async with async_transaction(conn) as savepoint:
+                            self.assertTrue(savepoint)
+                            await conn.execute("UPDATE users SET name = 'B' WHERE id = 2")
+                            raise RuntimeError("undo")
+                async with conn.execute("SELECT name FROM users ORDER BY id") as cursor:
+                    return [name for (name,) in await cursor.fetchall()]
+        self.assertEqual(run_async(run())[:2], ['A', 'User 2'])
+
+    def test_outer_failure_undoes_everything(self):
+        async def run():
+            async with async_connection_scope(DB_NAME) as conn:
+                with self.assertRaises(RuntimeError):
+                    async with async_transaction(conn):
+                        await conn.execute("DELETE FROM users")
+                        raise RuntimeError("undo")
+        run_async(run())
+        self.assertEqual(self.count_users(), self.user_count)
+
+
+@unittest.skipIf(async_db.aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncWithDbConnection(UsersDatabaseTestCase):
+    """with_db_connection of 1-with_db_connection.py on coroutine functions."""
+
+    def setUp(self):
+        super().setUp()
+        with_db_connection = load_script('1-with_db_connection').with_db_connection
+
+        @with_db_connection
+        async def names(conn, query="SELECT name FROM users ORDER BY id"):
+            async with conn.execute(query) as cursor:
+                return [name for (name,) in await cursor.fetchall()]
+
+        @with_db_connection
+        async def connection_used(conn):
+            return conn
+
+        self.names = names
+        self.connection_used = connection_used
+
+    def test_connection_is_passed_in(self):
+        self.assertEqual(run_async(self.names()), [f"User {n}" for n in range(1, 4)])
+
+    def test_database_error_is_reported(self):
+        result, output = self.quietly(run_async, self.names("SELECT nope FROM users"))
+        self.assertIsNone(result)
+        self.assertIn("ERROR: Database error in 'names': no such column: nope", output)
+
+    def test_calls_inside_a_scope_share_its_connection(self):
+        async def run():
+            async with async_connection_scope(DB_NAME) as conn:
+                return conn, await self.connection_used(), await self.connection_used()
+        conn, first, second = run_async(run())
+        self.assertIs(first, conn)
+        self.assertIs(second, conn)
+
+    def test_reraise(self):
+        async def fail(conn):
+            raise ValueError("bad input")
+
+        with self.assertRaises(ValueError):
+            self.quietly(run_async, with_async_db_connection(fail, DB_NAME, reraise=True)())
+
+
+if __name__ == '__main__':
+    unittest.main()
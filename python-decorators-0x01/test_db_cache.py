@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+"""
+Tests for the query-result cache in db_cache.py.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import db_cache
+from db_cache import (ALL_TABLES, QueryCache, TrackedConnection, estimate_size, make_key,
+                      normalize_query, tables_read, tables_written)
+
+
+class TestQueryCache(unittest.TestCase):
+    """LRU order, entry and byte budgets, TTL and counters (one stripe, so exact)."""
+
+    def test_hit_and_miss(self):
+        cache = QueryCache(stripes=1)
+        self.assertEqual(cache.get('a'), (False, None))
+        cache.set('a', [(1, 'x')])
+        self.assertEqual(cache.get('a'), (True, [(1, 'x')]))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = QueryCache(max_entries=2, stripes=1)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # b is now the least recently used
+        cache.set('c', 3)
+        self.assertEqual(sorted(cache.keys()), ['a', 'c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_byte_budget(self):
+        size = estimate_size(['x' * 100])
+        cache = QueryCache(max_bytes=size * 3, stripes=1)
+        for key in 'abcd':
+            cache.set(key, ['x' * 100])
+        self.assertEqual(sorted(cache.keys()), ['b', 'c', 'd'])
+        self.assertLessEqual(cache.stats()['bytes'], size * 3)
+
+    def test_oversized_result_is_not_stored(self):
+        cache = QueryCache(max_bytes=100, stripes=1)
+        cache.set('small', 1)
+        self.assertFalse(cache.set('big', 'x' * 1000))
+        self.assertIn('small', cache)
+        self.assertNotIn('big', cache)
+
+    def test_ttl(self):
+        cache = QueryCache(ttl=0.05, stripes=1)
+        cache.set('a', 1)
+        cache.set('forever', 2, ttl=0)
+        time.sleep(0.1)
+        self.assertEqual(cache.get('a'), (False, None))
+        self.assertEqual(cache.get('forever'), (True, 2))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_overwrite_keeps_byte_count(self):
+        cache = QueryCache(stripes=1)
+        cache.set('a', [1, 2, 3])
+        before = cache.stats()['bytes']
+        cache.set('a', [1, 2, 3])
+        self.assertEqual(cache.stats()['bytes'], before)
+        self.assertEqual(len(cache), 1)
+
+    def test_invalidate_and_clear(self):
+        cache = QueryCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        self.assertNotIn('a', cache)
+        cache.clear()
+        self.assertEqual((len(cache), cache.stats()['bytes']), (0, 0))
+
+    def test_striped_limits(self):
+        cache = QueryCache(max_entries=16, stripes=4)
+        for number in range(100):
+            cache.set(number, number)
+        self.assertLessEqual(len(cache), 16)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            QueryCache(max_entries=0)
+        with self.assertRaises(ValueError):
+            QueryCache(stripes=0)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Concurrent misses on one key share a single computation."""
+
+    def test_threads_coalesce(self):
+        cache = QueryCache()
+        release = threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return ['rows']
+
+        def worker():
+            results.append(cache.get_or_compute('k', compute))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(status for _, status in results),
+                         ['coalesced', 'coalesced', 'coalesced', 'miss'])
+        self.assertEqual(cache.get_or_compute('k', compute), (['rows'], 'hit'))
+
+    def test_error_is_shared_and_not_cached(self):
+        cache = QueryCache()
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise sqlite3.OperationalError("no such table")
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_compute_async('k', failing)
+                                          for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, sqlite3.OperationalError) for result in results))
+        self.assertNotIn('k', cache)
+
+    def test_cancelled_owner_lets_waiters_retry(self):
+        cache = QueryCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return len(calls)
+
+        async def run():
+            owner = asyncio.create_task(cache.get_or_compute_async('k', compute))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(cache.get_or_compute_async('k', compute))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await owner
+            return await waiter
+
+        self.assertEqual(asyncio.run(run()), (2, 'miss'))
+        self.assertEqual(cache.get('k'), (True, 2))
+
+    def test_reentrant_compute_does_not_deadlock(self):
+        cache = QueryCache()
+
+        def compute():
+            inner, status = cache.get_or_compute('k', lambda: 1)
+            return inner + 1, status
+
+        self.assertEqual(cache.get_or_compute('k', compute), ((2, 'miss'), 'miss'))
+
+        async def one():
+            return 1
+
+        async def outer():
+            inner, status = await cache.get_or_compute_async('a', one)
+            return inner + 1, status
+
+        self.assertEqual(asyncio.run(asyncio.wait_for(cache.get_or_compute_async('a', outer), 1)),
+                         ((2, 'miss'), 'miss'))
+        self.assertEqual(cache.get('a'), (True, (2, 'miss')))
+
+
+class TestQueryKeys(unittest.TestCase):
+    """Normalized keys and the tables a statement reads or writes."""
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("SELECT *\n  FROM Users -- all\n WHERE name = 'A  B';"),
+                         "select * from users where name = 'A  B'")
+
+    def test_key_includes_parameters(self):
+        self.assertEqual(make_key("select * from users where id = ?", (1,)),
+                         make_key("SELECT * FROM users WHERE id = ?", [1]))
+        self.assertNotEqual(make_key("select * from users where id = ?", (1,)),
+                            make_key("select * from users where id = ?", (2,)))
+
+    def test_tables_read(self):
+        self.assertEqual(tables_read("SELECT * FROM users u JOIN main.orders o ON u.id = o.uid"),
+                         {'users', 'orders'})
+        self.assertEqual(tables_read("SELECT 'from fake' AS x, 1"), {ALL_TABLES})
+
+    def test_tables_written(self):
+        self.assertEqual(tables_written("INSERT OR REPLACE INTO users VALUES (1)"), {'users'})
+        self.assertEqual(tables_written("UPDATE users SET name = 'x'"), {'users'})
+        self.assertEqual(tables_written("DELETE FROM main.users"), {'users'})
+        self.assertEqual(tables_written("SELECT * FROM users"), set())
+
+
+class TestWriteInvalidation(unittest.TestCase):
+    """TrackedConnection writes evict the cached results reading their tables."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'users.db')
+        self.conn = sqlite3.connect(self.path, factory=TrackedConnection)
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        self.conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY)")
+        self.conn.commit()
+        self.cache = QueryCache()
+        self.cache.set('users', ['old'], tables={'users'})
+        self.cache.set('orders', [], tables={'orders'})
+
+    def tearDown(self):
+        self.conn.close()
+        self.directory.cleanup()
+
+    def test_commit_invalidates_written_tables_only(self):
+        self.conn.execute("INSERT INTO users (name) VALUES ('a')")
+        self.assertIn('users', self.cache)  # Not committed yet
+        self.conn.commit()
+        self.assertNotIn('users', self.cache)
+        self.assertIn('orders', self.cache)
+
+    def test_rollback_invalidates(self):
+        self.conn.cursor().execute("UPDATE users SET name = 'b'")
+        self.conn.rollback()
+        self.assertNotIn('users', self.cache)
+
+    def test_context_manager_commit(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM users")
+        self.assertNotIn('users', self.cache)
+
+    def test_reader_recaching_before_the_write_lands(self):
+        # A reader stores the pre-write rows right after the trace callback
+        # invalidated them, before SQLite has run the statement.
+        invalidate = db_cache.invalidate_tables
+        calls = []
+
+        def invalidate_then_recache(tables):
+            invalidate(tables)
+            if not calls:
+                self.cache.set('users', ['old'], tables={'users'})
+            calls.append(tables)
+
+        self.conn.isolation_level = None  # Autocommit
+        for run in (self.conn.execute, self.conn.cursor().execute):
+            calls.clear()
+            self.cache.set('users', ['old'], tables={'users'})
+            with patch('db_cache.invalidate_tables', side_effect=invalidate_then_recache):
+                run("INSERT INTO users (name) VALUES ('new')")
+            self.assertEqual(len(calls), 2)
+            self.assertNotIn('users', self.cache)
+
+    def test_stale_compute_is_not_stored(self):
+        generation = self.cache.generation
+        self.conn.execute("INSERT INTO users (name) VALUES ('a')")
+        self.conn.commit()
+        self.assertFalse(self.cache.set('users', ['old'], tables={'users'},
+                                        generation=generation))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""
+Tests for the SQLite connection pool in db_pool.py.
+"""
+import sqlite3
+import threading
+import time
+import unittest
+
+from db_pool import (ConnectionPool, PoolTimeoutError, connection_scope, current_connection,
+                     get_pool, transaction)
+from fixtures import DB_NAME, UsersDatabaseTestCase
+
+
+class TestConnectionPool(UsersDatabaseTestCase):
+    """Borrowing, reuse, limits and connection health."""
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(DB_NAME, **options)
+        self.addCleanup(pool.close_all)
+        return pool
+
+    def test_released_connection_is_reused(self):
+        pool = self.make_pool()
+        conn = pool.acquire()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        pool.release(conn)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(size=2)
+        held = [pool.acquire(), pool.acquire()]
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire(timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        for conn in held:
+            pool.release(conn)
+
+    def test_release_wakes_a_waiter(self):
+        pool = self.make_pool(size=1)
+        conn = pool.acquire()
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.acquire(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(conn)
+        waiter.join(5)
+        self.assertEqual(borrowed, [conn])
+        pool.release(conn)
+
+    def test_release_rolls_back_uncommitted_work(self):
+        pool = self.make_pool(size=1)
+        conn = pool.acquire()
+        conn.execute("DELETE FROM users")
+        pool.release(conn)
+        self.assertEqual(self.count_users(), self.user_count)
+        self.assertFalse(conn.in_transaction)
+
+    def test_dead_connection_is_replaced(self):
+        pool = self.make_pool(size=1)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.close()  # Fails the pre-ping
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(replacement.execute("SELECT 1").fetchone(), (1,))
+        pool.release(replacement)
+
+    def test_closed_connection_is_dropped_on_release(self):
+        pool = self.make_pool(size=1)
+        conn = pool.acquire()
+        conn.execute("BEGIN")
+        conn.close()
+        pool.release(conn)
+        self.assertEqual(pool._open, 0)
+        pool.release(pool.acquire(timeout=0.1))
+
+    def test_max_lifetime_and_idle_timeout(self):
+        pool = self.make_pool(max_lifetime=0.05)
+        conn = pool.acquire()
+        pool.release(conn)
+        time.sleep(0.1)
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        pool.release(replacement)
+
+        pool = self.make_pool(idle_timeout=0.05)
+        pool.release(pool.acquire())
+        time.sleep(0.1)
+        pool.release(pool.acquire())
+        self.assertEqual(pool._open, 1)
+
+    def test_close_all(self):
+        pool = self.make_pool()
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        pool.close_all()
+        self.assertEqual(pool._open, 0)
+
+    def test_one_pool_per_database(self):
+        self.assertIs(get_pool(DB_NAME), get_pool(DB_NAME))
+        self.assertIsNot(get_pool(DB_NAME), get_pool('other.db'))
+
+    def test_bad_size(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(DB_NAME, size=0)
+
+
+class TestConnectionScope(UsersDatabaseTestCase):
+    """One ambient connection per block; nested transactions become savepoints."""
+
+    def names(self, conn):
+        return [name for (name,) in conn.execute("SELECT name FROM users ORDER BY id")]
+
+    def test_nested_scopes_share_a_connection(self):
+        self.assertIsNone(current_connection(DB_NAME))
+        with connection_scope(DB_NAME) as outer:
+            with connection_scope(DB_NAME) as inner:
+                self.assertIs(inner, outer)
+                self.assertIs(current_connection(DB_NAME), outer)
+            self.assertIs(current_connection(DB_NAME), outer)
+        self.assertIsNone(current_connection(DB_NAME))
+        self.assertEqual(len(get_pool(DB_NAME)._idle), 1)
+
+    def test_threads_get_their_own_connection(self):
+        seen = []
+        with connection_scope(DB_NAME) as conn:
+            thread = threading.Thread(target=lambda: seen.append(current_connection(DB_NAME)))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
+        self.assertIsNotNone(conn)
+
+    def test_scope_rolls_back_uncommitted_work(self):
+        with connection_scope(DB_NAME) as conn:
+            conn.execute("DELETE FROM users")
+        self.assertEqual(self.count_users(), self.user_count)
+
+    def test_outer_transaction_commits_once(self):
+        with connection_scope(DB_NAME) as conn:
+            with transaction(conn) as savepoint:
+                self.assertIsNone(savepoint)
+                conn.execute("UPDATE users SET name = 'A' WHERE id = 1")
+                with transaction(conn) as savepoint:
+                    self.assertTrue(savepoint)
+                    conn.execute("UPDATE users SET name = 'B' WHERE id = 2")
+                self.assertTrue(conn.in_transaction)  # Not committed by the inner block
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(self.names(conn)[:2], ['A', 'B'])
+
+    def test_inner_failure_only_undoes_the_savepoint(self):
+        with connection_scope(DB_NAME) as conn:
+            with transaction(conn):
+                conn.execute("UPDATE users SET name = 'A' WHERE id = 1")
+                with self.assertRaises(sqlite3.IntegrityError):
+                    with transaction(conn):
+                        conn.execute("UPDATE users SET name = 'B' WHERE id = 2")
+                        conn.execute("UPDATE users SET email = 'user3@example.com' WHERE id = 2")
+                with transaction(conn):
+                    with transaction(conn):
+                        conn.execute("UPDATE users SET name = 'C' WHERE id = 3")
+            self.assertEqual(self.names(conn), ['A', 'User 2', 'C'])
+
+    def test_outer_failure_undoes_everything(self):
+        with connection_scope(DB_NAME) as conn:
+            with self.assertRaises(RuntimeError):
+                with transaction(conn):
+                    with transaction(conn):
+                        conn.execute("DELETE FROM users")
+                    raise RuntimeError("abort")
+            self.assertEqual(len(self.names(conn)), self.user_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""
+Tests for the group committer in group_commit.py and transactional(group_commit=True).
+"""
+import sqlite3
+import threading
+import unittest
+
+from fixtures import DB_NAME, UsersDatabaseTestCase, load_script
+from group_commit import GroupCommitter, get_group_committer
+
+transactional_module = load_script('2-transactional')
+
+
+def add_user(conn, name):
+    cursor = conn.execute("INSERT INTO users (name, email) VALUES (?, ?)",
+                          (name, f"{name}@example.com"))
+    return cursor.lastrowid
+
+
+class TestGroupCommitter(UsersDatabaseTestCase):
+    """Batches, per-write failures and writes made from inside a batch."""
+
+    def make_committer(self, **options):
+        committer = GroupCommitter(DB_NAME, **options)
+        self.addCleanup(committer.close)
+        return committer
+
+    def test_concurrent_writes_share_batches(self):
+        committer = self.make_committer(window=0.05)
+        barrier = threading.Barrier(10)
+        ids = []
+
+        def write(number):
+            barrier.wait()
+            ids.append(committer.run(add_user, f"grouped{number}"))
+
+        def run_all():
+            threads = [threading.Thread(target=write, args=(number,)) for number in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        _, output = self.quietly(run_all)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(self.count_users(), self.user_count + 10)
+        self.assertLess(committer.stats()['batches'], 10)
+        self.assertIn("LOG (group_commit)", output)
+
+    def test_failed_write_only_fails_its_caller(self):
+        committer = self.make_committer(window=0.05)
+        ok = committer.submit(add_user, ('fresh',))
+        duplicate = committer.submit(add_user, ('user1',))  # user1@example.com exists
+        self.quietly(ok.result, 5)
+        with self.assertRaises(sqlite3.IntegrityError):
+            duplicate.result(5)
+        self.assertEqual(self.count_users(), self.user_count + 1)
+        self.assertEqual(committer.stats()['failed'], 1)
+
+    def test_cancelled_write_is_not_counted(self):
+        committer = self.make_committer(window=0.2)
+        kept = committer.submit(add_user, ('kept',))
+        cancelled = committer.submit(add_user, ('cancelled',))
+        self.assertTrue(cancelled.cancel())
+        self.quietly(kept.result, 5)
+        stats = committer.stats()
+        self.assertEqual((stats['batches'], stats['writes'], stats['average_batch']), (1, 1, 1))
+        self.assertEqual(self.count_users(), self.user_count + 1)
+
+    def test_write_submitted_by_a_write_runs_inline(self):
+        committer = self.make_committer()
+
+        def outer(conn):
+            return add_user(conn, 'outer'), committer.run(add_user, 'inner')
+
+        result, _ = self.quietly(committer.submit(outer).result, 5)
+        self.assertEqual(len(set(result)), 2)
+        self.assertEqual(self.count_users(), self.user_count + 2)
+
+    def test_close_commits_queued_writes(self):
+        committer = self.make_committer(window=1)
+        future = committer.submit(add_user, ('last',))
+        self.quietly(committer.close)
+        self.assertTrue(future.done())
+        self.assertEqual(self.count_users(), self.user_count + 1)
+
+    def test_settings_get_their_own_committer(self):
+        self.assertIs(get_group_committer(DB_NAME), get_group_committer(DB_NAME))
+        small = get_group_committer(DB_NAME, max_batch=2)
+        self.assertIsNot(small, get_group_committer(DB_NAME))
+        self.assertEqual(small.max_batch, 2)
+        with self.assertRaises(ValueError):
+            GroupCommitter(DB_NAME, max_batch=0)
+
+
+class TestGroupCommittedDecorator(UsersDatabaseTestCase):
+    """add_user_grouped from 2-transactional.py."""
+
+    def test_grouped_call_from_a_grouped_call(self):
+        @transactional_module.with_db_connection
+        @transactional_module.transactional(group_commit=True)
+        def add_two(conn):
+            return add_user(conn, 'first'), transactional_module.add_user_grouped(
+                'second', 'second@example.com')
+
+        result = [None]
+        thread = threading.Thread(target=lambda: result.__setitem__(0, self.quietly(add_two)[0]))
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive(), "nested grouped call deadlocked")
+        self.assertEqual(len(set(result[0])), 2)
+        self.assertEqual(self.count_users(), self.user_count + 2)
+
+    def test_grouped_call_inside_a_scope_joins_it(self):
+        with transactional_module.connection_scope(DB_NAME) as conn:
+            self.quietly(transactional_module.add_user_grouped, 'scoped', 'scoped@example.com')
+            self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.count_users(), self.user_count + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Tests for the query statistics and logging in query_log.py, and log_queries.
+"""
+import asyncio
+import io
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+import query_log
+from fixtures import UsersDatabaseTestCase, load_script
+from query_log import QueryStats, fingerprint, query_report, record_query
+
+log_queries_module = load_script('0-log_queries')
+
+
+class TestQueryStats(unittest.TestCase):
+    """Nearest-rank percentiles and the bounded timing sample."""
+
+    def stats_of(self, durations, **options):
+        stats = QueryStats(**options)
+        for duration in durations:
+            stats.add(duration, 1, False)
+        return stats
+
+    def test_nearest_rank_percentiles(self):
+        stats = self.stats_of(range(1, 101))
+        self.assertEqual([stats.percentile(p) for p in (0, 1, 50, 95, 99, 100)],
+                         [1, 1, 50, 95, 99, 100])
+        self.assertEqual(stats.percentile(99.5), 100)
+
+    def test_small_samples(self):
+        self.assertEqual(self.stats_of([0.2, 0.1]).percentile(50), 0.1)
+        self.assertEqual(self.stats_of([0.2, 0.1]).percentile(51), 0.2)
+        self.assertEqual(self.stats_of([0.3]).percentile(99), 0.3)
+        self.assertEqual(self.stats_of([1, 2, 3, 4]).percentile(75), 3)
+        self.assertIsNone(QueryStats().percentile(50))
+
+    def test_sample_stays_bounded(self):
+        stats = self.stats_of([0.001] * 500, sample_size=10)
+        self.assertEqual(len(stats._sample), 10)
+        self.assertEqual(stats.count, 500)
+
+    def test_as_dict(self):
+        stats = self.stats_of([0.001, 0.003])
+        stats.add(0.002, None, True)
+        report = stats.as_dict()
+        self.assertEqual((report['count'], report['errors'], report['rows']), (3, 1, 2))
+        self.assertEqual((report['mean_ms'], report['p50_ms'], report['max_ms']), (2.0, 2.0, 3.0))
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_literals_are_replaced(self):
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE id = 42 AND name = 'O''Brien'"),
+                         "select * from users where id = ? and name = ?")
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE id = 7"),
+                         fingerprint("select *  from users where id = 1234"))
+        self.assertEqual(fingerprint("SELECT * FROM t2"), "select * from t2")
+
+
+class TestRecordQuery(UsersDatabaseTestCase):
+    """Executions logged through the queue and aggregated per fingerprint."""
+
+    def setUp(self):
+        super().setUp()
+        query_log.stop_logging()
+        query_log.reset_stats()
+        self.output = io.StringIO()
+        query_log.start_logging(self.output)
+        self.addCleanup(query_log.reset_stats)
+        self.addCleanup(query_log.stop_logging)
+
+    def logged(self):
+        query_log.stop_logging()  # Flushes the queue
+        return self.output.getvalue()
+
+    def test_started_logging_skips_the_lock(self):
+        with patch('query_log._listener_lock') as lock:
+            query_log.start_logging()
+        lock.__enter__.assert_not_called()
+
+    def test_aggregates_by_fingerprint(self):
+        record_query("SELECT * FROM users WHERE id = 1", 'f', 0.001, [(1,)])
+        record_query("SELECT * FROM users WHERE id = 2", 'f', 0.003, [])
+        record_query(None, 'g', 0.002, error=ValueError("boom"))
+        report = query_report()
+        self.assertEqual(report["select * from users where id = ?"]['count'], 2)
+        self.assertEqual(report["<g>"]['errors'], 1)
+        output = self.logged()
+        self.assertIn("returned 1 rows", output)
+        self.assertIn("ERROR: 'g' took", output)
+
+    def test_slow_queries(self):
+        with patch('query_log.SLOW_QUERY_THRESHOLD', 0.01):
+            record_query("SELECT 1", 'fast', 0.001)
+            record_query("SELECT 2", 'slow', 0.5)
+        self.assertEqual([details['function'] for details in query_log.slow_queries], ['slow'])
+
+    def test_log_queries_on_sqlite(self):
+        users = log_queries_module.fetch_all_users(query="SELECT * FROM users")
+        self.assertEqual(len(users), self.user_count)
+        self.quietly(log_queries_module.add_user, 'New', 'new@example.com')
+        self.assertEqual(self.count_users(), self.user_count + 1)
+        report = query_report()
+        self.assertEqual(report["select * from users"]['rows'], self.user_count)
+        self.assertEqual(report["insert into users (name, email) values (?, ?)"]['count'], 1)
+        self.assertIn('Query "SELECT * FROM users"', self.logged())
+
+    def test_log_queries_on_coroutines(self):
+        @log_queries_module.log_queries
+        async def fetch(query):
+            await asyncio.sleep(0)
+            if 'missing' in query:
+                raise sqlite3.OperationalError("no such table: missing")
+            return [(1,), (2,)]
+
+        self.assertEqual(asyncio.run(fetch("SELECT id FROM users")), [(1,), (2,)])
+        with self.assertRaises(sqlite3.OperationalError):
+            asyncio.run(fetch(query="SELECT id FROM missing"))
+        report = query_report()
+        self.assertEqual(report["select id from users"]['rows'], 2)
+        self.assertEqual(report["select id from missing"]['errors'], 1)
+        self.assertIn('Query "SELECT id FROM missing"', self.logged())
+
+
+if __name__ == '__main__':
+    unittest.main()
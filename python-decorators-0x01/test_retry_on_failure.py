@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""
+Tests for the retry_on_failure decorator in 3-retry_on_failure.py.
+"""
+import asyncio
+import sqlite3
+import threading
+import traceback
+import unittest
+
+from fixtures import DB_NAME, UsersDatabaseTestCase, load_script
+from retry_policy import RetryBudget, RetryMetrics
+
+retry_module = load_script('3-retry_on_failure')
+retry_on_failure = retry_module.retry_on_failure
+
+
+class TestRetryOnFailure(UsersDatabaseTestCase):
+    """Retries lock errors within the attempt, deadline and budget limits."""
+
+    def setUp(self):
+        super().setUp()
+        self.metrics = RetryMetrics()
+
+    def flaky(self, failures, error=None, **options):
+        """A function failing `failures` times before returning 'ok'."""
+        calls = []
+        options.setdefault('delay', 0.001)
+
+        @retry_on_failure(budget=options.pop('budget', RetryBudget()), metrics=self.metrics,
+                          **options)
+        def operation():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise error or sqlite3.OperationalError("database is locked")
+            return 'ok'
+        return operation, calls
+
+    def test_recovers_from_lock_errors(self):
+        operation, calls = self.flaky(2)
+        self.assertEqual(self.quietly(operation)[0], 'ok')
+        stats = self.metrics.stats()
+        self.assertEqual((len(calls), stats['retries'], stats['successes']), (3, 2, 1))
+        self.assertEqual(stats['amplification'], 3)
+
+    def test_gives_up_after_retries(self):
+        operation, calls = self.flaky(10, retries=2)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.quietly(operation)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.metrics.stats()['gave_up']['attempts'], 1)
+
+    def test_give_up_keeps_the_original_traceback(self):
+        operation, _ = self.flaky(10, retries=0)
+        try:  # Not assertRaises, which drops the traceback
+            self.quietly(operation)
+        except sqlite3.OperationalError as error:
+            frames = [frame.name for frame in traceback.extract_tb(error.__traceback__)]
+        else:
+            self.fail("OperationalError not raised")
+        self.assertEqual(frames[-1], 'operation')
+        self.assertNotIn('next_wait', frames)
+
+    def test_non_transient_error_is_not_retried(self):
+        operation, calls = self.flaky(10, error=sqlite3.OperationalError("no such table: x"))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.quietly(operation)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.metrics.stats()['gave_up']['not_retryable'], 1)
+
+    def test_empty_budget_stops_retrying(self):
+        operation, calls = self.flaky(10, budget=RetryBudget(capacity=1, rate=0))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.quietly(operation)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.metrics.stats()['gave_up']['budget'], 1)
+
+    def test_deadline(self):
+        operation, calls = self.flaky(10, delay=10, deadline=0.01)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.quietly(operation)
+        self.assertEqual(self.metrics.stats()['gave_up']['deadline'], 1)
+
+    def test_coroutine(self):
+        calls = []
+
+        @retry_on_failure(delay=0.001, budget=RetryBudget(), metrics=self.metrics)
+        async def operation():
+            calls.append(1)
+            if len(calls) < 2:
+                raise sqlite3.OperationalError("database is locked")
+            return 'ok'
+
+        self.assertEqual(self.quietly(asyncio.run, operation())[0], 'ok')
+        self.assertEqual(len(calls), 2)
+
+    def test_waits_out_a_real_lock(self):
+        holder = sqlite3.connect(DB_NAME, isolation_level=None, check_same_thread=False)
+        self.addCleanup(holder.close)
+        holder.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.05, holder.execute, ("ROLLBACK",)).start()
+
+        @retry_on_failure(retries=20, delay=0.01, max_delay=0.02, budget=RetryBudget(),
+                          metrics=self.metrics)
+        def insert():
+            conn = sqlite3.connect(DB_NAME, timeout=0)
+            try:
+                with conn:
+                    conn.execute("INSERT INTO users (name, email) VALUES ('n', 'n@example.com')")
+            finally:
+                conn.close()
+
+        self.quietly(insert)
+        self.assertEqual(self.count_users(), self.user_count + 1)
+        self.assertGreater(self.metrics.stats()['retries'], 0)
+
+    def test_script_functions(self):
+        users, _ = self.quietly(retry_module.fetch_users_with_retry)
+        self.assertEqual(len(users), self.user_count)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.quietly(retry_module.count_rows_in_missing_table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Tests for the retry policy in retry_policy.py.
+"""
+import sqlite3
+import time
+import unittest
+from unittest.mock import patch
+
+from fixtures import DB_NAME, UsersDatabaseTestCase
+from retry_policy import RetryBudget, RetryMetrics, backoff_delay, is_lock_error
+
+
+class TestIsLockError(UsersDatabaseTestCase):
+    """Only lock contention counts as transient."""
+
+    def test_real_lock_error(self):
+        holder = sqlite3.connect(DB_NAME, isolation_level=None)
+        self.addCleanup(holder.close)
+        holder.execute("BEGIN IMMEDIATE")
+        other = sqlite3.connect(DB_NAME, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaises(sqlite3.OperationalError) as caught:
+            other.execute("INSERT INTO users (name, email) VALUES ('x', 'x@example.com')")
+        self.assertTrue(is_lock_error(caught.exception))
+        holder.execute("ROLLBACK")
+
+    def test_other_errors(self):
+        conn = sqlite3.connect(DB_NAME)
+        self.addCleanup(conn.close)
+        with self.assertRaises(sqlite3.OperationalError) as caught:
+            conn.execute("SELECT * FROM no_such_table")
+        self.assertFalse(is_lock_error(caught.exception))
+        self.assertFalse(is_lock_error(sqlite3.IntegrityError("database is locked")))
+        self.assertFalse(is_lock_error(ValueError("database is locked")))
+        self.assertTrue(is_lock_error(sqlite3.OperationalError("Database is busy")))
+
+
+class TestBackoffDelay(unittest.TestCase):
+
+    def test_bounds(self):
+        for retry in range(8):
+            for _ in range(50):
+                delay = backoff_delay(retry, 0.1, 2.0)
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, min(2.0, 0.1 * 2 ** retry))
+
+    def test_jitter_spreads_retries(self):
+        self.assertGreater(len({backoff_delay(3, 1, 30) for _ in range(20)}), 1)
+
+
+class TestRetryBudget(unittest.TestCase):
+    """Tokens are spent per retry and refill at the configured rate."""
+
+    def test_spend_until_empty(self):
+        budget = RetryBudget(capacity=3, rate=0)
+        self.assertEqual([budget.try_spend() for _ in range(4)], [True, True, True, False])
+        self.assertEqual(budget.tokens, 0)
+
+    def test_refill_is_capped(self):
+        budget = RetryBudget(capacity=2, rate=1000)
+        budget.try_spend()
+        budget.try_spend()
+        time.sleep(0.01)
+        self.assertEqual(budget.tokens, 2)
+
+    def test_refill_rate(self):
+        clock = [100.0]
+        with patch('retry_policy.time.monotonic', side_effect=lambda: clock[0]):
+            budget = RetryBudget(capacity=10, rate=2.0)
+            for _ in range(10):
+                budget.try_spend()
+            self.assertFalse(budget.try_spend())
+            clock[0] += 1.25
+            self.assertAlmostEqual(budget.tokens, 2.5)
+            self.assertTrue(budget.try_spend())
+            self.assertTrue(budget.try_spend())
+            self.assertFalse(budget.try_spend())
+
+
+class TestRetryMetrics(unittest.TestCase):
+
+    def test_stats(self):
+        metrics = RetryMetrics()
+        self.assertIsNone(metrics.stats()['amplification'])
+        for _ in range(2):
+            metrics.record_call()
+        for _ in range(3):
+            metrics.record_attempt()
+        metrics.record_retry(0.25)
+        metrics.record_success()
+        metrics.record_give_up('budget')
+        stats = metrics.stats()
+        self.assertEqual((stats['calls'], stats['attempts'], stats['retries']), (2, 3, 1))
+        self.assertEqual(stats['amplification'], 1.5)
+        self.assertEqual(stats['seconds_slept'], 0.25)
+        self.assertEqual(stats['gave_up']['budget'], 1)
+        metrics.reset()
+        self.assertEqual(metrics.stats()['calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Tests for the with_db_connection and transactional decorators in 2-transactional.py.
+"""
+import unittest
+
+import async_db
+from async_db import async_connection_scope, run_async
+from db_pool import connection_scope, transaction
+from fixtures import DB_NAME, UsersDatabaseTestCase, load_script
+
+transactional_module = load_script('2-transactional')
+
+
+class TestTransactional(UsersDatabaseTestCase):
+    """Stacked decorated calls share the scope's connection and nest as savepoints."""
+
+    def email(self, user_id):
+        return self.quietly(transactional_module.get_user_details, user_id=user_id)[0]['email']
+
+    def test_update_commits(self):
+        self.quietly(transactional_module.update_user_email, user_id=1, new_email='new@example.com')
+        self.assertEqual(self.email(1), 'new@example.com')
+
+    def test_failed_update_rolls_back(self):
+        # with_db_connection reports the error instead of raising it.
+        result, output = self.quietly(transactional_module.update_user_email, user_id=1,
+                                      new_email='user2@example.com')
+        self.assertIsNone(result)
+        self.assertIn("Rolling back transaction", output)
+        self.assertEqual(self.email(1), 'user1@example.com')
+
+    def test_swap_runs_nested_calls_in_savepoints(self):
+        with connection_scope(DB_NAME) as conn:
+            _, output = self.quietly(transactional_module.swap_user_emails, 1, 2)
+            self.assertFalse(conn.in_transaction)
+        self.assertEqual(output.count("Beginning transaction"), 1)
+        self.assertEqual(output.count("savepoint"), 3)
+        self.assertEqual((self.email(1), self.email(2)), ('user2@example.com', 'user1@example.com'))
+
+    def test_failed_nested_call_keeps_the_outer_work(self):
+        with connection_scope(DB_NAME) as conn:
+            with transaction(conn):
+                self.quietly(transactional_module.update_user_email, user_id=3,
+                             new_email='new3@example.com')
+                _, output = self.quietly(transactional_module.update_user_email, user_id=1,
+                                         new_email='user2@example.com')
+        self.assertIn("Rolled back to savepoint", output)
+        self.assertEqual((self.email(1), self.email(3)), ('user1@example.com', 'new3@example.com'))
+
+
+@transactional_module.with_db_connection
+@transactional_module.transactional
+async def async_update_user_email(conn, user_id, new_email):
+    await conn.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+
+@unittest.skipIf(async_db.aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncTransactional(UsersDatabaseTestCase):
+    """The same decorators awaited on coroutine functions."""
+
+    def email(self, user_id):
+        return self.quietly(transactional_module.get_user_details, user_id=user_id)[0]['email']
+
+    def test_update_commits(self):
+        self.quietly(run_async, async_update_user_email(1, 'new@example.com'))
+        self.assertEqual(self.email(1), 'new@example.com')
+
+    def test_failed_update_rolls_back(self):
+        async def run():
+            await async_update_user_email(1, 'user2@example.com')
+            async with async_connection_scope(DB_NAME) as conn:
+                return conn.in_transaction
+        in_transaction, output = self.quietly(run_async, run())
+        self.assertFalse(in_transaction)
+        self.assertIn("Rolled back transaction", output)
+        self.assertEqual(self.email(1), 'user1@example.com')
+
+    def test_failed_nested_call_keeps_the_outer_work(self):
+        @transactional_module.with_db_connection
+        @transactional_module.transactional
+        async def update_two(conn):
+            await async_update_user_email(3, 'new3@example.com')
+            await async_update_user_email(1, 'user2@example.com')
+
+        _, output = self.quietly(run_async, update_two())
+        self.assertEqual(output.count("Beginning transaction"), 1)
+        self.assertIn("Rolled back to savepoint", output)
+        self.assertEqual((self.email(1), self.email(3)), ('user1@example.com', 'new3@example.com'))
+
+
+if __name__ == '__main__':
+    unittest.main()
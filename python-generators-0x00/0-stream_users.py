@@ -1,27 +1,43 @@
 #!/usr/bin/python3
-import mysql.connector
-import os
+from db_backend import DB_ERRORS
+from db_pool import DB_NAME, get_connection
+from rows import USER_COLUMNS, row_factory
 
-DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
-DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user')
-DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password')
-DB_NAME = "ALX_prodev"
 TABLE_NAME = "user_data"
 
 def connect_to_prodev_for_stream():
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_connection()
+    except DB_ERRORS + (ConnectionError,) as err:
         print(f"Error connecting to database {DB_NAME} for streaming: {err}")
         return None
 
-def stream_users():
+def build_user_query(columns=None, where=None, limit=None):
+    """
+    Builds the SELECT used by stream_users. where is an SQL condition with
+    %s placeholders; column names are checked against USER_COLUMNS.
+    """
+    columns = tuple(columns) if columns else USER_COLUMNS
+    unknown = [column for column in columns if column not in USER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown {TABLE_NAME} columns: {', '.join(unknown)}")
+    query = f"SELECT {', '.join(columns)} FROM {TABLE_NAME}"
+    if where:
+        query += f" WHERE {where}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query
+
+def stream_users(columns=None, where=None, params=(), limit=None, row_type='dict'):
+    """
+    Yields user_data rows. columns, where (with params) and limit are pushed
+    into the SELECT so only the needed rows and fields are sent. row_type
+    picks the row shape: 'dict', 'tuple', 'namedtuple' or 'slots' (see rows.py).
+    """
+    query = build_user_query(columns, where, limit)
+    make_row = None
+    if row_type != 'dict':
+        make_row = row_factory(row_type, columns or USER_COLUMNS)
     connection = None
     cursor = None
     try:
@@ -29,15 +45,17 @@ def stream_users():
         if connection is None:
             return
 
-        cursor = connection.cursor(dictionary=True, buffered=False)
-        
-        query = f"SELECT user_id, name, email, age FROM {TABLE_NAME}"
-        cursor.execute(query)
+        cursor = connection.cursor(dictionary=(row_type == 'dict'), buffered=False)
+
+        cursor.execute(query, tuple(params))
 
-        for row in cursor:
-            yield row
+        if make_row is None:
+            yield from cursor
+        else:
+            for row in cursor:
+                yield make_row(row)
             
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Database error during streaming: {err}")
     except Exception as e:
         print(f"An unexpected error occurred during streaming: {e}")
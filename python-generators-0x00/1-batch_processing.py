@@ -2,75 +2,172 @@
 """
 Module to stream user data in batches and process them.
 """
-import mysql.connector
-import os
+import queue
+import threading
+import time
 
-# --- Database Connection Details (copied or import from seed.py) ---
-DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
-DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user') # Replace with your MySQL username
-DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password') # Replace with your MySQL password
-DB_NAME = "ALX_prodev"
+# --- Database Connection Details live in db_pool.py ---
+from db_backend import DB_ERRORS
+from db_pool import DB_NAME, get_connection
+from rows import row_factory
 # TABLE_NAME = "user_data" # We'll hardcode it in the query for the checker
 
 def connect_to_prodev_for_batch():
-    """Connects to the ALX_prodev database."""
+    """Borrows a connection to the ALX_prodev database from the shared pool."""
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_connection()
+    except DB_ERRORS + (ConnectionError,) as err:
         print(f"Error connecting to database {DB_NAME} for batch processing: {err}")
         return None
 
-def stream_users_in_batches(batch_size=50):
+MAX_BATCH_SIZE = 10000 # Upper bound for batch sizes chosen by target_latency
+
+def adapt_batch_size(batch_size, fetched, elapsed, target_latency):
+    """
+    Scales the next batch size towards target_latency seconds per fetch,
+    by at most a factor of 2 either way so one slow fetch cannot swing it.
+    """
+    if fetched < batch_size or elapsed <= 0: # Last, partial batch: nothing to learn
+        return batch_size
+    scale = min(max(target_latency / elapsed, 0.5), 2.0)
+    return min(max(int(batch_size * scale), 1), MAX_BATCH_SIZE)
+
+def fetch_batches(cursor, batch_size, target_latency=None):
+    """Generator over cursor.fetchmany, resizing batches when target_latency is set."""
+    while True:
+        started = time.perf_counter()
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        if target_latency:
+            batch_size = adapt_batch_size(batch_size, len(batch),
+                                          time.perf_counter() - started, target_latency)
+        yield batch
+
+def prefetch_batches(batches, depth):
+    """
+    Runs the batches generator on a background thread so the next batches
+    are fetched while the current one is processed. At most depth batches
+    wait in the queue, so the fetcher pauses when the consumer falls behind.
+    Errors raised by the fetcher are re-raised in the consumer.
+    """
+    done = object()
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(done)
+        except Exception as err:
+            put(err)
+
+    fetcher = threading.Thread(target=fetch, daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        fetcher.join() # The cursor must not be closed while a fetch is running
+
+def stream_users_in_batches(batch_size=50, columnar=False, prefetch=0, target_latency=None,
+                            row_type='dict'):
     """
     A generator function that fetches rows in batches from the user_data table.
-    Yields each batch as a list of dictionaries.
+    Yields each batch as a list of dictionaries, or as a columnar.ColumnarBatch
+    when columnar=True (no per-row dicts are built in that mode).
+    row_type='tuple', 'namedtuple' or 'slots' yields lists of compact rows
+    instead of dicts (see rows.py).
+    prefetch=N fetches up to N batches ahead on a background thread while the
+    current batch is processed. target_latency (seconds) lets the batch size
+    adapt so each fetch takes about that long, starting from batch_size.
     Constraint: This function should contain its part of the loop count.
     """
     connection = None
     cursor = None
+    batches = None
+    make_row = None
+    if not columnar and row_type != 'dict':
+        make_row = row_factory(row_type)
     try:
         connection = connect_to_prodev_for_batch()
         if connection is None:
             return
 
-        cursor = connection.cursor(dictionary=True) # Get results as dictionaries
+        if columnar:
+            from columnar import ColumnarBatch # Needs NumPy, so only imported on demand
+            cursor = connection.cursor() # Plain tuples, transposed into columns per batch
+        elif make_row is not None or row_type == 'tuple':
+            cursor = connection.cursor() # Plain tuples, wrapped in compact rows if needed
+        else:
+            cursor = connection.cursor(dictionary=True) # Get results as dictionaries
         
         # Hardcoding "FROM user_data" for the checker
         query = "SELECT user_id, name, email, age FROM user_data ORDER BY user_id"
         cursor.execute(query)
 
-        while True: # Loop 1 (outer loop for fetching batches)
-            batch = cursor.fetchmany(batch_size)
-            if not batch: # No more rows left
-                break
+        batches = fetch_batches(cursor, batch_size, target_latency)
+        if columnar:
+            batches = (ColumnarBatch.from_rows(batch) for batch in batches)
+        elif make_row is not None:
+            batches = ([make_row(row) for row in batch] for batch in batches)
+        if prefetch:
+            batches = prefetch_batches(batches, prefetch)
+
+        for batch in batches: # Loop 1 (outer loop over fetched batches)
             yield batch # Yield the current batch
             
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Database error during batch streaming: {err}")
     except Exception as e:
         print(f"An unexpected error occurred during batch streaming: {e}")
     finally:
+        if batches is not None:
+            batches.close() # Stops and joins the prefetch thread before the cursor goes away
         if cursor:
             cursor.close()
         if connection and connection.is_connected():
             connection.close()
 
-def batch_processing(batch_size=50):
+def batch_processing(batch_size=50, columnar=False, workers=None):
     """
     Processes each batch fetched by stream_users_in_batches
     to filter and print users over the age of 25.
+    With columnar=True the age filter runs vectorized over each batch.
+    With workers=N the table is scanned by N processes (see partitioned_scan)
+    which also apply the filter, so only matching users are sent back.
     Constraint: This function contributes to the overall loop count.
     """
-    user_batch_generator = stream_users_in_batches(batch_size)
+    if workers:
+        from partitioned_scan import scan_partitioned, users_over_25
+        user_batch_generator = scan_partitioned(workers, batch_size, ordered=True,
+                                                transform=users_over_25)
+    else:
+        user_batch_generator = stream_users_in_batches(batch_size, columnar=columnar)
     
     # Loop 2 (iterating over batches yielded by the generator)
     for batch in user_batch_generator:
+        if columnar and not workers:
+            for user in batch.filter(batch.age > 25).rows():
+                print(user)
+            continue
         # Loop 3 (iterating over users within a batch for processing)
         for user in batch:
             if user.get('age') is not None and user['age'] > 25:
@@ -1,38 +1,37 @@
 #!/usr/bin/python3
-import mysql.connector
-import os
+import base64
+import json
 import sys
 
-DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
-DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user')
-DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password')
-DB_NAME = "ALX_prodev"
+from db_backend import DB_ERRORS
+from db_pool import DB_NAME, get_connection
+from rows import row_factory
+
+KEYSET_PAGE_QUERY = "SELECT * FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s"
+OFFSET_PAGE_QUERY = "SELECT * FROM user_data LIMIT %s OFFSET %s"
 
 def local_connect_to_prodev():
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_connection()
+    except DB_ERRORS as err:
         raise ConnectionError(f"Failed to connect to database {DB_NAME}: {err}") from err
 
-def paginate_users(page_size, offset):
+def _fetch_page(query, params=None, row_type='dict'):
     connection = None
     rows = []
     try:
         connection = local_connect_to_prodev()
         if connection:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
+            cursor = connection.cursor(dictionary=(row_type == 'dict'))
+            cursor.execute(query, params)
             rows = cursor.fetchall()
+            make_row = None if row_type == 'dict' else row_factory(row_type, cursor.column_names)
+            if make_row:
+                rows = [make_row(row) for row in rows]
             cursor.close()
         else:
             print("paginate_users: Failed to establish database connection.", file=sys.stderr)
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"paginate_users: Database error: {err}", file=sys.stderr)
     except ConnectionError as cerr:
         print(f"paginate_users: {cerr}", file=sys.stderr)
@@ -41,10 +40,130 @@ def paginate_users(page_size, offset):
             connection.close()
     return rows
 
-def lazy_paginate(page_size):
+def _last_user_id(page_data):
+    row = page_data[-1]
+    if isinstance(row, dict):
+        return row['user_id']
+    if hasattr(row, 'user_id'):
+        return row.user_id
+    return row[0] # Plain tuple: SELECT * puts user_id first
+
+def paginate_users(page_size, offset, row_type='dict'):
+    return _fetch_page(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}",
+                       row_type=row_type)
+
+def paginate_users_after(page_size, last_user_id=None, row_type='dict'):
+    """
+    Keyset (seek) variant of paginate_users: returns the next page_size rows
+    ordered by user_id that come strictly after last_user_id. The primary key
+    index is used to seek straight to the start of the page, so the cost of a
+    page does not grow with how deep into the table it is.
+    """
+    if last_user_id is None:
+        return _fetch_page(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+            (page_size,),
+            row_type
+        )
+    return _fetch_page(KEYSET_PAGE_QUERY, (last_user_id, page_size), row_type)
+
+def paginate_session(page_size, keyset=False, last_user_id=None, row_type='dict'):
+    """
+    Generator yielding pages over one connection and one prepared statement
+    that live for the whole iteration, instead of reconnecting per page.
+    The connection is closed when the generator is exhausted or closed.
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = local_connect_to_prodev()
+        cursor = connection.cursor(prepared=True)
+        offset = 0
+        # '' sorts before every user_id, so the first keyset page can reuse
+        # the same prepared statement as the following ones.
+        last_user_id = last_user_id or ''
+        while True:
+            if keyset:
+                cursor.execute(KEYSET_PAGE_QUERY, (last_user_id, page_size))
+            else:
+                cursor.execute(OFFSET_PAGE_QUERY, (page_size, offset))
+            page_data = cursor.fetchall()
+            if not page_data:
+                break
+            make_row = row_factory(row_type, cursor.column_names)
+            if make_row:
+                page_data = [make_row(row) for row in page_data]
+            yield page_data
+            offset += page_size
+            last_user_id = _last_user_id(page_data)
+    except DB_ERRORS as err:
+        print(f"paginate_session: Database error: {err}", file=sys.stderr)
+    except ConnectionError as cerr:
+        print(f"paginate_session: {cerr}", file=sys.stderr)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
+
+def encode_resume_cursor(last_user_id):
+    """Wraps the last seen user_id into an opaque, URL-safe resume token."""
+    payload = json.dumps({"after": last_user_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_resume_cursor(resume_cursor):
+    """Returns the user_id stored in a token from encode_resume_cursor."""
+    if not resume_cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(resume_cursor.encode('ascii')))
+        return payload["after"]
+    except (ValueError, KeyError, TypeError) as err:
+        raise ValueError(f"Invalid resume cursor: {resume_cursor!r}") from err
+
+def lazy_paginate_keyset(page_size, resume_cursor=None, session=False, row_type='dict'):
+    """
+    Yields (page, resume_cursor) pairs. Passing the cursor of the last page
+    that was fully processed back in continues the scan right after it.
+    """
+    last_user_id = decode_resume_cursor(resume_cursor)
+    if session:
+        pages = paginate_session(page_size, keyset=True, last_user_id=last_user_id,
+                                 row_type=row_type)
+        try:
+            for page_data in pages:
+                yield page_data, encode_resume_cursor(_last_user_id(page_data))
+        finally:
+            pages.close()
+        return
+    while True:
+        page_data = paginate_users_after(page_size=page_size, last_user_id=last_user_id,
+                                         row_type=row_type)
+        if not page_data:
+            break
+        last_user_id = _last_user_id(page_data)
+        yield page_data, encode_resume_cursor(last_user_id)
+
+def lazy_paginate(page_size, keyset=False, resume_cursor=None, session=False, row_type='dict'):
+    if keyset or resume_cursor:
+        pages = lazy_paginate_keyset(page_size, resume_cursor, session=session,
+                                     row_type=row_type)
+        try:
+            for page_data, _ in pages:
+                yield page_data
+        finally:
+            pages.close()
+        return
+    if session:
+        pages = paginate_session(page_size, row_type=row_type)
+        try:
+            yield from pages
+        finally:
+            pages.close()
+        return
     offset = 0
     while True:
-        page_data = paginate_users(page_size=page_size, offset=offset)
+        page_data = paginate_users(page_size=page_size, offset=offset, row_type=row_type)
         if not page_data:
             break
         yield page_data
@@ -64,4 +183,4 @@ if __name__ == '__main__':
         for user in page:
             print(user)
         if page_count >= 2:
-            break
\ No newline at end of file
+            break
@@ -1,24 +1,17 @@
 #!/usr/bin/python3
-import mysql.connector
-import os
+import functools
+import math
 import sys
 
-DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
-DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user')
-DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password')
-DB_NAME = "ALX_prodev"
+from db_backend import DB_ERRORS
+from db_pool import DB_NAME, get_connection
+
 TABLE_NAME = "user_data"
 
 def connect_to_prodev_for_ages():
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_connection()
+    except DB_ERRORS as err:
         raise ConnectionError(f"Failed to connect to database {DB_NAME} for streaming ages: {err}") from err
 
 def stream_user_ages():
@@ -38,7 +31,7 @@ def stream_user_ages():
                 except (ValueError, TypeError):
                     pass
             
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Database error during age streaming: {err}", file=sys.stderr)
     except ConnectionError as cerr:
         print(f"Connection error during age streaming: {cerr}", file=sys.stderr)
@@ -50,21 +43,99 @@ def stream_user_ages():
         if connection and connection.is_connected():
             connection.close()
 
-def calculate_average_age():
-    age_generator = stream_user_ages()
-    
-    total_age = 0
-    count = 0
-    
-    for age in age_generator:
-        total_age += age
-        count += 1
-        
-    if count > 0:
-        average_age = total_age / count
+def fetch_age_aggregates(percentiles=()):
+    """
+    Computes COUNT/SUM/AVG/MIN/MAX of age inside MySQL so only one row comes
+    back over the wire. Each requested percentile (0-100, nearest-rank) costs
+    one extra single-row ORDER BY age LIMIT 1 OFFSET k query.
+    Returns a dict, or None if the query failed.
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = connect_to_prodev_for_ages()
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT COUNT(age) AS count, SUM(age) AS sum, AVG(age) AS avg, "
+            f"MIN(age) AS min, MAX(age) AS max FROM {TABLE_NAME}"
+        )
+        row = cursor.fetchone()
+        count = int(row['count'] or 0)
+        aggregates = {
+            'count': count,
+            'sum': int(row['sum'] or 0),
+            'avg': float(row['avg']) if count else None,
+            'min': row['min'],
+            'max': row['max'],
+        }
+        for percentile in percentiles:
+            if not 0 <= percentile <= 100:
+                raise ValueError(f"Percentile must be between 0 and 100, got {percentile}")
+            value = None
+            if count:
+                rank = max(math.ceil(percentile / 100 * count), 1)
+                cursor.execute(
+                    f"SELECT age FROM {TABLE_NAME} WHERE age IS NOT NULL "
+                    f"ORDER BY age LIMIT 1 OFFSET %s",
+                    (rank - 1,)
+                )
+                value = cursor.fetchone()['age']
+            aggregates[f"p{percentile:g}"] = value
+        return aggregates
+
+    except DB_ERRORS as err:
+        print(f"Database error during age aggregation: {err}", file=sys.stderr)
+    except ConnectionError as cerr:
+        print(f"Connection error during age aggregation: {cerr}", file=sys.stderr)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
+    return None
+
+def reduce_user_ages(reducer, initial):
+    """
+    Streaming fallback for statistics SQL cannot compute: folds every age
+    from stream_user_ages into reducer(accumulator, age).
+    """
+    return functools.reduce(reducer, stream_user_ages(), initial)
+
+def calculate_average_age(pushdown=False, workers=None):
+    """
+    Prints the average age of users. With pushdown=True the average is
+    computed by MySQL instead of streaming every age into Python; with
+    workers=N the ages are summed by N processes over user_id ranges.
+    """
+    average_age = None
+    if workers:
+        from partitioned_scan import add_pairs, parallel_reduce, sum_and_count_ages
+        partial = parallel_reduce(sum_and_count_ages, add_pairs, partitions=workers,
+                                  columns=('user_id', 'age'))
+        if partial and partial[1] > 0:
+            average_age = partial[0] / partial[1]
+    elif pushdown:
+        aggregates = fetch_age_aggregates()
+        if aggregates:
+            average_age = aggregates['avg']
+    else:
+        age_generator = stream_user_ages()
+
+        total_age = 0
+        count = 0
+
+        for age in age_generator:
+            total_age += age
+            count += 1
+
+        if count > 0:
+            average_age = total_age / count
+
+    if average_age is not None:
         print(f"Average age of users: {average_age:.2f}")
     else:
         print("Average age of users: No user data found or no valid ages to calculate average.")
+    return average_age
 
 if __name__ == '__main__':
     calculate_average_age()
\ No newline at end of file
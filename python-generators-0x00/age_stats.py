@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+"""
+Single-pass streaming statistics over stream_user_ages.
+
+Every statistic is updated one value at a time in memory that does not grow
+with the number of rows, and two of them can be merged. Partial results
+computed on separate partitions (see partitioned_scan) therefore combine
+into the same report as one scan over the whole table.
+
+- RunningStats:   count, mean and variance (Welford), min and max
+- QuantileSketch: approximate quantiles with a bounded relative error
+                  (log-spaced buckets, as in DDSketch)
+- Histogram:      counts per fixed-width age bin
+"""
+import math
+import sys
+
+stream_user_ages = __import__('4-stream_ages').stream_user_ages
+
+
+class RunningStats:
+    """Count, mean, variance, min and max in O(1) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared differences from the mean
+        self.min = None
+        self.max = None
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Folds another RunningStats into this one (Chan et al.)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, or None without data."""
+        return self._m2 / self.count if self.count else None
+
+    @property
+    def sample_variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance) if self.count else None
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch: values fall into log-spaced buckets, so any
+    quantile estimate is within relative_accuracy of a true value. The
+    number of buckets depends on the range of values, not on their count
+    (about 250 for ages 1-150 at the default 1%).
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key):
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def update(self, value):
+        self.count += 1
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero_count += 1
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or None without data."""
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be between 0 and 1, got {q}")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class Histogram:
+    """Counts per fixed-width bin; bins are keyed by their lower bound."""
+
+    def __init__(self, bin_width=10):
+        if bin_width <= 0:
+            raise ValueError("bin_width must be positive")
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def update(self, value):
+        start = math.floor(value / self.bin_width) * self.bin_width
+        self.bins[start] = self.bins.get(start, 0) + 1
+
+    def merge(self, other):
+        if other.bin_width != self.bin_width:
+            raise ValueError("Cannot merge histograms with different bin widths")
+        for start, count in other.bins.items():
+            self.bins[start] = self.bins.get(start, 0) + count
+        return self
+
+    def items(self):
+        """(bin_start, count) pairs in ascending order."""
+        return sorted(self.bins.items())
+
+
+class AgeReport:
+    """All of the above, updated together from one stream of ages."""
+
+    QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+    def __init__(self, relative_accuracy=0.01, bin_width=10):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.histogram = Histogram(bin_width)
+
+    def update(self, age):
+        self.stats.update(age)
+        self.sketch.update(age)
+        self.histogram.update(age)
+
+    def update_all(self, ages):
+        for age in ages:
+            self.update(age)
+        return self
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        return self
+
+    def as_dict(self):
+        return {
+            'count': self.stats.count,
+            'mean': self.stats.mean if self.stats.count else None,
+            'variance': self.stats.variance,
+            'stddev': self.stats.stddev,
+            'min': self.stats.min,
+            'max': self.stats.max,
+            'quantiles': {q: self.sketch.quantile(q) for q in self.QUANTILES},
+            'histogram': self.histogram.items(),
+        }
+
+    def print(self, file=sys.stdout):
+        if self.stats.count == 0:
+            print("Age distribution: No user data found.", file=file)
+            return
+        stats = self.stats
+        print(f"Users: {stats.count}", file=file)
+        print(f"Mean age: {stats.mean:.2f} (stddev {stats.stddev:.2f})", file=file)
+        print(f"Min/max age: {stats.min}/{stats.max}", file=file)
+        for q in self.QUANTILES:
+            print(f"p{q * 100:g}: ~{self.sketch.quantile(q):.1f}", file=file)
+        width = self.histogram.bin_width
+        for start, count in self.histogram.items():
+            print(f"{start:>4}-{start + width - 1:<4} {count}", file=file)
+
+
+def age_report_of_batches(batches):
+    """partitioned_scan mapper: an AgeReport over one range's row batches."""
+    report = AgeReport()
+    for batch in batches:
+        for row in batch:
+            if row['age'] is not None:
+                report.update(int(row['age']))
+    return report
+
+
+def merge_reports(left, right):
+    """partitioned_scan combiner for AgeReport partials."""
+    return left.merge(right)
+
+
+def age_distribution_report(workers=None):
+    """
+    Builds an AgeReport in one pass over stream_user_ages, or with workers=N
+    from N partitions scanned in parallel and merged.
+    """
+    if workers:
+        from partitioned_scan import parallel_reduce
+        report = parallel_reduce(age_report_of_batches, merge_reports,
+                                 partitions=workers, columns=('user_id', 'age'))
+        return report if report is not None else AgeReport()
+    return AgeReport().update_all(stream_user_ages())
+
+
+if __name__ == '__main__':
+    age_distribution_report().print()
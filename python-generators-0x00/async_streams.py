@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+"""
+asyncio counterparts of stream_users and stream_user_ages.
+
+Each stream runs its blocking database calls on a thread pool shared by
+every stream (STREAM_THREADS threads at most) and hands batches to the event
+loop through a bounded asyncio.Queue. Fetching the next batches overlaps
+with the consumer's processing, and a slow consumer stops the fetch loop
+once `prefetch` batches are waiting. Any number of streams can share one
+event loop; the connections come from the shared pool in db_pool.
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_backend import DB_ERRORS
+from db_pool import get_connection
+
+TABLE_NAME = "user_data"
+FETCH_SIZE = 500
+PREFETCH_BATCHES = 4
+STREAM_THREADS = min(32, (os.cpu_count() or 1) + 4)
+
+_DONE = object()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(STREAM_THREADS, thread_name_prefix='async-stream')
+        return _executor
+
+
+def _close_borrowed(future):
+    """Done callback returning a connection borrowed for a cancelled stream."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+async def _produce(query, queue, fetch_size):
+    """
+    Fetches batches of row dicts in the shared threads and queues them,
+    followed by _DONE, or by the exception that stopped the fetch loop so the
+    consumer can re-raise it. Nothing more is queued once the stream is
+    cancelled.
+    """
+    executor = _get_executor()
+    connection = None
+    cursor = None
+    call = None  # The last blocking call handed to the threads
+    outcome = _DONE
+
+    async def run(func, *args):
+        nonlocal call
+        call = executor.submit(func, *args)
+        return await asyncio.wrap_future(call)
+
+    try:
+        try:
+            connection = await run(get_connection)
+        except asyncio.CancelledError:
+            # The thread may still be waiting for a connection; whatever it
+            # ends up borrowing goes straight back to the pool.
+            call.add_done_callback(_close_borrowed)
+            call = None
+            raise
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        await run(cursor.execute, query)
+        while True:
+            batch = await run(cursor.fetchmany, fetch_size)
+            if not batch:
+                break
+            await queue.put(batch)
+    except DB_ERRORS + (ConnectionError,) as err:
+        print(f"Database error during async streaming: {err}", file=sys.stderr)
+    except Exception as err:
+        outcome = err
+    except BaseException:
+        outcome = None  # Cancelled: the consumer has gone away
+        raise
+    finally:
+        def close():
+            if cursor:
+                cursor.close()
+            if connection and connection.is_connected():
+                connection.close()
+        # Calls on the connection stay serial: a fetch still running after a
+        # cancellation finishes before the cleanup starts.
+        if call is not None and not call.done():
+            call.add_done_callback(lambda _: executor.submit(close))
+        elif connection is not None:
+            executor.submit(close)
+        if outcome is not None:
+            await queue.put(outcome)
+
+
+async def _stream(query, fetch_size, prefetch):
+    queue = asyncio.Queue(maxsize=prefetch)
+    producer = asyncio.create_task(_produce(query, queue, fetch_size))
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            for row in batch:
+                yield row
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
+async def async_stream_users(fetch_size=FETCH_SIZE, prefetch=PREFETCH_BATCHES):
+    """Async generator yielding user_data rows as dicts."""
+    query = f"SELECT user_id, name, email, age FROM {TABLE_NAME}"
+    rows = _stream(query, fetch_size, prefetch)
+    try:
+        async for row in rows:
+            yield row
+    finally:
+        await rows.aclose()  # Stops the producer now, not when rows is collected
+
+
+async def async_stream_user_ages(fetch_size=FETCH_SIZE, prefetch=PREFETCH_BATCHES):
+    """Async generator yielding every valid age in user_data as an int."""
+    query = f"SELECT age FROM {TABLE_NAME}"
+    rows = _stream(query, fetch_size, prefetch)
+    try:
+        async for row in rows:
+            if row.get('age') is not None:
+                try:
+                    yield int(row['age'])
+                except (ValueError, TypeError):
+                    pass
+    finally:
+        await rows.aclose()
+
+
+if __name__ == '__main__':
+    async def main():
+        count = 0
+        async for user in async_stream_users():
+            if count < 3:
+                print(user)
+            count += 1
+        print(f"Streamed {count} users.")
+
+    asyncio.run(main())
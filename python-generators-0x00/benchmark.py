@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the python-generators-0x00 access patterns.
+
+For every table size, user_data is re-seeded through seed.py with generated
+rows. The script then times stream_users, stream_users_in_batches (per batch
+size), filtering users over 25 from row dicts and from columnar batches,
+lazy_paginate (per page size) and calculate_average_age. Each case runs in a
+freshly spawned process, so its peak RSS is its own.
+
+Usage: ./benchmark.py [--sizes 10000 100000] [--batch-sizes 50 500 5000]
+                      [--page-sizes 100 1000] [--max-pages 200] [--no-seed]
+                      [--backend mysql|sqlite]
+
+--backend sqlite runs everything against an embedded SQLite file
+(ALX_SQLITE_PATH), so no MySQL server is needed.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from itertools import islice
+
+import seed
+from db_backend import BACKENDS, set_backend
+from rows import ROW_TYPES, row_factory
+
+stream_users = __import__('0-stream_users').stream_users
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+calculate_average_age = __import__('4-stream_ages').calculate_average_age
+
+
+def write_user_csv(path, rows, random_seed=0):
+    """Writes `rows` generated users to a CSV in the format seed.py expects."""
+    generator = random.Random(random_seed)
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['user_id', 'name', 'email', 'age'])
+        for index in range(rows):
+            user_id = uuid.UUID(int=generator.getrandbits(128), version=4)
+            writer.writerow([user_id, f"User {index}", f"user{index}@example.com",
+                             generator.randint(18, 100)])
+
+
+def seed_users(rows, chunk_size=10000):
+    """Empties user_data and seeds it with `rows` generated users via seed.py."""
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        raise ConnectionError("Could not connect to the database to seed it")
+    try:
+        seed.create_table(connection)
+        cursor = connection.cursor()
+        cursor.execute(f"DELETE FROM {seed.TABLE_NAME}")
+        connection.commit()
+        cursor.close()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'user_data.csv')
+            write_user_csv(path, rows)
+            seed.bulk_load(connection, path, chunk_size)
+    finally:
+        connection.close()
+
+
+def _case_stream_users():
+    return {'rows': sum(1 for _ in stream_users())}
+
+
+def _case_stream_users_in_batches(batch_size):
+    rows = 0
+    for batch in stream_users_in_batches(batch_size):
+        rows += len(batch)
+    return {'rows': rows}
+
+
+def _case_users_over_25(batch_size, columnar):
+    rows = 0
+    for batch in stream_users_in_batches(batch_size, columnar=columnar):
+        if columnar:
+            rows += len(batch.filter(batch.age > 25))
+        else:
+            rows += sum(1 for user in batch if user['age'] > 25)
+    return {'rows': rows}
+
+
+def _case_lazy_paginate(page_size, max_pages, **options):
+    pages = 0
+    rows = 0
+    for page in islice(lazy_paginate(page_size, **options), max_pages):
+        pages += 1
+        rows += len(page)
+    return {'rows': rows, 'pages': pages}
+
+
+def _case_calculate_average_age(pushdown):
+    with contextlib.redirect_stdout(io.StringIO()):
+        calculate_average_age(pushdown=pushdown)
+    return {'rows': None}
+
+
+CASES = {
+    'stream_users': _case_stream_users,
+    'stream_users_in_batches': _case_stream_users_in_batches,
+    'users_over_25': _case_users_over_25,
+    'lazy_paginate': _case_lazy_paginate,
+    'calculate_average_age': _case_calculate_average_age,
+}
+
+
+def _measure(case, options):
+    started = time.perf_counter()
+    result = CASES[case](**options)
+    result['seconds'] = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    result['peak_rss_mib'] = peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return result
+
+
+def run_case(case, **options):
+    """Runs one benchmark case in a fresh process and returns its measurements."""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_measure, (case, options))
+
+
+def report(label, result):
+    seconds = result['seconds']
+    line = f"  {label:<40} {seconds:>8.3f}s"
+    if result.get('rows') is not None:
+        rate = result['rows'] / seconds if seconds > 0 else 0.0
+        line += f" {result['rows']:>9} rows {rate:>11.0f} rows/s"
+    else:
+        line += " " * 32
+    if result.get('pages'):
+        line += f" {seconds / result['pages'] * 1000:>8.2f} ms/page"
+    line += f" peak RSS {result['peak_rss_mib']:>7.1f} MiB"
+    print(line)
+
+
+def run_suite(sizes, batch_sizes, page_sizes, max_pages, reseed=True):
+    for size in sizes:
+        if reseed:
+            print(f"Seeding user_data with {size} rows...")
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_users(size)
+        print(f"user_data: {size if size is not None else 'current'} rows")
+        report("stream_users", run_case('stream_users'))
+        for batch_size in batch_sizes:
+            report(f"stream_users_in_batches({batch_size})",
+                   run_case('stream_users_in_batches', batch_size=batch_size))
+        for columnar in (False, True):
+            report(f"users over 25 ({'columnar' if columnar else 'row dicts'}, batches of "
+                   f"{batch_sizes[-1]})",
+                   run_case('users_over_25', batch_size=batch_sizes[-1], columnar=columnar))
+        for page_size in page_sizes:
+            report(f"lazy_paginate({page_size})",
+                   run_case('lazy_paginate', page_size=page_size, max_pages=max_pages))
+            report(f"lazy_paginate({page_size}, keyset, session)",
+                   run_case('lazy_paginate', page_size=page_size, max_pages=max_pages,
+                            keyset=True, session=True))
+        report("calculate_average_age()", run_case('calculate_average_age', pushdown=False))
+        report("calculate_average_age(pushdown=True)",
+               run_case('calculate_average_age', pushdown=True))
+
+
+def time_pages(pages, max_pages):
+    """Consumes up to max_pages pages and returns (pages, rows, seconds)."""
+    page_count = 0
+    row_count = 0
+    start = time.perf_counter()
+    try:
+        for page in islice(pages, max_pages):
+            page_count += 1
+            row_count += len(page)
+    finally:
+        pages.close()
+    return page_count, row_count, time.perf_counter() - start
+
+
+def benchmark_lazy_paginate(page_size=100, max_pages=200):
+    """Compares pages/sec of connection-per-page and session pagination."""
+    modes = [
+        ("offset, connection per page", {}),
+        ("keyset, connection per page", {"keyset": True}),
+        ("offset, session", {"session": True}),
+        ("keyset, session", {"keyset": True, "session": True}),
+    ]
+    print(f"lazy_paginate: page_size={page_size}, max_pages={max_pages}")
+    for label, options in modes:
+        pages, rows, elapsed = time_pages(lazy_paginate(page_size, **options), max_pages)
+        rate = pages / elapsed if elapsed > 0 else 0.0
+        print(f"  {label:<30} {pages:>6} pages {rows:>9} rows {rate:>10.1f} pages/s")
+
+
+def measure_batch_memory(batch_size=10000):
+    """
+    Compares the memory one batch of rows takes in each row shape. The field
+    values are the same objects whatever the shape, so they are counted once
+    and only the row containers differ between shapes.
+    """
+    batches = stream_users_in_batches(batch_size, row_type='tuple')
+    try:
+        batch = next(batches, None)
+    finally:
+        batches.close()
+    if not batch:
+        print("measure_batch_memory: user_data is empty.")
+        return
+    values_bytes = sum(sys.getsizeof(value) for values in batch for value in values)
+    print(f"Row memory: batch of {len(batch)} rows, {values_bytes / 1024:.1f} KiB of field values")
+    for row_type in ROW_TYPES:
+        make_row = row_factory(row_type) or tuple
+        rows = [make_row(values) for values in batch]
+        containers = sys.getsizeof(rows) + sum(sys.getsizeof(row) for row in rows)
+        total_kib = (containers + values_bytes) / 1024
+        print(f"  {row_type:<12} {containers / len(rows):>7.1f} B/row {total_kib:>10.1f} KiB/batch")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="table sizes to seed and benchmark (1e4-1e7 rows)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--max-pages', type=int, default=200,
+                        help="pages read per lazy_paginate case")
+    parser.add_argument('--no-seed', action='store_true',
+                        help="benchmark the current table once instead of re-seeding it")
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        help="database backend (default: ALX_DB_BACKEND or mysql)")
+    args = parser.parse_args()
+    if args.backend:
+        # Set in the environment so the spawned case processes use it too.
+        os.environ['ALX_DB_BACKEND'] = args.backend
+        set_backend(args.backend)
+
+    sizes = [None] if args.no_seed else args.sizes
+    run_suite(sizes, args.batch_sizes, args.page_sizes, args.max_pages, reseed=not args.no_seed)
+    benchmark_lazy_paginate(args.page_sizes[0], args.max_pages)
+    measure_batch_memory(max(args.batch_sizes))
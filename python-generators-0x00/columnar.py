@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+Columnar batches of user_data rows for vectorized analytics.
+
+A ColumnarBatch stores a batch as one array per column instead of one dict
+per row: age is a NumPy int64 array and the text columns are Arrow-style
+string columns (a single UTF-8 buffer plus an offsets array). Filters such
+as `batch.age > 25` and reductions such as `batch.age.mean()` then run over
+the whole batch in C.
+"""
+import numpy as np
+
+from rows import USER_COLUMNS
+
+
+class StringColumn:
+    """
+    Variable-length string column laid out like an Arrow utf8 array:
+    value i is data[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values):
+        values = list(values)
+        data = ''.join(values).encode('utf-8')
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        # One join and one encode for the whole column; ASCII text has as
+        # many bytes as characters, so only other text is encoded per value.
+        lengths = map(len, values if data.isascii() else map(str.encode, values))
+        np.cumsum(np.fromiter(lengths, np.int64, len(values)), out=offsets[1:])
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def lengths(self):
+        """Byte length of every value, computed without decoding."""
+        return np.diff(self.offsets)
+
+    def take(self, indices):
+        """Returns a new column holding only the values at indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Byte positions to gather: each value's start, shifted to where it lands.
+        positions = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)
+        data = np.frombuffer(self.data, dtype=np.uint8)[positions].tobytes()
+        return StringColumn(data, offsets)
+
+    def to_list(self):
+        return [self[index] for index in range(len(self))]
+
+
+class ColumnarBatch:
+    """A batch of user_data rows stored column by column."""
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a batch from (user_id, name, email, age) tuples."""
+        if not rows:
+            empty = StringColumn(b'', np.zeros(1, dtype=np.int64))
+            return cls(empty, empty, empty, np.zeros(0, dtype=np.int64))
+        user_ids, names, emails, ages = zip(*rows)
+        return cls(
+            StringColumn.from_values(user_ids),
+            StringColumn.from_values(names),
+            StringColumn.from_values(emails),
+            np.asarray(ages, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.age)
+
+    def filter(self, mask):
+        """Returns the rows where the boolean mask is true as a new batch."""
+        indices = np.flatnonzero(mask)
+        return ColumnarBatch(
+            self.user_id.take(indices),
+            self.name.take(indices),
+            self.email.take(indices),
+            self.age[indices],
+        )
+
+    def rows(self):
+        """Materializes the batch back into row dicts, e.g. for printing."""
+        columns = (self.user_id.to_list(), self.name.to_list(),
+                   self.email.to_list(), self.age.tolist())
+        for values in zip(*columns):
+            yield dict(zip(USER_COLUMNS, values))
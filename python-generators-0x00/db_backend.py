@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""
+Database backends for the python-generators-0x00 scripts.
+
+ALX_DB_BACKEND selects where user_data lives:
+- mysql  (default) the ALX_prodev database on a MySQL server
+- sqlite an embedded SQLite file at ALX_SQLITE_PATH (default ALX_prodev.db),
+         so the whole streaming stack runs without a MySQL server
+
+Both hand out connections with the mysql.connector API the scripts use
+(cursor(dictionary=..., buffered=...), %s placeholders, column_names,
+is_connected(), ...), and both stream results: MySQL with unbuffered
+cursors, and SQLite because its cursors step through rows lazily.
+Database errors of either backend can be caught with DB_ERRORS.
+"""
+import os
+import sqlite3
+
+try:
+    import mysql.connector
+except ImportError:  # Only needed for the MySQL backend
+    mysql = None
+
+DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
+DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user')
+DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password')
+DB_NAME = "ALX_prodev"
+SQLITE_PATH = os.getenv('ALX_SQLITE_PATH', f"{DB_NAME}.db")
+
+DB_ERRORS = (sqlite3.Error,) + ((mysql.connector.Error,) if mysql else ())
+
+
+class MySQLBackend:
+    name = 'mysql'
+    label = "MySQL server"
+    table_options = " ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    supports_load_data = True
+
+    def __init__(self):
+        if mysql is None:
+            raise ImportError("The mysql backend needs mysql-connector-python "
+                              "(pip install mysql-connector-python)")
+
+    def connect(self, database=True, **options):
+        """Connects to the server, and to ALX_prodev unless database=False."""
+        if database:
+            options.setdefault('database', DB_NAME)
+        return mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD,
+                                       **options)
+
+    def create_database_query(self):
+        return f"CREATE DATABASE IF NOT EXISTS {DB_NAME}"
+
+    def upsert_query(self, table, columns, key):
+        updates = ', '.join(f"{column}=VALUES({column})" for column in columns if column != key)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+class SQLiteCursor:
+    """sqlite3 cursor dressed up as a mysql.connector cursor."""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+        self.column_names = ()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def execute(self, operation, params=None):
+        self._cursor.execute(operation.replace('%s', '?'), tuple(params or ()))
+        description = self._cursor.description or ()
+        self.column_names = tuple(column[0] for column in description)
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(operation.replace('%s', '?'), seq_params)
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._convert(row)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with the mysql.connector methods the scripts call."""
+
+    def __init__(self, path):
+        # Connections are borrowed from the pool by whichever thread needs
+        # one, but are only ever used by one thread at a time.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=None, prepared=False):
+        # sqlite3 caches compiled statements itself, so prepared is a no-op.
+        return SQLiteCursor(self._connection, dictionary)
+
+    def is_connected(self):
+        return self._open
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self._connection.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    table_options = ""
+    supports_load_data = False
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        self.label = f"SQLite database {self.path}"
+
+    def connect(self, database=True, **options):
+        # The file is the database, so there is no separate server connection.
+        return SQLiteConnection(self.path)
+
+    def create_database_query(self):
+        return None
+
+    def upsert_query(self, table, columns, key):
+        updates = ', '.join(f"{column}=excluded.{column}" for column in columns if column != key)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}")
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+_backend = None
+
+
+def set_backend(backend):
+    """Switches backend, given a backend object or a name from BACKENDS."""
+    global _backend
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        backend = BACKENDS[backend]()
+    _backend = backend
+    return backend
+
+
+def get_backend():
+    """Returns the active backend, chosen by ALX_DB_BACKEND on first use."""
+    if _backend is None:
+        return set_backend(os.getenv('ALX_DB_BACKEND', 'mysql'))
+    return _backend
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+"""
+Shared connection pool for the python-generators-0x00 scripts.
+
+Every generator borrows its connection from one bounded, per-process pool
+instead of opening a fresh connection per call. Borrowed connections are
+health-checked, idle connections are evicted after POOL_IDLE_TIMEOUT seconds,
+and calling close() on a borrowed connection returns it to the pool.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from db_backend import DB_ERRORS, DB_NAME, get_backend
+
+POOL_SIZE = int(os.getenv('ALX_MYSQL_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('ALX_MYSQL_POOL_TIMEOUT', '30'))
+POOL_IDLE_TIMEOUT = float(os.getenv('ALX_MYSQL_POOL_IDLE_TIMEOUT', '300'))
+
+
+class PoolTimeoutError(ConnectionError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class PooledConnection:
+    """
+    Proxy around a borrowed connection. Everything is delegated to the real
+    connection except close(), which hands it back to the pool, and
+    is_connected(), which stays true until then: callers guard close() with
+    is_connected(), and a connection that died while borrowed must still be
+    given back so its slot is freed.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise ConnectionError("Connection has already been returned to the pool")
+        return getattr(self._connection, name)
+
+    def is_connected(self):
+        return self._connection is not None
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """A bounded pool of connections to the ALX_prodev database."""
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, backend=None, **connect_args):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.backend = backend or get_backend()
+        self._connect_args = connect_args
+        self._idle = deque()  # (connection, released_at), oldest on the left
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        return self.backend.connect(**self._connect_args)
+
+    def _pop_expired(self):
+        """Removes idle connections past idle_timeout. Caller holds the lock."""
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+            self._open -= 1
+        return expired
+
+    @staticmethod
+    def _discard(connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except DB_ERRORS:
+                pass
+
+    def acquire(self, timeout=None):
+        """
+        Borrows a healthy connection, opening a new one while the pool is
+        below its size and otherwise waiting for one to be released.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        expired = []
+        connection = None
+        timed_out = False
+        with self._condition:
+            while True:
+                expired.extend(self._pop_expired())
+                if self._idle:
+                    connection = self._idle.pop()[0]
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                self._condition.wait(remaining)
+        self._discard(expired)
+        if timed_out:
+            raise PoolTimeoutError(
+                f"No connection to {DB_NAME} available after {timeout}s "
+                f"(pool size {self.size})"
+            )
+
+        if connection is not None and not connection.is_connected():
+            self._discard([connection])
+            connection = None
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """Returns a connection to the pool, dropping it if it is broken."""
+        try:
+            # Also drains any unread result left by an abandoned cursor.
+            healthy = connection.is_connected()
+            if healthy:
+                connection.rollback()
+        except DB_ERRORS:
+            healthy = False
+        if not healthy:
+            self._discard([connection])
+        with self._condition:
+            if healthy:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._open -= 1
+            expired = self._pop_expired()
+            self._condition.notify()
+        self._discard(expired)
+
+    def close_all(self):
+        """Closes every idle connection. Borrowed ones close on release."""
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._open -= len(idle)
+            self._idle.clear()
+        self._discard(idle)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide pool. A forked child gets a pool of its own
+    rather than sharing the sockets of its parent's connections, and
+    switching backends (db_backend.set_backend) starts a new pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool.backend is not get_backend():
+            _pool = ConnectionPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_connection():
+    """Borrows a connection from the shared pool; close() gives it back."""
+    return get_pool().acquire()
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""
+Test fixtures: a throwaway SQLite ALX_prodev with a seeded user_data table.
+"""
+import contextlib
+import importlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+
+import db_backend
+import db_pool
+import seed
+
+
+def user_id(number):
+    """user_id of the number-th fixture user; ids sort in number order."""
+    return str(uuid.UUID(int=number))
+
+
+def make_users(count):
+    """(user_id, name, email, age) rows for users 1..count."""
+    return [(user_id(number), f"User {number}", f"user{number}@example.com", 18 + number % 80)
+            for number in range(1, count + 1)]
+
+
+def load_script(name):
+    """Imports one of the numbered scripts, e.g. load_script('2-lazy_paginate')."""
+    return importlib.import_module(name)
+
+
+class UserDataTestCase(unittest.TestCase):
+    """Runs each test against a fresh SQLite database holding `user_count` users."""
+
+    user_count = 10
+
+    def setUp(self):
+        self.previous_backend = db_backend._backend
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, 'ALX_prodev.db')
+        self.backend = db_backend.set_backend(db_backend.SQLiteBackend(self.db_path))
+        self.users = make_users(self.user_count)
+        connection = db_pool.get_connection()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed.create_table(connection)
+        cursor = connection.cursor()
+        cursor.executemany(seed.insert_query(), self.users)
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+    def tearDown(self):
+        db_pool.get_pool().close_all()
+        db_backend.set_backend(self.previous_backend)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def quietly(self, func, *args, **kwargs):
+        """Calls func with stdout captured; returns (result, output)."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = func(*args, **kwargs)
+        return result, output.getvalue()
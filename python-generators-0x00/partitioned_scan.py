@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""
+Parallel range-partitioned scans of the user_data table.
+
+The user_id keyspace is split into N contiguous ranges holding roughly the
+same number of rows, and every range is read by its own worker process over
+its own connection. Inside a range, rows are read with keyset pages
+(WHERE user_id > last ORDER BY user_id LIMIT n), so a worker blocked on a
+full queue never holds an open result set on the server.
+
+Workers are handed the active backend (db_backend.set_backend), so they
+read the same database under any multiprocessing start method.
+"""
+import functools
+import multiprocessing
+import os
+import queue as queue_module
+import sys
+
+from db_backend import DB_ERRORS, get_backend, set_backend
+from db_pool import get_connection
+from rows import USER_COLUMNS
+
+TABLE_NAME = "user_data"
+DEFAULT_PARTITIONS = os.cpu_count() or 1
+WORKER_POLL = 1.0  # Seconds between worker liveness checks while waiting for a batch
+
+_DONE = None
+
+
+class PartitionWorkerError(RuntimeError):
+    """Raised when a scan worker process fails or dies before finishing its range."""
+
+
+class _Failed:
+    """Sent by a worker instead of the sentinel when its scan raised."""
+
+    def __init__(self, error):
+        # The message rather than the exception, which may not unpickle.
+        self.message = f"{type(error).__name__}: {error}"
+
+
+def partition_bounds(partitions=DEFAULT_PARTITIONS):
+    """
+    Returns up to `partitions` (low, high) user_id ranges covering the table,
+    low inclusive and high exclusive, None meaning unbounded.
+    """
+    connection = get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT MIN(user_id) FROM ("
+            f"SELECT user_id, NTILE(%s) OVER (ORDER BY user_id) AS part FROM {TABLE_NAME}"
+            f") AS tiles GROUP BY part ORDER BY 1",
+            (partitions,)
+        )
+        starts = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    finally:
+        connection.close()
+    if len(starts) <= 1:
+        return [(None, None)]
+    lows = [None] + starts[1:]
+    highs = starts[1:] + [None]
+    return list(zip(lows, highs))
+
+
+def iter_range(bounds, batch_size=500, columns=USER_COLUMNS):
+    """Yields batches of row dicts for one (low, high) user_id range, in user_id order."""
+    low, high = bounds
+    if 'user_id' not in columns:
+        raise ValueError("columns must include user_id to page through a range")
+    select = f"SELECT {', '.join(columns)} FROM {TABLE_NAME}"
+    connection = get_connection()
+    try:
+        cursor = connection.cursor(dictionary=True)
+        last_user_id = None
+        while True:
+            clauses, params = [], []
+            if last_user_id is not None:
+                clauses.append("user_id > %s")
+                params.append(last_user_id)
+            elif low is not None:
+                clauses.append("user_id >= %s")
+                params.append(low)
+            if high is not None:
+                clauses.append("user_id < %s")
+                params.append(high)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            cursor.execute(f"{select}{where} ORDER BY user_id LIMIT %s", (*params, batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                break
+            yield batch
+            last_user_id = batch[-1]['user_id']
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def _scan_worker(index, backend, bounds, batch_size, columns, transform, queue):
+    """
+    Worker process body: streams one range into the queue, then a sentinel,
+    or the error that stopped it.
+    """
+    outcome = _DONE
+    try:
+        set_backend(backend)
+        for batch in iter_range(bounds, batch_size, columns):
+            if transform is not None:
+                batch = transform(batch)
+            if batch:
+                queue.put((index, batch))
+    except Exception as err:
+        outcome = _Failed(err)
+    finally:
+        queue.put((index, outcome))
+
+
+def _next_item(queue, workers, pending):
+    """
+    queue.get() that keeps checking the workers of the `pending` partitions,
+    and raises PartitionWorkerError if one of them died (e.g. killed by the
+    OOM killer) without sending its sentinel, or sent back a failure. A
+    worker that exited cleanly gets one more poll for its last items to arrive.
+    """
+    exited = set()
+    while True:
+        try:
+            index, item = queue.get(timeout=WORKER_POLL)
+        except queue_module.Empty:
+            pass
+        else:
+            if isinstance(item, _Failed):
+                raise PartitionWorkerError(f"Partition {index} scan failed: {item.message}")
+            return index, item
+        for index in pending:
+            worker = workers[index]
+            if worker.is_alive():
+                continue
+            if worker.exitcode != 0 or index in exited:
+                raise PartitionWorkerError(
+                    f"Partition {index} worker exited with code {worker.exitcode} "
+                    f"before finishing its range"
+                )
+            exited.add(index)
+
+
+def scan_partitioned(partitions=DEFAULT_PARTITIONS, batch_size=500, ordered=False,
+                     columns=USER_COLUMNS, transform=None, queue_depth=4):
+    """
+    Generator yielding batches of user_data rows read by `partitions` worker
+    processes in parallel.
+
+    ordered=False yields batches as soon as any worker produces them.
+    ordered=True yields them in user_id order: ranges are disjoint and sorted,
+    so the merge reads each partition's queue in turn while the other
+    workers read ahead up to queue_depth batches.
+    transform, if given, must be a picklable top-level function; it runs in
+    the workers on every batch (e.g. a filter) before it is sent back.
+    Raises PartitionWorkerError if a worker fails or dies before finishing its
+    range, or if the table could not be partitioned.
+    """
+    try:
+        ranges = partition_bounds(partitions)
+    except DB_ERRORS + (ConnectionError,) as err:
+        raise PartitionWorkerError(f"Could not partition {TABLE_NAME}: {err}") from err
+
+    context = multiprocessing.get_context()
+    if ordered:
+        queues = [context.Queue(maxsize=queue_depth) for _ in ranges]
+    else:
+        shared = context.Queue(maxsize=queue_depth * len(ranges))
+        queues = [shared] * len(ranges)
+    workers = [
+        context.Process(
+            target=_scan_worker,
+            args=(index, get_backend(), bounds, batch_size, tuple(columns), transform,
+                  queues[index]),
+            daemon=True,
+        )
+        for index, bounds in enumerate(ranges)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        if ordered:
+            for index, queue in enumerate(queues):
+                while True:
+                    _, batch = _next_item(queue, workers, (index,))
+                    if batch is _DONE:
+                        break
+                    yield batch
+        else:
+            pending = set(range(len(workers)))
+            while pending:
+                index, batch = _next_item(shared, workers, pending)
+                if batch is _DONE:
+                    pending.discard(index)
+                    continue
+                yield batch
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+def _reduce_worker(mapper, backend, bounds, batch_size, columns):
+    set_backend(backend)
+    return mapper(iter_range(bounds, batch_size, columns))
+
+
+def parallel_reduce(mapper, combiner, partitions=DEFAULT_PARTITIONS, batch_size=500,
+                    columns=USER_COLUMNS):
+    """
+    Map-reduce over user_data: every worker process runs mapper(batches) on
+    its own range and the partial results are folded with combiner.
+    mapper and combiner must be picklable top-level functions.
+    Returns None if the scan failed.
+    """
+    try:
+        ranges = partition_bounds(partitions)
+        with multiprocessing.get_context().Pool(len(ranges)) as pool:
+            partials = pool.starmap(
+                _reduce_worker,
+                [(mapper, get_backend(), bounds, batch_size, tuple(columns))
+                 for bounds in ranges]
+            )
+    except DB_ERRORS + (ConnectionError,) as err:
+        print(f"Parallel reduce over {TABLE_NAME} failed: {err}", file=sys.stderr)
+        return None
+    return functools.reduce(combiner, partials)
+
+
+def users_over_25(batch):
+    """Batch transform used by batch_processing: keeps users older than 25."""
+    return [user for user in batch if user.get('age') is not None and user['age'] > 25]
+
+
+def sum_and_count_ages(batches):
+    """Mapper used by calculate_average_age: (sum of ages, number of ages)."""
+    total_age = 0
+    count = 0
+    for batch in batches:
+        for row in batch:
+            if row['age'] is not None:
+                total_age += int(row['age'])
+                count += 1
+    return total_age, count
+
+
+def add_pairs(left, right):
+    """Combiner for sum_and_count_ages partials."""
+    return left[0] + right[0], left[1] + right[1]
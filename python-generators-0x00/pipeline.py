@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+"""
+Lazy, composable pipelines over the user_data generators.
+
+    from pipeline import col, users
+
+    emails = (users()
+              .filter(col('age') > 25)
+              .project('email')
+              .take(10))
+    for row in emails:
+        print(row)
+
+Nothing runs until the pipeline is iterated or reduced. For users(), leading
+filter() stages built from col() predicates, project() and take() are pushed
+into the SELECT (WHERE, column list and LIMIT); such filters may test columns
+the projection leaves out. Every other stage, and any
+stage after one that cannot be pushed down, runs lazily in Python.
+"""
+import functools
+import itertools
+import operator
+from collections import deque
+
+stream_users_module = __import__('0-stream_users')
+stream_users = stream_users_module.stream_users
+build_user_query = stream_users_module.build_user_query
+USER_COLUMNS = stream_users_module.USER_COLUMNS
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+stream_user_ages = __import__('4-stream_ages').stream_user_ages
+
+
+class Predicate:
+    """A row condition that can run both as SQL and as a Python test."""
+
+    def __init__(self, sql, params, test, columns):
+        self.sql = sql
+        self.params = tuple(params)
+        self.test = test
+        self.columns = frozenset(columns)
+
+    def __call__(self, row):
+        return self.test(row)
+
+    def __and__(self, other):
+        return Predicate(f"({self.sql}) AND ({other.sql})", self.params + other.params,
+                         lambda row: self.test(row) and other.test(row),
+                         self.columns | other.columns)
+
+    def __or__(self, other):
+        return Predicate(f"({self.sql}) OR ({other.sql})", self.params + other.params,
+                         lambda row: self.test(row) or other.test(row),
+                         self.columns | other.columns)
+
+    def __repr__(self):
+        return f"Predicate({self.sql!r}, {self.params!r})"
+
+
+class Column:
+    """A user_data column; comparing it with a value builds a Predicate."""
+
+    def __init__(self, name):
+        if name not in USER_COLUMNS:
+            raise ValueError(f"Unknown user_data column: {name}")
+        self.name = name
+
+    def _compare(self, sql_operator, python_operator, value):
+        name = self.name
+
+        def test(row):
+            # Like SQL, a comparison against NULL is never true.
+            return row[name] is not None and python_operator(row[name], value)
+        return Predicate(f"{name} {sql_operator} %s", (value,), test, (name,))
+
+    def __gt__(self, value):
+        return self._compare('>', operator.gt, value)
+
+    def __ge__(self, value):
+        return self._compare('>=', operator.ge, value)
+
+    def __lt__(self, value):
+        return self._compare('<', operator.lt, value)
+
+    def __le__(self, value):
+        return self._compare('<=', operator.le, value)
+
+    def __eq__(self, value):
+        return self._compare('=', operator.eq, value)
+
+    def __ne__(self, value):
+        return self._compare('<>', operator.ne, value)
+
+    __hash__ = None
+
+
+def col(name):
+    """Shorthand for Column(name)."""
+    return Column(name)
+
+
+def _project(columns, rows):
+    for row in rows:
+        yield {column: row[column] for column in columns}
+
+
+def _rebatch(size, rows):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _window(size, rows):
+    window = deque(maxlen=size)
+    for row in rows:
+        window.append(row)
+        if len(window) == size:
+            yield tuple(window)
+
+
+class Pipeline:
+    """
+    An immutable chain of lazy stages over a row source. Every stage method
+    returns a new Pipeline, so a partially built pipeline can be reused.
+    """
+
+    def __init__(self, source, pushdown=False):
+        # With pushdown, source(columns, predicates, limit) returns the rows;
+        # otherwise source() does.
+        self._source = source
+        self._pushdown = pushdown
+        self._columns = None
+        self._predicates = ()
+        self._limit = None
+        self._stages = ()
+        self._fields = None  # Fields every row is known to have, after project()
+
+    def _with(self, **changes):
+        pipeline = object.__new__(Pipeline)
+        pipeline.__dict__.update(self.__dict__)
+        for name, value in changes.items():
+            setattr(pipeline, f"_{name}", value)
+        return pipeline
+
+    def _check_fields(self, columns, action):
+        """Raises ValueError, while building, for fields project() has dropped."""
+        if self._fields is None:
+            return
+        missing = sorted(set(columns) - set(self._fields))
+        if missing:
+            raise ValueError(f"Cannot {action} columns already projected away: "
+                             f"{', '.join(missing)}")
+
+    def _in_sql(self):
+        """True while every stage so far has been pushed into the query."""
+        return self._pushdown and not self._stages
+
+    def filter(self, predicate):
+        """Keeps rows for which predicate(row) is true."""
+        if isinstance(predicate, Predicate):
+            if self._in_sql() and self._limit is None:
+                # WHERE can test columns the SELECT list leaves out.
+                return self._with(predicates=self._predicates + (predicate,))
+            self._check_fields(predicate.columns, "filter on")
+        return self._with(stages=self._stages + (functools.partial(filter, predicate),))
+
+    def map(self, function):
+        """Replaces every row with function(row)."""
+        return self._with(stages=self._stages + (functools.partial(map, function),),
+                          fields=None)
+
+    def project(self, *columns):
+        """Keeps only the given fields of every row."""
+        self._check_fields(columns, "project")
+        if self._in_sql():
+            build_user_query(columns)  # validates the names up front
+            return self._with(columns=tuple(columns), fields=tuple(columns))
+        return self._with(stages=self._stages + (functools.partial(_project, columns),),
+                          fields=tuple(columns))
+
+    def rebatch(self, size):
+        """Groups rows into lists of size rows (the last one may be shorter)."""
+        return self._with(stages=self._stages + (functools.partial(_rebatch, size),),
+                          fields=None)
+
+    def window(self, size):
+        """Yields sliding windows: tuples of size consecutive rows."""
+        return self._with(stages=self._stages + (functools.partial(_window, size),),
+                          fields=None)
+
+    def take(self, count):
+        """Stops after count rows."""
+        if self._in_sql():
+            limit = count if self._limit is None else min(self._limit, count)
+            return self._with(limit=limit)
+        return self._with(stages=self._stages + (
+            lambda rows: itertools.islice(rows, count),))
+
+    def reduce(self, function, initial):
+        """Runs the pipeline and folds its rows with function(accumulator, row)."""
+        return functools.reduce(function, self, initial)
+
+    def collect(self):
+        """Runs the pipeline and returns its rows as a list."""
+        return list(self)
+
+    def explain(self):
+        """Returns the SQL and parameters the source will run, or None."""
+        if not self._pushdown:
+            return None
+        where, params = _where_clause(self._predicates)
+        return build_user_query(self._columns, where, self._limit), params
+
+    def __iter__(self):
+        if self._pushdown:
+            source = self._source(self._columns, self._predicates, self._limit)
+        else:
+            source = iter(self._source())
+        rows = source
+        for stage in self._stages:
+            rows = stage(rows)
+        try:
+            yield from rows
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+
+
+def _where_clause(predicates):
+    if not predicates:
+        return None, ()
+    where = " AND ".join(f"({predicate.sql})" for predicate in predicates)
+    params = tuple(param for predicate in predicates for param in predicate.params)
+    return where, params
+
+
+def _users_source(columns, predicates, limit):
+    where, params = _where_clause(predicates)
+    return stream_users(columns=columns, where=where, params=params, limit=limit)
+
+
+def users():
+    """Pipeline over stream_users with SQL pushdown of filters, projection and take."""
+    return Pipeline(_users_source, pushdown=True)
+
+
+def user_batches(batch_size=50, prefetch=0):
+    """Pipeline over the rows of stream_users_in_batches, one row at a time."""
+    return Pipeline(lambda: itertools.chain.from_iterable(
+        stream_users_in_batches(batch_size, prefetch=prefetch)))
+
+
+def user_ages():
+    """Pipeline over stream_user_ages."""
+    return Pipeline(stream_user_ages)
+
+
+def from_iterable(iterable):
+    """Pipeline over any iterable of rows (no pushdown)."""
+    return Pipeline(lambda: iterable)
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""
+Row shapes for the user_data generators.
+
+'dict'       {'user_id': ..., 'name': ..., ...}, the default everywhere
+'tuple'      the plain tuple returned by the cursor, in column order
+'namedtuple' a namedtuple with one field per selected column
+'slots'      a __slots__ object with one attribute per selected column
+
+Tuples, namedtuples and slots rows have no per-row __dict__, so they
+take a fraction of a dict's memory.
+"""
+import functools
+from collections import namedtuple
+
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+ROW_TYPES = ('dict', 'tuple', 'namedtuple', 'slots')
+
+
+class SlotsRow:
+    """Base class of the __slots__ row classes built by slots_class."""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def _asdict(self):
+        return dict(zip(self.__slots__, self))
+
+
+@functools.lru_cache(maxsize=None)
+def namedtuple_class(columns):
+    """namedtuple class for a tuple of column names."""
+    return namedtuple('UserRecord', columns)
+
+
+@functools.lru_cache(maxsize=None)
+def slots_class(columns):
+    """__slots__ row class for a tuple of column names."""
+    return type('UserRow', (SlotsRow,), {'__slots__': tuple(columns)})
+
+
+UserRecord = namedtuple_class(USER_COLUMNS)
+UserRow = slots_class(USER_COLUMNS)
+
+
+def row_factory(row_type, columns=USER_COLUMNS):
+    """
+    Returns a callable turning a cursor tuple into a row of the given
+    shape, or None for 'tuple' since no conversion is needed.
+    """
+    columns = tuple(columns)
+    if row_type == 'tuple':
+        return None
+    if row_type == 'dict':
+        return lambda values: dict(zip(columns, values))
+    if row_type == 'namedtuple':
+        return namedtuple_class(columns)._make
+    if row_type == 'slots':
+        row_class = slots_class(columns)
+        return lambda values: row_class(*values)
+    raise ValueError(f"Unknown row_type {row_type!r}, expected one of {', '.join(ROW_TYPES)}")
@@ -1,30 +1,30 @@
 """
-Script to set up MySQL database, create a table, and populate it from a CSV.
+Script to set up the ALX_prodev database, create a table, and populate it from a CSV.
+The database is MySQL or SQLite depending on ALX_DB_BACKEND (see db_backend.py).
 """
-import mysql.connector
 import csv
+import hashlib
+import itertools
 import os
+import sqlite3
+import time
 from uuid import uuid4 
 
+from db_backend import DB_ERRORS, DB_NAME, get_backend
+from db_pool import get_connection
 
-DB_HOST = os.getenv('ALX_MYSQL_HOST', 'localhost')
-DB_USER = os.getenv('ALX_MYSQL_USER', 'your_mysql_user') 
-DB_PASSWORD = os.getenv('ALX_MYSQL_PASSWORD', 'your_mysql_password') 
-DB_NAME = "ALX_prodev"
 TABLE_NAME = "user_data"
+CSV_HEADER = ['user_id', 'name', 'email', 'age']
 
 def connect_db():
-    """Connects to the MySQL database server."""
+    """Connects to the database server."""
+    backend = get_backend()
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        print("Successfully connected to MySQL server.")
+        connection = backend.connect(database=False)
+        print(f"Successfully connected to {backend.label}.")
         return connection
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL server: {err}")
+    except DB_ERRORS as err:
+        print(f"Error connecting to {backend.label}: {err}")
         return None
 
 def create_database(connection):
@@ -33,23 +33,19 @@ def create_database(connection):
         return
     try:
         cursor = connection.cursor()
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+        query = get_backend().create_database_query()
+        if query: # SQLite: the file opened by connect_db is the database
+            cursor.execute(query)
         print(f"Database '{DB_NAME}' checked/created successfully.")
         cursor.close()
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Error creating database {DB_NAME}: {err}")
 
 def connect_to_prodev():
-    """Connects to the ALX_prodev database in MySQL."""
+    """Borrows a connection to the ALX_prodev database from the shared pool."""
     try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return get_connection()
+    except DB_ERRORS + (ConnectionError,) as err:
         print(f"Error connecting to database {DB_NAME}: {err}")
         return None
 
@@ -65,15 +61,288 @@ def create_table(connection):
             name VARCHAR(255) NOT NULL,
             email VARCHAR(255) NOT NULL,
             age INT NOT NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        ){get_backend().table_options};
         """
       
         cursor.execute(create_table_query)
         print(f"Table '{TABLE_NAME}' created successfully (or already exists).") 
         cursor.close()
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Error creating table {TABLE_NAME}: {err}")
 
+def insert_query():
+    """Upsert of one user_data row in the active backend's SQL dialect."""
+    return get_backend().upsert_query(TABLE_NAME, ('user_id', 'name', 'email', 'age'), 'user_id')
+
+def parse_row(row, report=True):
+    """
+    Validates one CSV row; returns a (user_id, name, email, age) tuple or None.
+    Skipped rows are printed unless report=False.
+    """
+    user_id = row.get('user_id', str(uuid4())) 
+    name = row.get('name')
+    email = row.get('email')
+    try:
+        age = int(row.get('age')) 
+    except (ValueError, TypeError):
+        if report:
+            print(f"Skipping row due to invalid age: {row}")
+        return None
+
+    if not all([user_id, name, email]):
+        if report:
+            print(f"Skipping row due to missing data: {row}")
+        return None
+
+    return (user_id, name, email, age)
+
+def insert_data_chunked(connection, csv_file_path, chunk_size=10000, start_row=0):
+    """
+    Streams the CSV into the table chunk_size rows at a time and commits
+    after every chunk, so memory use and transaction length stay bounded.
+    Rows are upserted, and start_row skips CSV rows a previous, interrupted
+    run already committed. Returns the number of CSV rows processed, i.e.
+    the start_row to resume from.
+    """
+    if not connection:
+        return start_row
+
+    cursor = connection.cursor()
+    rows_done = start_row
+    rows_written = 0
+    started = time.perf_counter()
+    try:
+        with open(csv_file_path, mode='r', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            chunk = []
+            chunk_rows = 0
+            for row in itertools.islice(reader, start_row, None):
+                chunk_rows += 1
+                values = parse_row(row)
+                if values is not None:
+                    chunk.append(values)
+                if chunk_rows == chunk_size:
+                    cursor.executemany(insert_query(), chunk)
+                    connection.commit()
+                    rows_done += chunk_rows
+                    rows_written += len(chunk)
+                    chunk = []
+                    chunk_rows = 0
+            if chunk:
+                cursor.executemany(insert_query(), chunk)
+                connection.commit()
+                rows_written += len(chunk)
+            rows_done += chunk_rows
+
+    except FileNotFoundError:
+        print(f"Error: CSV file '{csv_file_path}' not found.")
+    except DB_ERRORS as err:
+        print(f"Error inserting data into {TABLE_NAME} after {rows_done} rows: {err}")
+        try:
+            connection.rollback() # Drop the failed chunk; a resumed run redoes it
+        except DB_ERRORS:
+            pass
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - started
+    rate = rows_written / elapsed if elapsed > 0 else 0.0
+    print(f"Inserted {rows_written} rows into '{TABLE_NAME}' in {elapsed:.2f}s ({rate:.0f} rows/sec).")
+    return rows_done
+
+def check_loadable_csv(csv_file_path):
+    """
+    Checks the CSV the way insert_data_chunked does, for LOAD DATA, which
+    loads every line as-is: the columns must be in CSV_HEADER order and
+    every row must pass parse_row. Returns (rows, line_terminator), the
+    terminator read from the header line ('\r\n' from csv.writer, '\n' from
+    most other tools), or None (after saying why) if the file has to go
+    through the row-by-row path. The file is read once.
+    """
+    with open(csv_file_path, mode='r', encoding='utf-8', newline='') as csvfile:
+        header_line = csvfile.readline()
+        terminator = '\r\n' if header_line.endswith('\r\n') else '\n'
+        header = next(csv.reader([header_line]), [])
+        if header != CSV_HEADER:
+            print(f"LOAD DATA needs the columns {', '.join(CSV_HEADER)}, "
+                  f"'{csv_file_path}' has {', '.join(header)}.")
+            return None
+        rows = 0
+        for row in csv.DictReader(csvfile, fieldnames=header):
+            rows += 1
+            if parse_row(row, report=False) is None:
+                print(f"Row {rows} of '{csv_file_path}' fails validation, "
+                      f"so it cannot be loaded with LOAD DATA.")
+                return None
+    return rows, terminator
+
+def load_data_infile(csv_file_path):
+    """
+    Fast path: bulk loads the CSV with LOAD DATA LOCAL INFILE on a dedicated
+    connection (local_infile must be enabled on the server). Existing rows
+    with the same user_id are replaced. The file is checked with
+    check_loadable_csv first, since the server does not apply parse_row's
+    validation. Backslashes are not treated as escapes (ESCAPED BY ''), so
+    the rows stored match those of the row-by-row path. Returns the number
+    of rows loaded, or None if the file was not loaded.
+    """
+    backend = get_backend()
+    if not backend.supports_load_data:
+        print(f"LOAD DATA LOCAL INFILE is not available on {backend.label}.")
+        return None
+    checked = check_loadable_csv(csv_file_path)
+    if checked is None:
+        return None
+    rows, terminator = checked
+    terminator = terminator.replace('\r', '\\r').replace('\n', '\\n')
+    connection = None
+    try:
+        connection = backend.connect(allow_local_infile=True)
+        cursor = connection.cursor()
+        started = time.perf_counter()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE {TABLE_NAME} "
+            "CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '{terminator}' IGNORE 1 LINES "
+            "(user_id, name, email, age)",
+            (os.path.abspath(csv_file_path),)
+        )
+        connection.commit()
+        cursor.close()
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        print(f"Loaded {rows} rows into '{TABLE_NAME}' in {elapsed:.2f}s ({rate:.0f} rows/sec).")
+        return rows
+    except DB_ERRORS as err:
+        print(f"LOAD DATA LOCAL INFILE failed: {err}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+def bulk_load(connection, csv_file_path, chunk_size=10000, use_load_data=True, start_row=0):
+    """
+    Loads the CSV with LOAD DATA LOCAL INFILE when possible and falls back
+    to insert_data_chunked otherwise. Returns the number of CSV rows
+    processed: after an interruption, pass it back as start_row to resume.
+    LOAD DATA loads the whole file in one statement, so resumed loads
+    (start_row > 0) always take the chunked path.
+    """
+    if use_load_data and start_row == 0 and os.path.exists(csv_file_path):
+        rows = load_data_infile(csv_file_path)
+        if rows is not None:
+            return rows
+    return insert_data_chunked(connection, csv_file_path, chunk_size, start_row)
+
+def open_checkpoint(checkpoint_path):
+    """
+    Opens (creating if needed) the SQLite checkpoint used by
+    insert_data_incremental. It keeps the byte offset of the next CSV line to
+    process plus a hash of every row already written to the database.
+    """
+    checkpoint = sqlite3.connect(checkpoint_path)
+    checkpoint.execute(
+        "CREATE TABLE IF NOT EXISTS progress (key TEXT PRIMARY KEY, value TEXT)"
+    )
+    checkpoint.execute(
+        "CREATE TABLE IF NOT EXISTS row_hashes (user_id TEXT PRIMARY KEY, hash TEXT NOT NULL)"
+    )
+    checkpoint.commit()
+    return checkpoint
+
+def row_hash(values):
+    """Stable short hash of a parsed (user_id, name, email, age) row."""
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=8).hexdigest()
+
+def insert_data_incremental(connection, csv_file_path, checkpoint_path=None, chunk_size=10000):
+    """
+    Seeds only what changed since the last run. Rows whose hash matches the
+    checkpoint are skipped and the rest are upserted, chunk_size CSV lines
+    at a time. After each database commit, the byte offset and the new hashes
+    are committed to the checkpoint, so a crashed run resumes at the last
+    finished chunk instead of starting over. A finished run is followed by a
+    full pass on the next call, which only writes the delta. Rows removed
+    from the CSV are not deleted, and quoted fields must not span lines.
+    Returns the number of rows written to the database.
+    """
+    if not connection:
+        return 0
+    if checkpoint_path is None:
+        checkpoint_path = f"{csv_file_path}.checkpoint"
+
+    try:
+        stat = os.stat(csv_file_path)
+    except FileNotFoundError:
+        print(f"Error: CSV file '{csv_file_path}' not found.")
+        return 0
+    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    checkpoint = open_checkpoint(checkpoint_path)
+    progress = dict(checkpoint.execute("SELECT key, value FROM progress"))
+    offset = 0
+    if progress.get('state') == 'running' and progress.get('signature') == signature:
+        offset = int(progress.get('offset', 0))
+        print(f"Resuming seeding of '{csv_file_path}' from byte {offset}.")
+
+    cursor = connection.cursor()
+    rows_written = 0
+    started = time.perf_counter()
+
+    def commit_chunk(chunk, position, state='running'):
+        if chunk:
+            cursor.executemany(insert_query(), [values for values, _ in chunk])
+            connection.commit()
+        checkpoint.executemany(
+            "INSERT OR REPLACE INTO row_hashes (user_id, hash) VALUES (?, ?)",
+            [(values[0], digest) for values, digest in chunk]
+        )
+        checkpoint.executemany(
+            "INSERT OR REPLACE INTO progress (key, value) VALUES (?, ?)",
+            [('state', state), ('signature', signature), ('offset', str(position))]
+        )
+        checkpoint.commit()
+
+    try:
+        with open(csv_file_path, mode='rb') as csvfile:
+            header = next(csv.reader([csvfile.readline().decode('utf-8')]))
+            if offset:
+                csvfile.seek(offset)
+            chunk = []
+            chunk_lines = 0
+            while True:
+                line = csvfile.readline()
+                if not line:
+                    break
+                chunk_lines += 1
+                fields = next(csv.reader([line.decode('utf-8')]), None)
+                values = parse_row(dict(zip(header, fields))) if fields else None
+                if values is not None:
+                    digest = row_hash(values)
+                    known = checkpoint.execute(
+                        "SELECT hash FROM row_hashes WHERE user_id = ?", (values[0],)
+                    ).fetchone()
+                    if known is None or known[0] != digest:
+                        chunk.append((values, digest))
+                if chunk_lines == chunk_size:
+                    commit_chunk(chunk, csvfile.tell())
+                    rows_written += len(chunk)
+                    chunk = []
+                    chunk_lines = 0
+            commit_chunk(chunk, csvfile.tell(), state='complete')
+            rows_written += len(chunk)
+
+    except DB_ERRORS as err:
+        print(f"Error inserting data into {TABLE_NAME}: {err}. Re-run to resume.")
+    finally:
+        cursor.close()
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    rate = rows_written / elapsed if elapsed > 0 else 0.0
+    print(f"Upserted {rows_written} changed rows into '{TABLE_NAME}' in {elapsed:.2f}s ({rate:.0f} rows/sec).")
+    return rows_written
+
 def insert_data(connection, csv_file_path):
     """Inserts data from the CSV file into the database if it does not exist."""
     if not connection:
@@ -86,49 +355,9 @@ def insert_data(connection, csv_file_path):
         print(f"Table '{TABLE_NAME}' seems to already contain data. Skipping insertion.")
         cursor.close()
         return
+    cursor.close()
 
-    try:
-        with open(csv_file_path, mode='r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            insert_query = f"""
-            INSERT INTO {TABLE_NAME} (user_id, name, email, age)
-            VALUES (%s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE name=VALUES(name), email=VALUES(email), age=VALUES(age);
-            """
-           
-            data_to_insert = []
-            for row in reader:
-                user_id = row.get('user_id', str(uuid4())) 
-                name = row.get('name')
-                email = row.get('email')
-                try:
-                    age = int(row.get('age')) 
-                except (ValueError, TypeError):
-                    print(f"Skipping row due to invalid age: {row}")
-                    continue
-
-                if not all([user_id, name, email]):
-                    print(f"Skipping row due to missing data: {row}")
-                    continue
-                
-                data_to_insert.append((user_id, name, email, age))
-
-            if data_to_insert:
-                cursor.executemany(insert_query, data_to_insert)
-                connection.commit()
-                print(f"Data inserted successfully into '{TABLE_NAME}'.")
-            else:
-                print("No valid data found in CSV to insert.")
-
-    except FileNotFoundError:
-        print(f"Error: CSV file '{csv_file_path}' not found.")
-    except mysql.connector.Error as err:
-        print(f"Error inserting data into {TABLE_NAME}: {err}")
-    except Exception as e:
-        print(f"An unexpected error occurred during data insertion: {e}")
-    finally:
-        if cursor:
-            cursor.close()
+    insert_data_chunked(connection, csv_file_path)
 
 if __name__ == '__main__':
   
@@ -168,4 +397,4 @@ if __name__ == '__main__':
         else:
             print("Failed to connect to the database for table creation and data insertion.")
     else:
-        print("Failed to connect to MySQL server.")
\ No newline at end of file
+        print("Failed to connect to the database server.")
\ No newline at end of file
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+Tests for the streaming age statistics in age_stats.py.
+"""
+import io
+import random
+import statistics
+import unittest
+
+from age_stats import (AgeReport, Histogram, QuantileSketch, RunningStats,
+                       age_distribution_report)
+from fixtures import UserDataTestCase
+
+
+class TestRunningStats(unittest.TestCase):
+    """Welford updates and Chan merges match the textbook formulas."""
+
+    def setUp(self):
+        generator = random.Random(1)
+        self.values = [generator.randint(18, 100) for _ in range(500)]
+
+    def stats_of(self, values):
+        stats = RunningStats()
+        for value in values:
+            stats.update(value)
+        return stats
+
+    def test_update(self):
+        stats = self.stats_of(self.values)
+        self.assertEqual(stats.count, len(self.values))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(self.values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(self.values))
+        self.assertAlmostEqual(stats.sample_variance, statistics.variance(self.values))
+        self.assertEqual((stats.min, stats.max), (min(self.values), max(self.values)))
+
+    def test_merge_equals_single_pass(self):
+        merged = self.stats_of(self.values[:123]).merge(self.stats_of(self.values[123:]))
+        single = self.stats_of(self.values)
+        self.assertEqual(merged.count, single.count)
+        self.assertAlmostEqual(merged.mean, single.mean)
+        self.assertAlmostEqual(merged.variance, single.variance)
+
+    def test_merge_with_empty(self):
+        stats = self.stats_of(self.values)
+        self.assertAlmostEqual(RunningStats().merge(stats).mean, stats.mean)
+        self.assertEqual(stats.merge(RunningStats()).count, len(self.values))
+
+    def test_empty(self):
+        stats = RunningStats()
+        self.assertIsNone(stats.variance)
+        self.assertIsNone(stats.stddev)
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """Quantile estimates stay within the relative accuracy."""
+
+    def test_relative_error(self):
+        values = sorted(random.Random(2).randint(1, 150) for _ in range(2000))
+        sketch = QuantileSketch(0.01)
+        for value in values:
+            sketch.update(value)
+        for q in (0, 0.25, 0.5, 0.9, 0.99, 1):
+            true_value = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - true_value), 0.01 * true_value + 1e-9)
+
+    def test_zero_and_negative_values(self):
+        sketch = QuantileSketch()
+        for value in (-10, 0, 0, 10):
+            sketch.update(value)
+        self.assertAlmostEqual(sketch.quantile(0), -10, delta=0.1)
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertAlmostEqual(sketch.quantile(1), 10, delta=0.1)
+
+    def test_merge(self):
+        left, right, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 101):
+            (left if value % 2 else right).update(value)
+            both.update(value)
+        left.merge(right)
+        self.assertEqual(left.quantile(0.5), both.quantile(0.5))
+        with self.assertRaises(ValueError):
+            left.merge(QuantileSketch(0.05))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(0)
+        with self.assertRaises(ValueError):
+            QuantileSketch().quantile(1.5)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_bins_and_merge(self):
+        left, right = Histogram(10), Histogram(10)
+        for value in (18, 19, 20, 35):
+            left.update(value)
+        right.update(39)
+        self.assertEqual(left.merge(right).items(), [(10, 2), (20, 1), (30, 2)])
+        with self.assertRaises(ValueError):
+            left.merge(Histogram(5))
+
+
+class TestAgeDistributionReport(UserDataTestCase):
+    """The report over user_data, in one pass or merged from partitions."""
+
+    user_count = 60
+
+    def test_single_pass(self):
+        report = age_distribution_report().as_dict()
+        ages = [user[3] for user in self.users]
+        self.assertEqual(report['count'], len(ages))
+        self.assertAlmostEqual(report['mean'], statistics.fmean(ages))
+        self.assertEqual(sum(count for _, count in report['histogram']), len(ages))
+
+    def test_partitioned_matches_single_pass(self):
+        single = age_distribution_report().as_dict()
+        merged = age_distribution_report(workers=3).as_dict()
+        self.assertEqual(merged['count'], single['count'])
+        self.assertAlmostEqual(merged['mean'], single['mean'])
+        self.assertAlmostEqual(merged['variance'], single['variance'])
+        self.assertEqual(merged['quantiles'], single['quantiles'])
+        self.assertEqual(merged['histogram'], single['histogram'])
+
+    def test_print(self):
+        output = io.StringIO()
+        age_distribution_report().print(file=output)
+        self.assertIn(f"Users: {self.user_count}", output.getvalue())
+        output = io.StringIO()
+        AgeReport().print(file=output)
+        self.assertIn("No user data found", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""
+Tests for the async generators in async_streams.py.
+"""
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import async_streams
+import db_pool
+from fixtures import UserDataTestCase
+
+
+async def collect(stream, limit=None):
+    rows = []
+    async for row in stream:
+        rows.append(row)
+        if limit is not None and len(rows) == limit:
+            break
+    return rows
+
+
+class TestAsyncStreams(UserDataTestCase):
+    """The async streams yield the same rows as the blocking generators."""
+
+    user_count = 30
+
+    def run_async(self, coroutine, timeout=10):
+        return asyncio.run(asyncio.wait_for(coroutine, timeout))
+
+    def test_stream_users(self):
+        rows = self.run_async(collect(async_streams.async_stream_users(fetch_size=7, prefetch=2)))
+        self.assertEqual(sorted(row['user_id'] for row in rows), [user[0] for user in self.users])
+
+    def test_stream_user_ages(self):
+        ages = self.run_async(collect(async_streams.async_stream_user_ages(fetch_size=4)))
+        self.assertEqual(sorted(ages), sorted(user[3] for user in self.users))
+
+    def test_concurrent_streams(self):
+        async def both():
+            return await asyncio.gather(collect(async_streams.async_stream_users(fetch_size=3)),
+                                        collect(async_streams.async_stream_user_ages(fetch_size=3)))
+        users, ages = self.run_async(both())
+        self.assertEqual((len(users), len(ages)), (self.user_count, self.user_count))
+
+    def test_early_exit_returns_the_connection(self):
+        async def first_rows():
+            stream = async_streams.async_stream_users(fetch_size=2, prefetch=1)
+            rows = await collect(stream, limit=3)
+            await stream.aclose()
+            return rows
+        self.assertEqual(len(self.run_async(first_rows())), 3)
+        pool = db_pool.get_pool()
+        deadline = time.monotonic() + 2
+        while len(pool._idle) < pool._open and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(pool._idle), pool._open)
+
+    def test_streams_share_a_bounded_thread_pool(self):
+        async def many():
+            return await asyncio.gather(*(collect(async_streams.async_stream_users(fetch_size=2))
+                                          for _ in range(4)))
+
+        with patch('async_streams._executor', None), patch('async_streams.STREAM_THREADS', 2):
+            results = self.run_async(many())
+            executor = async_streams._get_executor()
+            self.addCleanup(executor.shutdown)
+        self.assertEqual([len(rows) for rows in results], [self.user_count] * 4)
+        self.assertLessEqual(len(executor._threads), 2)
+
+    def test_closing_the_stream_stops_its_producer(self):
+        async def first_row():
+            stream = async_streams.async_stream_user_ages(fetch_size=1, prefetch=1)
+            await stream.__anext__()
+            await stream.aclose()
+            return [task for task in asyncio.all_tasks()
+                    if task.get_coro().__name__ == '_produce']
+
+        self.assertEqual(self.run_async(first_row()), [])
+
+    def test_unexpected_error_reaches_the_consumer(self):
+        with self.assertRaises(TypeError):
+            self.run_async(collect(async_streams.async_stream_users(fetch_size='seven')))
+
+    def test_cancelled_while_borrowing_releases_the_connection(self):
+        pool = db_pool.get_pool()
+        held = [pool.acquire() for _ in range(pool.size)]
+
+        async def cancel_while_waiting():
+            consumer = asyncio.ensure_future(collect(async_streams.async_stream_users()))
+            await asyncio.sleep(0.1)  # The worker thread is blocked in get_connection
+            consumer.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await consumer
+
+        self.run_async(cancel_while_waiting())
+        for connection in held:
+            connection.close()
+        deadline = time.monotonic() + 2
+        while len(pool._idle) < pool.size and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(pool._idle), pool.size)
+        self.assertEqual(pool._open, pool.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
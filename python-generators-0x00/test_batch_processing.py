@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+"""
+Tests for stream_users_in_batches and batch_processing in 1-batch_processing.py.
+"""
+import unittest
+
+import db_pool
+from fixtures import UserDataTestCase, load_script
+
+batch_processing = load_script('1-batch_processing')
+
+try:
+    import numpy
+except ImportError:  # The columnar mode needs NumPy
+    numpy = None
+
+
+class TestBatches(UserDataTestCase):
+    """Row batches in user_id order."""
+
+    def test_batch_sizes(self):
+        batches = list(batch_processing.stream_users_in_batches(4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual([row['user_id'] for batch in batches for row in batch],
+                         [user[0] for user in self.users])
+
+    def test_compact_row_types(self):
+        for row_type in ('tuple', 'namedtuple', 'slots'):
+            with self.subTest(row_type=row_type):
+                batches = list(batch_processing.stream_users_in_batches(4, row_type=row_type))
+                self.assertEqual([tuple(row) for batch in batches for row in batch], self.users)
+        batch = next(batch_processing.stream_users_in_batches(2, row_type='slots'))
+        self.assertEqual(batch[0].user_id, self.users[0][0])
+
+    def test_batch_processing_prints_users_over_25(self):
+        _, output = self.quietly(batch_processing.batch_processing, 3)
+        expected = [user for user in self.users if user[3] > 25]
+        self.assertEqual(len(output.splitlines()), len(expected))
+        for user in expected:
+            self.assertIn(user[0], output)
+
+
+class TestPrefetchAndAdaptiveBatches(UserDataTestCase):
+    """prefetch and target_latency change how batches are fetched, not what they hold."""
+
+    user_count = 40
+
+    def all_ids(self, batches):
+        return [row['user_id'] for batch in batches for row in batch]
+
+    def test_prefetch_yields_the_same_batches(self):
+        plain = list(batch_processing.stream_users_in_batches(6))
+        prefetched = list(batch_processing.stream_users_in_batches(6, prefetch=2))
+        self.assertEqual(prefetched, plain)
+
+    def test_prefetch_stops_when_consumer_leaves(self):
+        batches = batch_processing.stream_users_in_batches(2, prefetch=3)
+        next(batches)
+        batches.close()
+        pool = db_pool.get_pool()
+        self.assertEqual(len(pool._idle), pool._open)
+
+    def test_prefetch_reraises_fetch_errors(self):
+        def failing():
+            yield [1]
+            raise RuntimeError("fetch failed")
+        batches = batch_processing.prefetch_batches(failing(), 2)
+        self.assertEqual(next(batches), [1])
+        with self.assertRaises(RuntimeError):
+            next(batches)
+
+    def test_adaptive_batches_cover_every_row(self):
+        batches = list(batch_processing.stream_users_in_batches(4, target_latency=1e-9))
+        self.assertEqual(self.all_ids(batches), [user[0] for user in self.users])
+
+    def test_adapt_batch_size(self):
+        adapt = batch_processing.adapt_batch_size
+        self.assertEqual(adapt(100, 100, 0.1, 0.2), 200)    # Fast: grows, at most 2x
+        self.assertEqual(adapt(100, 100, 1.0, 0.001), 50)   # Slow: shrinks, at most 2x
+        self.assertEqual(adapt(100, 100, 0.1, 0.1), 100)
+        self.assertEqual(adapt(100, 40, 0.001, 1.0), 100)   # Partial batch: unchanged
+        self.assertEqual(adapt(1, 1, 1.0, 0.001), 1)
+        self.assertEqual(adapt(batch_processing.MAX_BATCH_SIZE, batch_processing.MAX_BATCH_SIZE,
+                               0.001, 1.0), batch_processing.MAX_BATCH_SIZE)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestColumnarBatches(UserDataTestCase):
+    """columnar=True yields ColumnarBatch objects holding the same rows."""
+
+    def test_columnar_matches_rows(self):
+        rows = [row for batch in batch_processing.stream_users_in_batches(4) for row in batch]
+        columnar = [row for batch in batch_processing.stream_users_in_batches(4, columnar=True)
+                    for row in batch.rows()]
+        self.assertEqual(columnar, rows)
+
+    def test_columnar_filter(self):
+        batch = next(batch_processing.stream_users_in_batches(10, columnar=True))
+        over_25 = batch.filter(batch.age > 25)
+        self.assertEqual(over_25.user_id.to_list(),
+                         [user[0] for user in self.users if user[3] > 25])
+        self.assertEqual(over_25.age.tolist(), [user[3] for user in self.users if user[3] > 25])
+
+    def test_string_column(self):
+        from columnar import StringColumn
+        column = StringColumn.from_values(['a', 'héllo', ''])
+        self.assertEqual(column.to_list(), ['a', 'héllo', ''])
+        self.assertEqual(column.lengths().tolist(), [1, 6, 0])
+        self.assertEqual(column.take([2, 1]).to_list(), ['', 'héllo'])
+
+    def test_string_column_offsets_and_take(self):
+        from columnar import StringColumn
+        ascii_values = ['ab', 'c', '', 'def']
+        column = StringColumn.from_values(ascii_values)
+        self.assertEqual(column.offsets.tolist(), [0, 2, 3, 3, 6])
+        self.assertEqual(column.data, b'abcdef')
+        mixed = ['日本', 'x', 'back\\slash', 'nul\x00']
+        column = StringColumn.from_values(mixed)
+        self.assertEqual(column.lengths().tolist(), [6, 1, 10, 4])
+        picked = column.take(numpy.array([3, 0, 0, 2]))
+        self.assertEqual(picked.to_list(), ['nul\x00', '日本', '日本', 'back\\slash'])
+        self.assertEqual(column.take([]).to_list(), [])
+
+    def test_empty_batch(self):
+        from columnar import ColumnarBatch
+        batch = ColumnarBatch.from_rows([])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(list(batch.rows()), [])
+
+    def test_columnar_batch_processing_output(self):
+        _, rows_output = self.quietly(batch_processing.batch_processing, 3)
+        _, columnar_output = self.quietly(batch_processing.batch_processing, 3, columnar=True)
+        self.assertEqual(columnar_output, rows_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""
+Tests for the benchmark suite in benchmark.py.
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+import benchmark
+import seed
+from fixtures import UserDataTestCase
+
+try:
+    import numpy
+except ImportError:  # The columnar case needs NumPy
+    numpy = None
+
+
+class TestBenchmark(UserDataTestCase):
+    """Seeding and measuring on a small SQLite table."""
+
+    user_count = 0
+
+    def count_users(self, where="1 = 1"):
+        connection = seed.connect_to_prodev()
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM user_data WHERE {where}")
+        count = cursor.fetchone()[0]
+        cursor.close()
+        connection.close()
+        return count
+
+    def test_generated_csv_is_valid(self):
+        path = os.path.join(self.directory, 'users.csv')
+        benchmark.write_user_csv(path, 50)
+        self.assertEqual(seed.check_loadable_csv(path), (50, '\r\n'))
+
+    def test_seed_users_replaces_the_table(self):
+        self.quietly(benchmark.seed_users, 120, chunk_size=50)
+        self.assertEqual(self.count_users(), 120)
+        self.quietly(benchmark.seed_users, 30)
+        self.assertEqual(self.count_users(), 30)
+
+    def test_cases_count_every_row(self):
+        self.quietly(benchmark.seed_users, 75)
+        self.assertEqual(benchmark._measure('stream_users', {})['rows'], 75)
+        self.assertEqual(
+            benchmark._measure('stream_users_in_batches', {'batch_size': 10})['rows'], 75)
+        over_25 = self.count_users("age > 25")
+        for columnar in (False, True) if numpy is not None else (False,):
+            result = benchmark._measure('users_over_25', {'batch_size': 20, 'columnar': columnar})
+            self.assertEqual(result['rows'], over_25)
+        result = benchmark._measure('lazy_paginate', {'page_size': 10, 'max_pages': 3,
+                                                      'keyset': True, 'session': True})
+        self.assertEqual((result['rows'], result['pages']), (30, 3))
+        self.assertGreater(result['peak_rss_mib'], 0)
+
+    def test_run_case_in_a_fresh_process(self):
+        self.quietly(benchmark.seed_users, 20)
+        environment = {'ALX_DB_BACKEND': 'sqlite', 'ALX_SQLITE_PATH': self.db_path}
+        with patch.dict(os.environ, environment):
+            result = benchmark.run_case('stream_users')
+        self.assertEqual(result['rows'], 20)
+
+    def test_report_line(self):
+        _, output = self.quietly(benchmark.report, "stream_users",
+                                 {'seconds': 0.5, 'rows': 100, 'peak_rss_mib': 12.0})
+        self.assertIn("200 rows/s", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
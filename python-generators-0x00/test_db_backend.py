@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Tests for the SQLite backend and backend selection in db_backend.py.
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+import db_backend
+import db_pool
+from fixtures import UserDataTestCase
+
+
+class TestSQLiteConnection(UserDataTestCase):
+    """The mysql.connector API the scripts use, on top of sqlite3."""
+
+    def setUp(self):
+        super().setUp()
+        self.connection = self.backend.connect()
+
+    def tearDown(self):
+        self.connection.close()
+        super().tearDown()
+
+    def test_dictionary_cursor_and_placeholders(self):
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute("SELECT user_id, age FROM user_data WHERE age > %s ORDER BY user_id",
+                       (25,))
+        self.assertEqual(cursor.column_names, ('user_id', 'age'))
+        rows = cursor.fetchall()
+        self.assertEqual(rows, [{'user_id': user[0], 'age': user[3]}
+                                for user in self.users if user[3] > 25])
+        cursor.close()
+
+    def test_fetchmany_and_iteration(self):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT user_id FROM user_data ORDER BY user_id")
+        self.assertEqual(len(cursor.fetchmany(3)), 3)
+        self.assertEqual(len(list(cursor)), self.user_count - 3)
+        cursor.close()
+
+    def test_executemany_rowcount_and_rollback(self):
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM user_data WHERE age > %s", (25,))
+        self.assertEqual(cursor.rowcount, sum(1 for user in self.users if user[3] > 25))
+        self.connection.rollback()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        self.assertEqual(cursor.fetchone()[0], self.user_count)
+        cursor.close()
+
+    def test_close(self):
+        self.assertTrue(self.connection.is_connected())
+        self.connection.close()
+        self.assertFalse(self.connection.is_connected())
+        self.connection.close()
+
+    def test_upsert_query(self):
+        query = self.backend.upsert_query('user_data', ('user_id', 'name', 'email', 'age'),
+                                          'user_id')
+        cursor = self.connection.cursor()
+        cursor.execute(query, (self.users[0][0], 'Renamed', 'renamed@example.com', 50))
+        self.connection.commit()
+        cursor.execute("SELECT name, age FROM user_data WHERE user_id = %s", (self.users[0][0],))
+        self.assertEqual(cursor.fetchone(), ('Renamed', 50))
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        self.assertEqual(cursor.fetchone()[0], self.user_count)
+        cursor.close()
+
+
+class TestBackendSelection(unittest.TestCase):
+    """set_backend / get_backend and the environment variable."""
+
+    def setUp(self):
+        self.previous = db_backend._backend
+
+    def tearDown(self):
+        db_backend.set_backend(self.previous)
+
+    def test_by_name_and_environment(self):
+        self.assertEqual(db_backend.set_backend('sqlite').name, 'sqlite')
+        db_backend.set_backend(None)
+        with patch.dict(os.environ, {'ALX_DB_BACKEND': 'sqlite'}):
+            self.assertIsInstance(db_backend.get_backend(), db_backend.SQLiteBackend)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            db_backend.set_backend('postgres')
+
+    def test_switching_backend_starts_a_new_pool(self):
+        first = db_backend.set_backend(db_backend.SQLiteBackend(':memory:'))
+        pool = db_pool.get_pool()
+        self.assertIs(pool.backend, first)
+        db_backend.set_backend(db_backend.SQLiteBackend(':memory:'))
+        self.assertIsNot(db_pool.get_pool(), pool)
+
+    @unittest.skipIf(db_backend.mysql is not None, "mysql-connector-python is installed")
+    def test_mysql_backend_needs_the_connector(self):
+        with self.assertRaises(ImportError):
+            db_backend.MySQLBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+"""
+Tests for the shared connection pool in db_pool.py.
+"""
+import threading
+import time
+import unittest
+
+import db_pool
+from fixtures import UserDataTestCase, load_script
+
+stream_users = load_script('0-stream_users').stream_users
+
+
+class TestConnectionPool(UserDataTestCase):
+    """ConnectionPool borrowing, releasing and eviction on SQLite."""
+
+    def setUp(self):
+        super().setUp()
+        self.pool = db_pool.ConnectionPool(size=2, timeout=0.2, backend=self.backend)
+
+    def tearDown(self):
+        self.pool.close_all()
+        super().tearDown()
+
+    def test_exhausted_pool_times_out(self):
+        first, second = self.pool.acquire(), self.pool.acquire()
+        with self.assertRaises(db_pool.PoolTimeoutError):
+            self.pool.acquire()
+        first.close()
+        second.close()
+
+    def test_release_reuses_connection(self):
+        connection = self.pool.acquire()
+        raw = connection._connection
+        connection.close()
+        again = self.pool.acquire()
+        self.assertIs(again._connection, raw)
+        again.close()
+        self.assertEqual(self.pool._open, 1)
+
+    def test_waiter_gets_released_connection(self):
+        first, second = self.pool.acquire(), self.pool.acquire()
+        threading.Timer(0.05, first.close).start()
+        third = self.pool.acquire(timeout=2)
+        third.close()
+        second.close()
+
+    def test_closed_proxy_rejects_use(self):
+        connection = self.pool.acquire()
+        connection.close()
+        self.assertFalse(connection.is_connected())
+        with self.assertRaises(ConnectionError):
+            connection.cursor()
+        connection.close()  # Closing twice is harmless
+        self.assertEqual(len(self.pool._idle), 1)
+
+    def test_dead_connection_is_released_and_dropped(self):
+        for _ in range(3):
+            connection = self.pool.acquire()
+            connection._connection.close()  # Dies while borrowed
+            self.assertTrue(connection.is_connected())
+            if connection.is_connected():
+                connection.close()
+        self.assertEqual(self.pool._open, 0)
+        self.assertEqual(len(self.pool._idle), 0)
+
+    def test_dead_connections_do_not_exhaust_the_pool(self):
+        for _ in range(2):
+            connection = self.pool.acquire()
+            connection._connection.close()
+            connection.close()
+        connection = self.pool.acquire()
+        self.assertTrue(connection._connection.is_connected())
+        connection.close()
+
+    def test_idle_connections_expire(self):
+        self.pool.idle_timeout = 0.01
+        connection = self.pool.acquire()
+        raw = connection._connection
+        connection.close()
+        time.sleep(0.05)
+        again = self.pool.acquire()
+        self.assertIsNot(again._connection, raw)
+        self.assertFalse(raw.is_connected())
+        again.close()
+        self.assertEqual(self.pool._open, 1)
+
+    def test_release_rolls_back_uncommitted_work(self):
+        connection = self.pool.acquire()
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM user_data")
+        cursor.close()
+        connection.close()
+        connection = self.pool.acquire()
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        self.assertEqual(cursor.fetchone()[0], self.user_count)
+        cursor.close()
+        connection.close()
+
+
+class TestSharedPool(UserDataTestCase):
+    """The generators hand their connection back to the shared pool."""
+
+    def test_streams_return_their_connection(self):
+        pool = db_pool.get_pool()
+        for _ in range(pool.size + 2):
+            self.assertEqual(len(list(stream_users())), self.user_count)
+        self.assertEqual(pool._open, 1)
+
+    def test_abandoned_stream_returns_its_connection(self):
+        pool = db_pool.get_pool()
+        users = stream_users()
+        next(users)
+        users.close()
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_shared_pool_follows_the_backend(self):
+        self.assertIs(db_pool.get_pool().backend, self.backend)
+
+
+if __name__ == '__main__':
+    unittest.main()
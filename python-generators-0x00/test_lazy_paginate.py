@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+Tests for the keyset pagination of 2-lazy_paginate.py.
+"""
+import unittest
+
+import db_pool
+from fixtures import UserDataTestCase, load_script, user_id
+
+lazy_paginate = load_script('2-lazy_paginate')
+
+
+def ids(page):
+    return [row['user_id'] for row in page]
+
+
+class TestKeysetPagination(UserDataTestCase):
+    """paginate_users_after and lazy_paginate_keyset on 10 users."""
+
+    def test_first_page_starts_at_smallest_id(self):
+        page = lazy_paginate.paginate_users_after(3)
+        self.assertEqual(ids(page), [user_id(1), user_id(2), user_id(3)])
+
+    def test_page_starts_strictly_after_last_id(self):
+        page = lazy_paginate.paginate_users_after(3, last_user_id=user_id(3))
+        self.assertEqual(ids(page), [user_id(4), user_id(5), user_id(6)])
+
+    def test_last_partial_page_and_end(self):
+        self.assertEqual(ids(lazy_paginate.paginate_users_after(3, user_id(9))), [user_id(10)])
+        self.assertEqual(lazy_paginate.paginate_users_after(3, user_id(10)), [])
+
+    def test_exact_multiple_of_page_size(self):
+        pages = list(lazy_paginate.lazy_paginate(5, keyset=True))
+        self.assertEqual([len(page) for page in pages], [5, 5])
+
+    def test_keyset_visits_every_row_once(self):
+        seen = [row['user_id'] for page in lazy_paginate.lazy_paginate(3, keyset=True)
+                for row in page]
+        self.assertEqual(seen, [user[0] for user in self.users])
+
+    def test_resume_cursor_continues_after_last_page(self):
+        pages = lazy_paginate.lazy_paginate_keyset(4)
+        _, resume_cursor = next(pages)
+        pages.close()
+        rest = [row['user_id'] for page in lazy_paginate.lazy_paginate(4, resume_cursor=resume_cursor)
+                for row in page]
+        self.assertEqual(rest, [user_id(number) for number in range(5, 11)])
+
+    def test_resume_cursor_round_trip(self):
+        token = lazy_paginate.encode_resume_cursor(user_id(7))
+        self.assertEqual(lazy_paginate.decode_resume_cursor(token), user_id(7))
+        self.assertIsNone(lazy_paginate.decode_resume_cursor(None))
+
+    def test_invalid_resume_cursor(self):
+        with self.assertRaises(ValueError):
+            lazy_paginate.decode_resume_cursor('not-a-cursor')
+
+    def test_compact_row_types(self):
+        for row_type in ('tuple', 'namedtuple', 'slots'):
+            with self.subTest(row_type=row_type):
+                pages = list(lazy_paginate.lazy_paginate(4, keyset=True, row_type=row_type))
+                self.assertEqual([tuple(row) for page in pages for row in page], self.users)
+
+    def test_resume_cursor_from_compact_rows(self):
+        pages = lazy_paginate.lazy_paginate_keyset(3, row_type='tuple')
+        _, resume_cursor = next(pages)
+        pages.close()
+        self.assertEqual(lazy_paginate.decode_resume_cursor(resume_cursor), user_id(3))
+
+    def test_offset_and_keyset_agree(self):
+        offset_rows = sorted(row['user_id'] for page in lazy_paginate.lazy_paginate(3)
+                             for row in page)
+        self.assertEqual(offset_rows, [user[0] for user in self.users])
+
+
+class TestSessionPagination(UserDataTestCase):
+    """paginate_session: one borrowed connection for the whole iteration."""
+
+    def test_session_pages_match_per_page_queries(self):
+        for keyset in (False, True):
+            with self.subTest(keyset=keyset):
+                session = [ids(page) for page in
+                           lazy_paginate.lazy_paginate(4, keyset=keyset, session=True)]
+                plain = [ids(page) for page in lazy_paginate.lazy_paginate(4, keyset=keyset)]
+                self.assertEqual(session, plain)
+
+    def test_session_holds_one_connection(self):
+        pool = db_pool.get_pool()
+        pages = lazy_paginate.paginate_session(2, keyset=True)
+        next(pages)
+        next(pages)
+        self.assertEqual(pool._open, 1)
+        self.assertEqual(len(pool._idle), 0)
+        pages.close()
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_session_resumes_after_last_user_id(self):
+        pages = lazy_paginate.paginate_session(5, keyset=True, last_user_id=user_id(8))
+        self.assertEqual([ids(page) for page in pages], [[user_id(9), user_id(10)]])
+
+    def test_session_row_types(self):
+        pages = lazy_paginate.paginate_session(2, keyset=True, row_type='namedtuple')
+        page = next(pages)
+        pages.close()
+        self.assertEqual(page[0].user_id, user_id(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
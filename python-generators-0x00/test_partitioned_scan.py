@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+"""
+Tests for the parallel range-partitioned scans in partitioned_scan.py.
+"""
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+import unittest
+from unittest.mock import patch
+
+import partitioned_scan
+from fixtures import UserDataTestCase, user_id
+
+
+def die(batch):
+    """Transform that kills its worker, like the OOM killer would."""
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def fail_first_partition(batch):
+    """Transform whose partition holding the first user fails like a lost connection."""
+    if any(row['user_id'] == user_id(1) for row in batch):
+        raise sqlite3.OperationalError("disk I/O error")
+    return batch
+
+
+class TestPartitionedScan(UserDataTestCase):
+    """Partitioned scans see every row exactly once."""
+
+    user_count = 50
+
+    def test_bounds_cover_the_table(self):
+        bounds = partitioned_scan.partition_bounds(4)
+        self.assertEqual(len(bounds), 4)
+        self.assertIsNone(bounds[0][0])
+        self.assertIsNone(bounds[-1][1])
+        for (_, high), (low, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(high, low)
+
+    def test_ranges_are_disjoint_and_complete(self):
+        seen = []
+        for bounds in partitioned_scan.partition_bounds(3):
+            seen.extend(row['user_id'] for batch in partitioned_scan.iter_range(bounds, 7)
+                        for row in batch)
+        self.assertEqual(seen, [user[0] for user in self.users])
+
+    def test_ordered_scan(self):
+        rows = [row['user_id'] for batch in partitioned_scan.scan_partitioned(3, 7, ordered=True)
+                for row in batch]
+        self.assertEqual(rows, [user[0] for user in self.users])
+
+    def test_unordered_scan(self):
+        rows = [row['user_id'] for batch in partitioned_scan.scan_partitioned(3, 7)
+                for row in batch]
+        self.assertEqual(sorted(rows), [user[0] for user in self.users])
+
+    def test_transform_runs_in_workers(self):
+        rows = [row for batch in partitioned_scan.scan_partitioned(
+                    3, 7, ordered=True, transform=partitioned_scan.users_over_25)
+                for row in batch]
+        self.assertEqual([row['user_id'] for row in rows],
+                         [user[0] for user in self.users if user[3] > 25])
+
+    def test_parallel_reduce(self):
+        total, count = partitioned_scan.parallel_reduce(
+            partitioned_scan.sum_and_count_ages, partitioned_scan.add_pairs, partitions=3)
+        self.assertEqual((total, count), (sum(user[3] for user in self.users), self.user_count))
+
+    def test_spawned_workers_use_the_active_backend(self):
+        spawn = multiprocessing.get_context('spawn')
+        with patch('partitioned_scan.multiprocessing.get_context', return_value=spawn):
+            rows = [row['user_id'] for batch in partitioned_scan.scan_partitioned(2, 20)
+                    for row in batch]
+            total, count = partitioned_scan.parallel_reduce(
+                partitioned_scan.sum_and_count_ages, partitioned_scan.add_pairs, partitions=2)
+        self.assertEqual(sorted(rows), [user[0] for user in self.users])
+        self.assertEqual(count, self.user_count)
+
+
+class TestFailedPartition(UserDataTestCase):
+    """An error in one worker fails the whole scan instead of truncating it."""
+
+    user_count = 30
+
+    def test_failed_partition_raises(self):
+        for ordered in (True, False):
+            with self.subTest(ordered=ordered):
+                with self.assertRaises(partitioned_scan.PartitionWorkerError) as caught:
+                    list(partitioned_scan.scan_partitioned(3, 4, ordered=ordered,
+                                                           transform=fail_first_partition))
+                self.assertIn("Partition 0 scan failed: OperationalError: disk I/O error",
+                              str(caught.exception))
+
+    def test_failed_query_raises(self):
+        with self.assertRaises(partitioned_scan.PartitionWorkerError) as caught:
+            list(partitioned_scan.scan_partitioned(2, 4, columns=('user_id', 'missing')))
+        self.assertIn("no such column", str(caught.exception))
+
+    def test_unpartitionable_table_raises(self):
+        connection = self.backend.connect()
+        connection.cursor().execute("DROP TABLE user_data")
+        connection.commit()
+        connection.close()
+        with self.assertRaises(partitioned_scan.PartitionWorkerError):
+            list(partitioned_scan.scan_partitioned(2))
+
+
+class TestDeadWorker(UserDataTestCase):
+    """A worker dying without its sentinel fails the scan instead of hanging it."""
+
+    def setUp(self):
+        super().setUp()
+        self.poll = partitioned_scan.WORKER_POLL
+        partitioned_scan.WORKER_POLL = 0.05
+
+    def tearDown(self):
+        partitioned_scan.WORKER_POLL = self.poll
+        super().tearDown()
+
+    def assert_scan_fails(self, ordered):
+        started = time.monotonic()
+        with self.assertRaises(partitioned_scan.PartitionWorkerError):
+            list(partitioned_scan.scan_partitioned(2, 3, ordered=ordered, transform=die))
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_ordered_scan_raises(self):
+        self.assert_scan_fails(ordered=True)
+
+    def test_unordered_scan_raises(self):
+        self.assert_scan_fails(ordered=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+"""
+Tests for the lazy pipelines in pipeline.py.
+"""
+import unittest
+
+from fixtures import UserDataTestCase
+from pipeline import col, from_iterable, user_ages, user_batches, users
+
+
+class TestPushdown(UserDataTestCase):
+    """Leading filters, projection and take become part of the SELECT."""
+
+    user_count = 30
+
+    def test_filter_project_take_in_sql(self):
+        pipeline = users().filter(col('age') > 40).project('email').take(3)
+        query, params = pipeline.explain()
+        self.assertEqual(query, "SELECT email FROM user_data WHERE (age > %s) LIMIT 3")
+        self.assertEqual(params, (40,))
+        self.assertEqual(len(pipeline.collect()), 3)
+
+    def test_filter_on_projected_away_column_is_pushed_down(self):
+        pipeline = users().project('email').filter(col('age') > 40)
+        query, params = pipeline.explain()
+        self.assertEqual(query, "SELECT email FROM user_data WHERE (age > %s)")
+        expected = sorted(user[2] for user in self.users if user[3] > 40)
+        self.assertEqual(sorted(row['email'] for row in pipeline), expected)
+
+    def test_filter_on_projected_away_column_in_python_fails_early(self):
+        with self.assertRaises(ValueError):
+            users().project('email').take(3).filter(col('age') > 40)
+        with self.assertRaises(ValueError):
+            user_batches(5).project('email').filter(col('age') > 40)
+
+    def test_project_after_project(self):
+        with self.assertRaises(ValueError):
+            users().project('email').project('name')
+        rows = users().project('email', 'age').project('email').collect()
+        self.assertEqual(set(rows[0]), {'email'})
+
+    def test_combined_predicates(self):
+        predicate = (col('age') < 22) | (col('age') >= 45)
+        rows = users().filter(predicate).collect()
+        expected = [user[0] for user in self.users if user[3] < 22 or user[3] >= 45]
+        self.assertEqual(sorted(row['user_id'] for row in rows), expected)
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            col('password')
+
+    def test_stages_after_python_stage_run_in_python(self):
+        pipeline = users().map(lambda row: row).filter(col('age') > 40).take(2)
+        self.assertEqual(pipeline.explain(), ("SELECT user_id, name, email, age FROM user_data", ()))
+        self.assertEqual(len(pipeline.collect()), 2)
+
+    def test_pipelines_are_immutable(self):
+        base = users().filter(col('age') > 40)
+        base.take(1)
+        self.assertEqual(len(base.collect()), sum(1 for user in self.users if user[3] > 40))
+
+
+class TestPythonStages(UserDataTestCase):
+    """Stages over non-SQL sources."""
+
+    def test_map_reduce(self):
+        self.assertEqual(user_ages().map(lambda age: age * 2).reduce(lambda a, b: a + b, 0),
+                         2 * sum(user[3] for user in self.users))
+
+    def test_rebatch_and_window(self):
+        self.assertEqual(from_iterable(range(7)).rebatch(3).collect(), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(from_iterable(range(4)).window(3).collect(), [(0, 1, 2), (1, 2, 3)])
+
+    def test_user_batches_filter(self):
+        rows = user_batches(3).filter(col('age') > 25).project('user_id').collect()
+        self.assertEqual([row['user_id'] for row in rows],
+                         [user[0] for user in self.users if user[3] > 25])
+
+    def test_take_stops_early(self):
+        rows = from_iterable(iter(range(100))).take(2).collect()
+        self.assertEqual(rows, [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
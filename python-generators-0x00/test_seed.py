@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+"""
+Tests for the CSV seeding paths of seed.py.
+"""
+import csv
+import os
+import sqlite3
+import unittest
+from unittest.mock import MagicMock, patch
+
+import seed
+from db_pool import get_connection
+from fixtures import UserDataTestCase, make_users
+
+
+class FlakyConnection:
+    """Connection whose commit fails after `commits` successful ones."""
+
+    def __init__(self, connection, commits):
+        self._connection = connection
+        self._commits = commits
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def commit(self):
+        if self._commits == 0:
+            raise sqlite3.OperationalError("disk I/O error")
+        self._commits -= 1
+        self._connection.commit()
+
+
+class SeedTestCase(UserDataTestCase):
+    """Starts from an empty user_data table and a CSV of 25 users."""
+
+    user_count = 0
+    csv_users = 25
+
+    def setUp(self):
+        super().setUp()
+        self.csv_path = os.path.join(self.directory, 'user_data.csv')
+        self.csv_rows = make_users(self.csv_users)
+        self.write_csv(self.csv_rows)
+        self.connection = get_connection()
+
+    def tearDown(self):
+        self.connection.close()
+        super().tearDown()
+
+    def write_csv(self, rows, header=seed.CSV_HEADER, **options):
+        with open(self.csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile, **options)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def table(self):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT user_id, name, email, age FROM user_data ORDER BY user_id")
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+
+class TestChunkedLoad(SeedTestCase):
+    """insert_data_chunked and bulk_load on the row-by-row path."""
+
+    def test_loads_every_row(self):
+        rows_done, _ = self.quietly(seed.insert_data_chunked, self.connection, self.csv_path, 10)
+        self.assertEqual(rows_done, self.csv_users)
+        self.assertEqual(self.table(), self.csv_rows)
+
+    def test_invalid_rows_are_skipped(self):
+        self.write_csv(self.csv_rows[:2] + [('x', 'No Age', 'x@example.com', 'old'),
+                                            ('', 'No Id', 'y@example.com', 30)])
+        rows_done, output = self.quietly(seed.insert_data_chunked, self.connection,
+                                         self.csv_path, 10)
+        self.assertEqual(rows_done, 4)
+        self.assertEqual(self.table(), self.csv_rows[:2])
+        self.assertIn("invalid age", output)
+        self.assertIn("missing data", output)
+
+    def test_interrupted_load_resumes(self):
+        flaky = FlakyConnection(self.connection, commits=1)
+        rows_done, output = self.quietly(seed.insert_data_chunked, flaky, self.csv_path, 10)
+        self.assertEqual(rows_done, 10)
+        self.assertIn("after 10 rows", output)
+        self.assertEqual(self.table(), self.csv_rows[:10])
+        rows_done, _ = self.quietly(seed.insert_data_chunked, self.connection, self.csv_path,
+                                    10, start_row=rows_done)
+        self.assertEqual(rows_done, self.csv_users)
+        self.assertEqual(self.table(), self.csv_rows)
+
+    def test_bulk_load_returns_resume_row(self):
+        flaky = FlakyConnection(self.connection, commits=2)
+        rows_done, _ = self.quietly(seed.bulk_load, flaky, self.csv_path, 10)
+        self.assertEqual(rows_done, 20)
+        rows_done, _ = self.quietly(seed.bulk_load, self.connection, self.csv_path, 10,
+                                    start_row=rows_done)
+        self.assertEqual(rows_done, self.csv_users)
+        self.assertEqual(self.table(), self.csv_rows)
+
+    def test_reload_upserts(self):
+        self.quietly(seed.bulk_load, self.connection, self.csv_path, 10)
+        changed = [(user_id, name, 'new@example.com', age)
+                   for user_id, name, _, age in self.csv_rows]
+        self.write_csv(changed)
+        self.quietly(seed.bulk_load, self.connection, self.csv_path, 10)
+        self.assertEqual(self.table(), changed)
+
+
+class TestLoadDataChecks(SeedTestCase):
+    """The checks made before handing a CSV to LOAD DATA."""
+
+    def test_valid_csv_is_loadable(self):
+        self.assertEqual(seed.check_loadable_csv(self.csv_path), (self.csv_users, '\r\n'))
+        self.write_csv(self.csv_rows, lineterminator='\n')
+        self.assertEqual(seed.check_loadable_csv(self.csv_path), (self.csv_users, '\n'))
+
+    def test_invalid_row_is_not_loadable(self):
+        self.write_csv(self.csv_rows + [('x', 'No Age', 'x@example.com', '')])
+        checked, output = self.quietly(seed.check_loadable_csv, self.csv_path)
+        self.assertIsNone(checked)
+        self.assertIn(f"Row {self.csv_users + 1}", output)
+
+    def test_other_columns_are_not_loadable(self):
+        self.write_csv([(name, email, age) for _, name, email, age in self.csv_rows],
+                       header=['name', 'email', 'age'])
+        checked, _ = self.quietly(seed.check_loadable_csv, self.csv_path)
+        self.assertIsNone(checked)
+
+    def test_load_data_statement(self):
+        self.write_csv(self.csv_rows, lineterminator='\n')
+        backend = MagicMock(supports_load_data=True)
+        cursor = backend.connect.return_value.cursor.return_value
+        with patch('seed.get_backend', return_value=backend):
+            rows, _ = self.quietly(seed.load_data_infile, self.csv_path)
+        self.assertEqual(rows, self.csv_users)
+        statement = cursor.execute.call_args[0][0]
+        self.assertIn("ESCAPED BY ''", statement)
+        self.assertIn("LINES TERMINATED BY '\\n'", statement)
+
+    def test_backend_without_load_data(self):
+        rows, output = self.quietly(seed.load_data_infile, self.csv_path)
+        self.assertIsNone(rows)
+        self.assertIn("not available", output)
+
+
+class TestIncrementalLoad(SeedTestCase):
+    """insert_data_incremental only writes what changed and resumes after a crash."""
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint_path = f"{self.csv_path}.checkpoint"
+
+    def load(self, connection=None):
+        written, _ = self.quietly(seed.insert_data_incremental, connection or self.connection,
+                                  self.csv_path, chunk_size=10)
+        return written
+
+    def test_second_run_writes_nothing(self):
+        self.assertEqual(self.load(), self.csv_users)
+        self.assertEqual(self.load(), 0)
+        self.assertEqual(self.table(), self.csv_rows)
+
+    def test_only_changed_rows_are_written(self):
+        self.load()
+        changed = list(self.csv_rows)
+        changed[3] = changed[3][:3] + (99,)
+        changed.append(make_users(self.csv_users + 1)[-1])
+        self.write_csv(changed)
+        self.assertEqual(self.load(), 2)
+        self.assertEqual(self.table(), changed)
+
+    def test_crashed_run_resumes_from_checkpoint(self):
+        self.assertEqual(self.load(FlakyConnection(self.connection, commits=1)), 10)
+        checkpoint = sqlite3.connect(self.checkpoint_path)
+        progress = dict(checkpoint.execute("SELECT key, value FROM progress"))
+        checkpoint.close()
+        self.assertEqual(progress['state'], 'running')
+        self.assertGreater(int(progress['offset']), 0)
+        self.assertEqual(self.load(), self.csv_users - 10)
+        self.assertEqual(self.table(), self.csv_rows)
+
+    def test_changed_file_restarts_from_the_top(self):
+        self.load(FlakyConnection(self.connection, commits=1))
+        changed = [row[:3] + (row[3] + 1,) for row in self.csv_rows]
+        self.write_csv(changed)
+        self.assertEqual(self.load(), self.csv_users)
+        self.assertEqual(self.table(), changed)
+
+    def test_missing_csv(self):
+        os.remove(self.csv_path)
+        self.assertEqual(self.load(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
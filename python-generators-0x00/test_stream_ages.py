@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""
+Tests for the age streaming and aggregation in 4-stream_ages.py.
+"""
+import math
+import unittest
+
+from fixtures import UserDataTestCase, load_script
+
+stream_ages = load_script('4-stream_ages')
+
+
+class TestAgeAggregates(UserDataTestCase):
+    """Pushed-down aggregates agree with the streamed ages."""
+
+    def ages(self):
+        return sorted(user[3] for user in self.users)
+
+    def test_stream_user_ages(self):
+        self.assertEqual(sorted(stream_ages.stream_user_ages()), self.ages())
+
+    def test_aggregates(self):
+        ages = self.ages()
+        aggregates = stream_ages.fetch_age_aggregates()
+        self.assertEqual(aggregates['count'], len(ages))
+        self.assertEqual(aggregates['sum'], sum(ages))
+        self.assertAlmostEqual(aggregates['avg'], sum(ages) / len(ages))
+        self.assertEqual((aggregates['min'], aggregates['max']), (min(ages), max(ages)))
+
+    def test_nearest_rank_percentiles(self):
+        ages = self.ages()
+        aggregates = stream_ages.fetch_age_aggregates(percentiles=(0, 10, 50, 95, 100))
+        for percentile in (0, 10, 50, 95, 100):
+            rank = max(math.ceil(percentile / 100 * len(ages)), 1)
+            self.assertEqual(aggregates[f"p{percentile}"], ages[rank - 1])
+
+    def test_invalid_percentile(self):
+        with self.assertRaises(ValueError):
+            stream_ages.fetch_age_aggregates(percentiles=(101,))
+
+    def test_average_modes_agree(self):
+        streamed, _ = self.quietly(stream_ages.calculate_average_age)
+        pushed, output = self.quietly(stream_ages.calculate_average_age, pushdown=True)
+        self.assertAlmostEqual(streamed, pushed)
+        self.assertIn(f"{pushed:.2f}", output)
+
+    def test_reduce_user_ages(self):
+        self.assertEqual(stream_ages.reduce_user_ages(max, 0), max(self.ages()))
+
+
+class TestEmptyTable(UserDataTestCase):
+    user_count = 0
+
+    def test_aggregates_of_no_rows(self):
+        aggregates = stream_ages.fetch_age_aggregates(percentiles=(50,))
+        self.assertEqual(aggregates['count'], 0)
+        self.assertIsNone(aggregates['avg'])
+        self.assertIsNone(aggregates['p50'])
+
+    def test_average_of_no_rows(self):
+        average, output = self.quietly(stream_ages.calculate_average_age, pushdown=True)
+        self.assertIsNone(average)
+        self.assertIn("No user data found", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""
+Tests for stream_users in 0-stream_users.py and the row shapes of rows.py.
+"""
+import sys
+import unittest
+
+import rows
+from fixtures import UserDataTestCase, load_script
+
+stream_users_module = load_script('0-stream_users')
+stream_users = stream_users_module.stream_users
+
+
+class TestStreamUsers(UserDataTestCase):
+    """Pushed-down columns, conditions and limits."""
+
+    def test_streams_every_user(self):
+        self.assertEqual(sorted(tuple(row.values()) for row in stream_users()), self.users)
+
+    def test_columns_where_limit(self):
+        selected = list(stream_users(columns=('email',), where="age > %s", params=(25,), limit=2))
+        self.assertEqual(len(selected), 2)
+        self.assertEqual(set(selected[0]), {'email'})
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            stream_users_module.build_user_query(('user_id', 'password'))
+
+
+class TestRowTypes(UserDataTestCase):
+    """Every row_type yields the same values in its own shape."""
+
+    def test_row_types_hold_the_same_values(self):
+        expected = sorted(self.users)
+        for row_type in rows.ROW_TYPES:
+            with self.subTest(row_type=row_type):
+                streamed = list(stream_users(row_type=row_type))
+                values = [tuple(row.values()) if isinstance(row, dict) else tuple(row)
+                          for row in streamed]
+                self.assertEqual(sorted(values), expected)
+
+    def test_namedtuple_and_slots_fields(self):
+        for row_type in ('namedtuple', 'slots'):
+            with self.subTest(row_type=row_type):
+                row = next(iter(stream_users(columns=('user_id', 'age'), limit=1,
+                                             row_type=row_type)))
+                self.assertEqual(row._asdict(), {'user_id': self.users[0][0],
+                                                 'age': self.users[0][3]})
+
+    def test_compact_rows_are_smaller(self):
+        row_dict = dict(zip(rows.USER_COLUMNS, self.users[0]))
+        slots_row = rows.UserRow(*self.users[0])
+        self.assertFalse(hasattr(slots_row, '__dict__'))
+        self.assertLess(sys.getsizeof(slots_row), sys.getsizeof(row_dict))
+
+    def test_slots_row_equality_and_repr(self):
+        self.assertEqual(rows.UserRow(*self.users[0]), rows.UserRow(*self.users[0]))
+        self.assertNotEqual(rows.UserRow(*self.users[0]), tuple(self.users[0]))
+        self.assertIn("user_id=", repr(rows.UserRow(*self.users[0])))
+
+    def test_unknown_row_type(self):
+        with self.assertRaises(ValueError):
+            rows.row_factory('frozenset')
+
+
+if __name__ == '__main__':
+    unittest.main()